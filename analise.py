@@ -0,0 +1,106 @@
+"""
+Análises "e se" de uma corrida para a aba Análise do app.
+
+Todas as variações da corrida (multiplicador dinâmico, distância e cada
+serviço) são empilhadas em uma única matriz de
+features e previstas em uma só chamada, árvore por árvore: a média das
+árvores é o preço e a dispersão entre elas mostra a incerteza da floresta.
+"""
+import numpy as np
+import pandas as pd
+
+from grade_precos import MULTIPLICADORES
+from preprocessamento import TIPO_SERVICO
+
+# Faixa de distâncias das corridas do Kaggle (milhas)
+DISTANCIAS = np.round(np.linspace(0.5, 8.0, 16), 2).tolist()
+# Percentis da dispersão entre as árvores
+PERCENTIS = (10, 90)
+
+
+def _conhecidas(preprocessador, coluna, valores):
+    """Valores com encoding conhecido (evita erro na política 'erro')."""
+    conhecidas = set(preprocessador.categorias[coluna].tolist())
+    return [v for v in valores if v in conhecidas]
+
+
+def montar_cenarios(corrida, preprocessador):
+    """
+    Empilha a corrida e suas variações em um único lote colunar.
+
+    Args:
+        corrida: Dicionário com os campos de uma corrida (valores escalares)
+        preprocessador: PreProcessador do modelo (define as categorias válidas)
+
+    Returns:
+        Tupla (lote coluna -> np.ndarray, dicionário cenário -> (fatia, campo
+        variado, valores))
+    """
+    servicos = _conhecidas(preprocessador, 'name', list(TIPO_SERVICO))
+
+    variacoes = {
+        'base': (None, [None], {}),
+        'surge': ('surge_multiplier', MULTIPLICADORES, {'surge_multiplier': MULTIPLICADORES}),
+        'distancia': ('distance', DISTANCIAS, {'distance': DISTANCIAS}),
+        'servicos': ('name', servicos, {'name': servicos,
+                                        'cab_type': [TIPO_SERVICO[nome] for nome in servicos]}),
+    }
+
+    partes = {campo: [] for campo in corrida}
+    cenarios = {}
+    inicio = 0
+    for nome, (campo, valores, alterados) in variacoes.items():
+        n = len(valores)
+        for coluna in partes:
+            if coluna in alterados:
+                partes[coluna].append(np.asarray(alterados[coluna], dtype=object))
+            else:
+                partes[coluna].append(np.full(n, corrida[coluna], dtype=object))
+        cenarios[nome] = (slice(inicio, inicio + n), campo, valores)
+        inicio += n
+
+    lote = {}
+    for coluna, blocos in partes.items():
+        valores = np.concatenate(blocos)
+        lote[coluna] = valores if isinstance(corrida[coluna], str) else valores.astype(np.float64)
+    return lote, cenarios
+
+
+def analisar(precificador, corrida):
+    """
+    Sensibilidade e explicação do preço da corrida, com uma única chamada ao modelo.
+
+    Args:
+        precificador: Precificador do app
+        corrida: Dicionário com os campos de uma corrida (valores escalares)
+
+    Returns:
+        Dicionário com:
+            'arvores': previsões de cada árvore para a corrida (np.ndarray)
+            'vies', 'contribuicoes': explicação do preço da corrida
+                (Precificador.explicar por campo; Series campo -> USD)
+            'surge', 'distancia', 'servicos': DataFrames com o valor variado,
+                preço (média das árvores) e percentis entre as árvores
+    """
+    lote, cenarios = montar_cenarios(corrida, precificador.preprocessador)
+    # A mesma passada pelas árvores dá as previsões e a explicação da corrida
+    vies, contribuicoes, por_arvore = precificador.explicar_por_arvore(lote, por_campo=True)
+    preco = por_arvore.mean(axis=1)
+    baixo, alto = np.percentile(por_arvore, PERCENTIS, axis=1)
+
+    base = cenarios['base'][0]
+    resultado = {
+        'arvores': por_arvore[base][0],
+        'vies': vies,
+        'contribuicoes': contribuicoes.iloc[base].iloc[0],
+    }
+    for nome in ('surge', 'distancia', 'servicos'):
+        fatia, campo, valores = cenarios[nome]
+        resultado[nome] = pd.DataFrame({
+            campo: valores,
+            'preco': preco[fatia],
+            f'p{PERCENTIS[0]}': baixo[fatia],
+            f'p{PERCENTIS[1]}': alto[fatia],
+        })
+    resultado['servicos']['cab_type'] = [TIPO_SERVICO[nome] for nome in resultado['servicos']['name']]
+    return resultado
@@ -6,160 +6,221 @@ import pickle
 import folium
 from streamlit_folium import folium_static
 import plotly.express as px
-import requests
 from dotenv import load_dotenv
 import os
 
+from analise import analisar
+from artefatos import DIRETORIO_PADRAO, MANIFESTO, carregar_artefatos, diretorio_camada
+from cache_previsoes import CachePrevisoes
+from cache_rotas import CacheRotas
+from deriva import MonitorDeriva
+from geo import FATOR_RODOVIA_PADRAO
+from grade_precos import DIRETORIO_GRADE, carregar_grade
+from metricas import Metricas
+from precificacao import COORDENADAS, Precificador
+from preprocessamento import SERVICOS, PreProcessador
+from rotas import ARQUIVO_MATRIZ, RoteadorLinhaReta, RoteadorORS, carregar_matriz
+from rotas_async import PRAZO_PADRAO, ClienteRotasAsync, RotasComPrazo
+
 load_dotenv()
 
 # Configuração da página Streamlit
 st.set_page_config(page_title="Previsão de Preços de Uber", layout="wide")
 
-# Carregar o modelo, o scaler e os target encoders salvos
+# Latências por etapa e contadores, compartilhados entre as sessões.
+# PRECO_METRICAS_PORTA expõe /metricas (Prometheus) e /metricas.json por HTTP;
+# PRECO_PERFIL_MS grava o perfil (cProfile) das cotações mais lentas que isso
+@st.cache_resource
+def obter_metricas():
+    metricas = Metricas()
+    if os.getenv('PRECO_METRICAS_PORTA'):
+        metricas.servir_http(int(os.getenv('PRECO_METRICAS_PORTA')))
+    return metricas
+
+metricas = obter_metricas()
+
+# Camada de modelo (PRECO_CAMADA): 'completo' (floresta) ou 'compacto'
+# (destilado com python destilacao.py); sem o pacote compacto, usa a floresta
+@st.cache_resource
+def diretorio_modelo():
+    try:
+        return diretorio_camada()
+    except (ValueError, FileNotFoundError) as e:
+        st.warning(f"{e}. Usando o modelo completo.")
+        return DIRETORIO_PADRAO
+
+DIRETORIO_MODELO = diretorio_modelo()
+
+# Carregar o modelo e o pré-processamento (target encoding + scaler) salvos.
+# O pacote de artefatos é aberto uma única vez: modelo, versão, camada, fator
+# de rodovia, grade e referência de deriva saem todos da mesma versão, mesmo
+# que um treino publique outra durante a inicialização.
+# Returns: (modelo, pré-processador, pacote de artefatos ou None, versão)
 @st.cache_resource
 def carregar_modelo():
+    with metricas.etapa('carregar_modelo'):
+        return _carregar_modelo()
+
+def _carregar_modelo():
     try:
-        modelo = joblib.load('joblib/modelo_preco_uber.joblib')
+        # Pacote de artefatos mmap (python artefatos.py): só o manifesto é lido
+        # agora e as páginas do modelo são compartilhadas entre os processos
+        if os.path.exists(os.path.join(DIRETORIO_MODELO, MANIFESTO)):
+            artefatos = carregar_artefatos(DIRETORIO_MODELO)
+            return artefatos.floresta, artefatos.preprocessador, artefatos, artefatos.versao
+        
+        # Nos arquivos joblib, a versão é a data de modificação do modelo
+        caminho = 'joblib/modelo_preco_uber.joblib'
+        versao = f"joblib-{os.path.getmtime(caminho):.0f}"
+        modelo = joblib.load(caminho)
         scaler = joblib.load('joblib/scaler_preco_uber.joblib')
         
-        # Verificar se o scaler tem o atributo feature_names_in_
-        if not hasattr(scaler, 'feature_names_in_'):
-            # Se não tiver, podemos adicionar manualmente baseado no que esperamos
-            scaler.feature_names_in_ = np.array([
-                'distance', 'surge_multiplier', 'latitude', 
-                'apparentTemperatureLow', 'pressure', 'temperatureHigh',
-                'source', 'destination', 'cab_type', 'name', 
-                'short_summary', 'long_summary'
-            ])
-        
         # Carregar os target encoders
         with open('pkl/target_encoders.pkl', 'rb') as f:
             target_encoders = pickle.load(f)
         
-        return modelo, scaler, target_encoders
+        return modelo, PreProcessador.de_encoders(target_encoders, scaler), None, versao
     except Exception as e:
         st.error(f"Erro ao carregar modelo: {e}")
         # Simulando target encoders para exemplo
         target_encoders = {
-            "cab_type": {"UberX": 15.0, "UberXL": 22.0, "UberBLACK": 35.0, "Lyft": 14.0, "Lyft XL": 21.0, "Lyft Lux": 33.0},
+            "cab_type": {"Uber": 17.0, "Lyft": 16.0},
             "source": {"Back Bay": 18.0, "Beacon Hill": 20.0, "Boston University": 15.0, "Fenway": 17.0, "Financial District": 25.0, "Northeastern University": 16.0},
             "destination": {"Back Bay": 18.0, "Beacon Hill": 20.0, "Boston University": 15.0, "Fenway": 17.0, "Financial District": 25.0, "Northeastern University": 16.0},
             "name": {"UberPool": 12.0, "UberX": 15.0, "UberXL": 22.0, "Lyft": 14.0, "Lyft XL": 21.0, "Lux": 33.0},
             "short_summary": {"clear": 20.0, "cloudy": 22.0, "rain": 25.0, "snow": 30.0},
             "long_summary": {"clear day": 20.0, "partly cloudy": 22.0, "light rain": 25.0, "heavy snow": 30.0}
         }
-        # Simulando modelo e scaler para exemplo
-        return None, None, target_encoders
+        # Sem modelo: o pré-processador serve apenas para as opções do formulário
+        return None, PreProcessador.de_encoders(target_encoders), None, None
 
 # Função para carregar as coordenadas dos locais
 @st.cache_data
 def carregar_coordenadas():
     # Em um caso real, esses dados viriam de um arquivo ou banco de dados
     # Aqui estamos usando coordenadas aproximadas para Boston
-    return {
-        "Back Bay": (42.3503, -71.0810),
-        "Beacon Hill": (42.3588, -71.0707),
-        "Boston University": (42.3505, -71.1054),
-        "Fenway": (42.3429, -71.1003),
-        "Financial District": (42.3559, -71.0550),
-        "Northeastern University": (42.3398, -71.0892)
-    }
-
-# Função para obter rota entre dois pontos usando OpenRouteService (gratuito)
+    return dict(COORDENADAS)
+
+# Matriz de rotas entre os locais, calculada offline (python rotas.py)
+@st.cache_resource
+def carregar_rotas():
+    return carregar_matriz(ARQUIVO_MATRIZ)
+
+# Cliente assíncrono do OpenRouteService (pool de conexões), atrás de um cache
+# de rotas compartilhado entre sessões (e persistido em SQLite). A cotação
+# espera a rota no máximo PRAZO_ROTA segundos; depois disso usa a linha reta
+# corrigida pelo fator de rodovia e a polyline chega mais tarde.
+# API_ORS_URL aponta para outro servidor (ex.: python -m benchmarks.mock_ors)
+@st.cache_resource
+def obter_roteador_ors(api_key, fator_rodovia):
+    roteador = RoteadorORS(api_key, url=os.getenv('API_ORS_URL'))
+    return RotasComPrazo(
+        ClienteRotasAsync(roteador),
+        CacheRotas(roteador, caminho_sqlite=os.getenv('CACHE_ROTAS', 'cache_rotas.sqlite')),
+        RoteadorLinhaReta(fator_rodovia),
+        prazo=float(os.getenv('PRAZO_ROTA', PRAZO_PADRAO)),
+    )
+
+# Grade de preços pré-calculada (python grade_precos.py); só é usada se foi
+# gerada a partir do mesmo pacote de artefatos carregado pelo app
+@st.cache_resource
+def carregar_grade_precos(versao):
+    grade = carregar_grade(DIRETORIO_GRADE)
+    if grade is None or grade.versao != versao:
+        return None
+    return grade
+
+# Monitor de deriva das cotações (PSI/KS contra a referência do treino
+# gravada no pacote), compartilhado entre sessões, um por versão do modelo
+@st.cache_resource
+def obter_monitor_deriva(_artefatos, versao):
+    return MonitorDeriva(_artefatos.referencia_deriva, _artefatos.preprocessador,
+                         int(os.getenv('PRECO_DERIVA_JANELA', 5000)), metricas=metricas)
+
+# Memo de previsões compartilhado entre sessões, um por versão do modelo
+@st.cache_resource
+def obter_cache_previsoes(_precificador, versao):
+    return CachePrevisoes(_precificador, versao)
+
+# Análise da aba 3 memoizada por corrida e versão do modelo, como as
+# previsões: as reexecuções da página não voltam às árvores
+@st.cache_data(max_entries=256)
+def analisar_corrida(_precificador, versao, corrida):
+    return analisar(_precificador, corrida)
+
+# Função para obter rota entre dois pontos usando OpenRouteService (gratuito).
+# A origem da rota é contada só aqui (rota_cache, rota_backend ou
+# rota_fallback, com o motivo em rota_prazo_esgotado/rota_falhas_ors); a
+# matriz pré-calculada conta rota_matriz e não passa por esta função
+# Returns: (rota, distância, futuro da rota que ainda não chegou ou None)
 def obter_rota_ors(origem, destino, api_key):
     try:
-        origem_lat, origem_lon = origem
-        destino_lat, destino_lon = destino
-        
-        # Usando a API do OpenRouteService
-        url = "https://api.openrouteservice.org/v2/directions/driving-car"
-        
-        # Formato da solicitação JSON
-        body = {
-            "coordinates": [[origem_lon, origem_lat], [destino_lon, destino_lat]],
-            "format": "geojson"
-        }
-        
-        headers = {
-            'Accept': 'application/json, application/geo+json, application/gpx+xml',
-            'Authorization': api_key,
-            'Content-Type': 'application/json; charset=utf-8'
-        }
-        
-        response = requests.post(url, json=body, headers=headers)
-        
-        # Verificar se a resposta é válida
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Extrair a rota e a distância
-            if "features" in data and len(data["features"]) > 0:
-                feature = data["features"][0]
-                
-                if "geometry" in feature and "coordinates" in feature["geometry"]:
-                    # Extrair coordenadas da rota (OpenRouteService retorna [lon, lat])
-                    # Convertendo para [lat, lon] para folium
-                    rota = [[coord[1], coord[0]] for coord in feature["geometry"]["coordinates"]]
-                    
-                    # Extrair a distância em metros e converter para milhas
-                    distancia = feature["properties"]["summary"]["distance"] / 1609.34  # metros para milhas
-                    
-                    return rota, distancia
-        
-        # Se chegou aqui, não conseguiu obter a rota. Vamos usar um cálculo simples como fallback
-        # Calculando distância em linha reta (Haversine)
-        import math
-        
-        # Conversão para radianos
-        lon1, lat1 = math.radians(origem_lon), math.radians(origem_lat)
-        lon2, lat2 = math.radians(destino_lon), math.radians(destino_lat)
-        
-        # Haversine formula
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        r = 3956  # Raio da Terra em milhas
-        
-        # Distância em milhas
-        distancia_reta = c * r
-        
-        # Linha reta entre os pontos para a rota
-        rota = [origem, destino]
-        
-        return rota, distancia_reta
-        
+        resultado = obter_roteador_ors(api_key, fator_rodovia).rota(origem, destino)
+        if resultado.fonte != 'reserva':
+            metricas.contar(f'rota_{resultado.fonte}')
+        else:
+            metricas.contar('rota_fallback')
+            metricas.contar('rota_prazo_esgotado' if resultado.pendente is not None else 'rota_falhas_ors')
+        return resultado.rota, resultado.distancia, resultado.pendente
     except Exception as e:
+        metricas.contar('rota_falhas_ors')
         st.error(f"Erro ao obter rota: {e}")
-        # Linha reta entre os pontos para a rota (fallback)
-        rota = [origem, destino]
-        
-        # Cálculo simplificado da distância (linha reta em milhas)
-        from math import radians, cos, sin, asin, sqrt
-        
-        lon1, lat1 = origem_lon, origem_lat
-        lon2, lat2 = destino_lon, destino_lat
-        
-        # Converter para radianos
-        lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-        
-        # Fórmula de Haversine
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        r = 3956  # Raio da Terra em milhas
-        
-        distancia = c * r
-        
-        return rota, distancia
 
-# Carrega o modelo, scaler e target encoders
-modelo, scaler, target_encoders = carregar_modelo()
+    # Se chegou aqui, não conseguiu obter a rota: linha reta entre os pontos e
+    # distância haversine corrigida pelo fator de rodovia (geo.py)
+    metricas.contar('rota_fallback')
+    return (*RoteadorLinhaReta(fator_rodovia).rota(origem, destino), None)
+
+# Rota que chegou depois do prazo: substitui a linha reta no mapa (a
+# distância do preço já cotado não muda)
+def atualizar_rota_pendente():
+    pendente = st.session_state.get("rota_pendente")
+    if pendente is None or not pendente.done():
+        return
+    del st.session_state["rota_pendente"]
+    if not pendente.cancelled() and pendente.exception() is None:
+        metricas.contar('rota_tardia')
+        st.session_state["rota"], st.session_state["distancia_rota"] = pendente.result()
+
+# Carrega o modelo e o pré-processamento
+modelo, preprocessador, artefatos_modelo, versao_modelo = carregar_modelo()
+
+# Modelo destilado: as árvores isoladas não são preços, então não há faixa
+# P10–P90 nem dispersão entre árvores para mostrar
+modelo_destilado = artefatos_modelo is not None and artefatos_modelo.destilado
+
+# Fator de correção de rodovia ajustado no treino (1.0 sem pacote de artefatos)
+fator_rodovia = artefatos_modelo.fator_rodovia if artefatos_modelo is not None else FATOR_RODOVIA_PADRAO
+
+# Monta o precificador vetorizado (o mesmo usado para lotes de corridas),
+# com as etapas encoding, escalonamento e modelo medidas
+precificador = (Precificador(modelo, preprocessador, metricas, destilado=modelo_destilado)
+                if modelo is not None else None)
+
+# Previsões já feitas (por qualquer sessão) não voltam ao modelo
+cache_previsoes = obter_cache_previsoes(precificador, versao_modelo) if precificador is not None else None
+
+# Versão do modelo e acertos dos caches entram nas métricas exportadas
+metricas.definir_info('modelo', versao=versao_modelo or 'simulado',
+                      camada='compacto' if modelo_destilado else 'completo')
+if cache_previsoes is not None:
+    metricas.registrar_coletor('cache_previsoes', cache_previsoes.estatisticas)
+monitor_deriva = (obter_monitor_deriva(artefatos_modelo, versao_modelo)
+                  if artefatos_modelo is not None and artefatos_modelo.referencia_deriva is not None else None)
+if monitor_deriva is not None:
+    metricas.registrar_coletor('deriva', monitor_deriva.resumo)
+if os.getenv('API_ORS'):
+    metricas.registrar_coletor('cache_rotas', obter_roteador_ors(os.getenv('API_ORS'), fator_rodovia).estatisticas)
 
 # Carrega as coordenadas
 coordenadas = carregar_coordenadas()
 
+# Carrega a matriz de rotas pré-calculada (None se ainda não foi construída)
+matriz_rotas = carregar_rotas()
+
+# Carrega a grade de preços pré-calculada (None se ausente ou desatualizada)
+grade_precos = carregar_grade_precos(versao_modelo) if artefatos_modelo is not None else None
+
 # Título e descrição da aplicação
 st.title("🚗 Previsão de Preços de Uber")
 st.write("Este aplicativo estima o preço de uma corrida de Uber com base em diferentes fatores.")
@@ -176,18 +237,14 @@ with tab1:
     with col1:
         source = st.selectbox("Origem", options=list(coordenadas.keys()))
         temperature = st.number_input("Temperatura (°F)", min_value=0.0, max_value=100.0, value=70.0, step=1.0)
-        short_summary = st.selectbox("Condição climática", options=list(target_encoders["short_summary"].keys()))
-        cab_type = st.selectbox("Tipo de serviço", options=list(target_encoders["cab_type"].keys()))
+        short_summary = st.selectbox("Condição climática", options=list(preprocessador.categorias["short_summary"]))
+        cab_type = st.selectbox("Tipo de serviço", options=list(preprocessador.categorias["cab_type"]))
     
     with col2:
         destination = st.selectbox("Destino", options=list(coordenadas.keys()))
         pressure = st.number_input("Pressão atmosférica", min_value=900.0, max_value=1100.0, value=1000.0, step=1.0)
-        long_summary = st.selectbox("Descrição do clima", options=list(target_encoders["long_summary"].keys()))
-        name_dict = {
-            'Uber': ['UberXL', 'Black', 'UberX', 'WAV', 'Black SUV', 'UberPool', 'Taxi'],
-            'Lyft': ['Shared', 'Lux', 'Lyft', 'Lux Black XL', 'Lyft XL', 'Lux Black']
-        }
-        servicos_disponiveis = name_dict[cab_type]
+        long_summary = st.selectbox("Descrição do clima", options=list(preprocessador.categorias["long_summary"]))
+        servicos_disponiveis = SERVICOS[cab_type]
         name = st.selectbox("Nome do serviço", options=servicos_disponiveis)
     
     # Multiplicador de preço dinâmico
@@ -195,209 +252,271 @@ with tab1:
     
     # Botão para calcular a distância
     if st.button("Calcular Distância e Preço"):
-        # Gerar o mapa
-        st.session_state["origem"] = source
-        st.session_state["destino"] = destination
-        st.session_state["mapa_gerado"] = True
-        
-        # Calcular a distância usando OpenRouteService
-        origem_coords = coordenadas[source]
-        destino_coords = coordenadas[destination]
-        
-        # API key do OpenRouteService (gratuito após registro)
-        # Você pode obter uma chave gratuita em https://openrouteservice.org/dev/#/signup
-        ors_api_key = os.getenv('API_ORS')
-        
-        # Obter rota e distância
-        rota, distancia_calculada = obter_rota_ors(origem_coords, destino_coords, ors_api_key)
-        
-        # Armazenar a rota e a distância
-        st.session_state["rota"] = rota
-        st.session_state["distancia"] = distancia_calculada
-        
-        # Se a distância foi calculada com sucesso
-        if distancia_calculada > 0:
-            # Exibir a distância calculada
-            st.info(f"Distância calculada: {distancia_calculada:.2f} milhas")
+        # Cotação inteira medida (e perfilada, se lenta, com PRECO_PERFIL_MS)
+        with metricas.requisicao('cotacao'):
+            # Gerar o mapa
+            st.session_state["origem"] = source
+            st.session_state["destino"] = destination
+            st.session_state["mapa_gerado"] = True
+        
+            # Calcular a distância usando OpenRouteService
+            origem_coords = coordenadas[source]
+            destino_coords = coordenadas[destination]
+        
+            # API key do OpenRouteService (gratuito após registro)
+            # Você pode obter uma chave gratuita em https://openrouteservice.org/dev/#/signup
+            ors_api_key = os.getenv('API_ORS')
+        
+            # Obter rota e distância: da matriz pré-calculada quando o par é
+            # conhecido, sem chamada de rede; senão, do OpenRouteService
+            with metricas.etapa('rota'):
+                if matriz_rotas is not None and (source, destination) in matriz_rotas:
+                    metricas.contar('rota_matriz')
+                    rota, distancia_calculada = matriz_rotas.consultar(source, destination)
+                    pendente = None
+                else:
+                    rota, distancia_calculada, pendente = obter_rota_ors(origem_coords, destino_coords, ors_api_key)
+        
+            # Armazenar a rota e a distância
+            st.session_state["rota"] = rota
+            st.session_state["distancia"] = distancia_calculada
+            st.session_state.pop("distancia_rota", None)
+            st.session_state["rota_pendente"] = pendente
+        
+            # Se a distância foi calculada com sucesso
+            if distancia_calculada > 0:
+                # Exibir a distância calculada
+                st.info(f"Distância calculada: {distancia_calculada:.2f} milhas")
             
-            # Aplicar target encoding
-            cab_type_encoded = target_encoders["cab_type"][cab_type]
-            source_encoded = target_encoders["source"][source]
-            destination_encoded = target_encoders["destination"][destination]
-            name_encoded = target_encoders["name"][name]
-            short_summary_encoded = target_encoders["short_summary"][short_summary]
-            long_summary_encoded = target_encoders["long_summary"][long_summary]
+                # Dados da corrida no formato colunar do precificador (lote de 1)
+                dados_entrada = {
+                    'distance': [distancia_calculada],
+                    'surge_multiplier': [surge_multiplier],
+                    'temperature': [temperature],
+                    'pressure': [pressure],
+                    'source': [source],
+                    'destination': [destination],
+                    'cab_type': [cab_type],
+                    'name': [name],
+                    'short_summary': [short_summary],
+                    'long_summary': [long_summary]
+                }
             
-            # Criar DataFrame com os dados processados
-            dados_entrada = pd.DataFrame({
-                'distance': [distancia_calculada],
-                'surge_multiplier': [surge_multiplier],
-                'latitude': [origem_coords[0]],  # Usando a latitude da origem
-                'apparentTemperatureLow': [temperature - 10],  # Simplificação
-                'pressure': [pressure],
-                'temperatureHigh': [temperature + 5],  # Simplificação
-                'source': [source_encoded],
-                'destination': [destination_encoded],
-                'cab_type': [cab_type_encoded],
-                'name': [name_encoded],
-                'short_summary': [short_summary_encoded],
-                'long_summary': [long_summary_encoded]
-            })
-            
-            # Realizar a previsão se o modelo estiver disponível
-            if modelo is not None and scaler is not None:
-                try:
-                    # Normalizar os dados - garantindo ordem correta das colunas
-                    # Obtendo as colunas na ordem que o scaler espera
-                    feature_names = scaler.feature_names_in_
-                    
-                    # Reorganizando o DataFrame para corresponder às feature_names
-                    dados_organizados = pd.DataFrame()
-                    for feature in feature_names:
-                        if feature in dados_entrada.columns:
-                            dados_organizados[feature] = dados_entrada[feature]
+                # Realizar a previsão se o modelo estiver disponível
+                if precificador is not None:
+                    faixa = None
+                    try:
+                        # Cotação da grade pré-calculada quando a combinação está
+                        # nela (com a mesma distância); senão, o modelo ao vivo
+                        if (grade_precos is not None
+                                and grade_precos.cobre(source, destination, name, short_summary, long_summary)
+                                and abs(grade_precos.distancia(source, destination) - distancia_calculada) < 1e-6):
+                            # Sem faixa: calculá-la levaria a cotação de volta à floresta
+                            metricas.contar('cotacao_grade')
+                            preco_previsto = grade_precos.cotar(source, destination, name, short_summary, long_summary,
+                                                                surge_multiplier, temperature, pressure)
                         else:
-                            # Se alguma feature estiver faltando, preenchemos com 0
-                            # Idealmente, você deve adaptar isso para um valor padrão mais apropriado
-                            dados_organizados[feature] = 0
-                    
-                    # Agora sim transformamos os dados
-                    dados_entrada_scaled = scaler.transform(dados_organizados)
+                            metricas.contar('cotacao_modelo')
+                            # Target encoding, padronização e previsão em uma única
+                            # chamada, memoizada por vetor de features; na floresta,
+                            # preço e faixa saem da mesma passada pelas árvores
+                            if modelo_destilado:
+                                preco_previsto = cache_previsoes.predict_batch(dados_entrada)[0]
+                            else:
+                                precos, faixas = cache_previsoes.predict_com_quantis(dados_entrada)
+                                preco_previsto, faixa = precos[0], faixas[0]
+                        # Só enfileira: a contagem das faixas roda na thread do monitor
+                        if monitor_deriva is not None:
+                            monitor_deriva.observar(dados_entrada, [preco_previsto])
+                    except Exception as e:
+                        metricas.contar('cotacao_erros')
+                        faixa = None
+                        st.error(f"Erro ao processar os dados: {e}")
+                        st.info("Usando cálculo de preço simplificado como alternativa.")
                     
-                    # Fazer previsão
-                    preco_previsto = modelo.predict(dados_entrada_scaled)[0]
-                except Exception as e:
-                    st.error(f"Erro ao processar os dados: {e}")
-                    st.info("Usando cálculo de preço simplificado como alternativa.")
-                    
-                    # Caso ocorra erro, usamos um cálculo simplificado
+                        # Caso ocorra erro, usamos um cálculo simplificado
+                        preco_base = 2.5  # Taxa base
+                        preco_por_milha = 1.5
+                        preco_previsto = preco_base + (distancia_calculada * preco_por_milha * surge_multiplier)
+                
+                    # Exibir o resultado
+                    st.success(f"💰 Preço estimado da corrida: ${preco_previsto:.2f}")
+                
+                    # Faixa de preço a partir da dispersão entre as árvores (só
+                    # nas cotações do modelo completo)
+                    if faixa is not None:
+                        p10, _, p90 = faixa
+                        st.caption(f"Faixa provável (P10–P90): ${p10:.2f} – ${p90:.2f}")
+                
+                    # Armazenar o preço previsto e a corrida (para a aba Análise)
+                    st.session_state["preco_previsto"] = preco_previsto
+                    st.session_state["corrida"] = {col: valores[0] for col, valores in dados_entrada.items()}
+                else:
+                    # Caso o modelo não esteja disponível, calculamos um preço simulado
                     preco_base = 2.5  # Taxa base
                     preco_por_milha = 1.5
-                    preco_previsto = preco_base + (distancia_calculada * preco_por_milha * surge_multiplier)
-                
-                # Exibir o resultado
-                st.success(f"💰 Preço estimado da corrida: ${preco_previsto:.2f}")
+                    preco_simulado = preco_base + (distancia_calculada * preco_por_milha * surge_multiplier)
                 
-                # Armazenar o preço previsto
-                st.session_state["preco_previsto"] = preco_previsto
+                    st.success(f"💰 Preço estimado da corrida (simulado): ${preco_simulado:.2f}")
+                    st.session_state["preco_previsto"] = preco_simulado
             else:
-                # Caso o modelo não esteja disponível, calculamos um preço simulado
-                preco_base = 2.5  # Taxa base
-                preco_por_milha = 1.5
-                preco_simulado = preco_base + (distancia_calculada * preco_por_milha * surge_multiplier)
-                
-                st.success(f"💰 Preço estimado da corrida (simulado): ${preco_simulado:.2f}")
-                st.session_state["preco_previsto"] = preco_simulado
-        else:
-            st.error("Não foi possível calcular a distância. Por favor, tente novamente.")
+                st.error("Não foi possível calcular a distância. Por favor, tente novamente.")
 
 with tab2:
     st.header("Visualização no Mapa")
     
     # Verificar se o mapa já foi gerado
     if "mapa_gerado" in st.session_state and st.session_state["mapa_gerado"]:
-        # Criar um mapa centrado em Boston
-        mapa = folium.Map(location=[42.3601, -71.0589], zoom_start=13, tiles="OpenStreetMap")
-        
-        # Adicionar os marcadores para origem e destino
-        origem = st.session_state["origem"]
-        destino = st.session_state["destino"]
-        
-        origem_coords = coordenadas[origem]
-        destino_coords = coordenadas[destino]
-        
-        # Marcador para a origem
-        folium.Marker(
-            location=origem_coords,
-            popup=origem,
-            icon=folium.Icon(color="green", icon="play"),
-        ).add_to(mapa)
-        
-        # Marcador para o destino
-        folium.Marker(
-            location=destino_coords,
-            popup=destino,
-            icon=folium.Icon(color="red", icon="flag"),
-        ).add_to(mapa)
-        
-        # Adicionar a rota ao mapa se estiver disponível
-        if "rota" in st.session_state and st.session_state["rota"]:
-            folium.PolyLine(
-                st.session_state["rota"],
-                color="blue",
-                weight=5,
-                opacity=0.7
+        atualizar_rota_pendente()
+        if st.session_state.get("rota_pendente") is not None:
+            st.info("A rota pelas ruas ainda está sendo calculada; por enquanto o mapa mostra a linha reta.")
+            st.button("Atualizar mapa")
+        elif "distancia_rota" in st.session_state:
+            st.caption(f"Distância pelas ruas: {st.session_state['distancia_rota']:.2f} milhas "
+                       f"(o preço foi cotado com a estimativa de {st.session_state['distancia']:.2f} milhas)")
+        
+        # Montagem e renderização do mapa (folium)
+        with metricas.etapa('mapa'):
+            # Criar um mapa centrado em Boston
+            mapa = folium.Map(location=[42.3601, -71.0589], zoom_start=13, tiles="OpenStreetMap")
+        
+            # Adicionar os marcadores para origem e destino
+            origem = st.session_state["origem"]
+            destino = st.session_state["destino"]
+        
+            origem_coords = coordenadas[origem]
+            destino_coords = coordenadas[destino]
+        
+            # Marcador para a origem
+            folium.Marker(
+                location=origem_coords,
+                popup=origem,
+                icon=folium.Icon(color="green", icon="play"),
             ).add_to(mapa)
         
-        # Exibir o preço previsto no mapa
-        if "preco_previsto" in st.session_state:
-            preco = st.session_state["preco_previsto"]
-            distancia = st.session_state["distancia"]
-            
-            # Adicionar um marcador com informações do preço
+            # Marcador para o destino
             folium.Marker(
-                location=[(origem_coords[0] + destino_coords[0])/2, (origem_coords[1] + destino_coords[1])/2],
-                popup=f"Preço: ${preco:.2f}<br>Distância: {distancia:.2f} milhas",
-                icon=folium.DivIcon(html=f"""
-                    <div style="font-size: 12pt; background-color: white; 
-                    border-radius: 5px; padding: 5px; border: 1px solid #ccc;">
-                    <b>${preco:.2f}</b>
-                    </div>
-                """)
+                location=destino_coords,
+                popup=destino,
+                icon=folium.Icon(color="red", icon="flag"),
             ).add_to(mapa)
         
-        # Exibir o mapa
-        folium_static(mapa)
+            # Adicionar a rota ao mapa se estiver disponível
+            if "rota" in st.session_state and st.session_state["rota"]:
+                folium.PolyLine(
+                    st.session_state["rota"],
+                    color="blue",
+                    weight=5,
+                    opacity=0.7
+                ).add_to(mapa)
+        
+            # Exibir o preço previsto no mapa
+            if "preco_previsto" in st.session_state:
+                preco = st.session_state["preco_previsto"]
+                distancia = st.session_state["distancia"]
+            
+                # Adicionar um marcador com informações do preço
+                folium.Marker(
+                    location=[(origem_coords[0] + destino_coords[0])/2, (origem_coords[1] + destino_coords[1])/2],
+                    popup=f"Preço: ${preco:.2f}<br>Distância: {distancia:.2f} milhas",
+                    icon=folium.DivIcon(html=f"""
+                        <div style="font-size: 12pt; background-color: white; 
+                        border-radius: 5px; padding: 5px; border: 1px solid #ccc;">
+                        <b>${preco:.2f}</b>
+                        </div>
+                    """)
+                ).add_to(mapa)
+        
+            # Exibir o mapa
+            folium_static(mapa)
         
     else:
         st.info("Para gerar o mapa, vá para a aba 'Dados da Corrida', selecione os locais e clique em 'Calcular Distância e Preço'.")
 
+# Nomes dos campos da corrida nos gráficos
+ROTULOS_CAMPOS = {
+    'distance': 'Distância', 'surge_multiplier': 'Surge', 'source': 'Origem', 'destination': 'Destino',
+    'cab_type': 'Tipo de corrida', 'name': 'Serviço', 'temperature': 'Temperatura',
+    'pressure': 'Pressão', 'short_summary': 'Condição climática', 'long_summary': 'Descrição do clima'
+}
+
 with tab3:
     st.header("Análise de Preços")
     
-    if "preco_previsto" in st.session_state:
-        preco = st.session_state["preco_previsto"]
-        
-        # Criar dados simulados para comparação
-        comparacao = pd.DataFrame({
-            'Fator': ['Distância', 'Surge', 'Tipo de serviço', 'Clima', 'Origem/Destino'],
-            'Impacto': [0.4, 0.3, 0.15, 0.05, 0.1]  # Valores simulados
-        })
-        
+    # Sem análise (nenhuma cotação ou erro), a aba termina aqui e o resto da
+    # página, como as métricas na barra lateral, continua sendo desenhado
+    analise = None
+    if "preco_previsto" in st.session_state and precificador is not None and "corrida" in st.session_state:
+        # Todas as variações da corrida e a explicação do preço em uma única
+        # chamada ao modelo
+        try:
+            analise = analisar_corrida(precificador, versao_modelo, st.session_state["corrida"])
+        except Exception as e:
+            metricas.contar('analise_erros')
+            st.error(f"Erro ao analisar a corrida: {e}")
+    else:
+        st.info("Para ver a análise de preços, primeiro calcule o preço na aba 'Dados da Corrida'.")
+
+    if analise is not None:
         figcols = st.columns(2)
 
         with figcols[0]:
-            # Criar gráfico de barras mostrando o impoacto vs fato
+            # Contribuição de cada campo para o preço desta corrida, pelos
+            # caminhos de decisão das árvores (preço = base + contribuições)
             st.subheader('Fatores que afetam o preço')
+            contribuicoes = analise['contribuicoes']
+            comparacao = pd.DataFrame({
+                'Fator': [ROTULOS_CAMPOS.get(campo, campo) for campo in contribuicoes.index],
+                'Impacto': contribuicoes.to_numpy()
+            }).sort_values('Impacto', key=abs)
             fig  = px.bar(data_frame=comparacao, x='Impacto', y='Fator', color='Fator')
+            fig.update_layout(xaxis_title='Contribuição para o preço (USD)', showlegend=False)
             st.plotly_chart(fig)
-        
-        # Simulação de distribuição de preços similares
-        precos_similares = np.random.normal(preco, preco * 0.15, 100)
-        precos_similares = precos_similares[precos_similares > 0]
+            st.caption(f"Preço base (média do treino): ${analise['vies']:.2f}")
         
         with figcols[1]:
-            # Plotar histograma
-            st.subheader('Distribuição de preços para corridas similares')
-            fig2 = px.histogram(x=precos_similares, nbins=20, color_discrete_sequence=['lightblue'])
-            fig2.update_layout(xaxis_title='Preço (USD)', yaxis_title='Frequência')
-            st.plotly_chart(fig2)
+            # Previsão de cada árvore da floresta para esta corrida
+            st.subheader('Distribuição das previsões das árvores')
+            if modelo_destilado:
+                st.info("O modelo compacto (destilado) não tem dispersão entre árvores; "
+                        "use PRECO_CAMADA=completo para ver a incerteza da floresta.")
+            else:
+                fig2 = px.histogram(x=analise['arvores'], nbins=20, color_discrete_sequence=['lightblue'])
+                fig2.update_layout(xaxis_title='Preço (USD)', yaxis_title='Árvores')
+                st.plotly_chart(fig2)
+        
+        figcols = st.columns(2)
         
-        servicos = pd.DataFrame({
-            'Serviço': ['UberX', 'UberXL', 'UberBLACK', 'Lyft', 'Lyft XL', 'Lyft Lux'],
-            'Preço Médio': [preco * 0.9, preco * 1.2, preco * 1.8, preco * 0.95, preco * 1.25, preco * 1.9]
-        })
+        for coluna, (chave, campo, titulo, eixo_x) in zip(figcols, [
+                ('surge', 'surge_multiplier', 'Preço vs. multiplicador dinâmico', 'Multiplicador'),
+                ('distancia', 'distance', 'Preço vs. distância', 'Distância (milhas)')]):
+            with coluna:
+                st.subheader(titulo)
+                curva = analise[chave]
+                fig_curva = px.line(data_frame=curva, x=campo, y='preco')
+                # Faixa entre os percentis 10 e 90 das árvores
+                if not modelo_destilado:
+                    fig_curva.add_scatter(x=curva[campo], y=curva['p90'], mode='lines', line_width=0,
+                                          showlegend=False)
+                    fig_curva.add_scatter(x=curva[campo], y=curva['p10'], mode='lines', line_width=0,
+                                          fill='tonexty', showlegend=False)
+                fig_curva.update_layout(xaxis_title=eixo_x, yaxis_title='Preço (USD)')
+                st.plotly_chart(fig_curva)
+        
+        servicos = analise['servicos']
         
         st.subheader('Comparação de preços entre serviços')
-        fig3 = px.bar(data_frame=servicos, x='Serviço', y='Preço Médio', color='Serviço')
-        fig3.update_layout(xaxis_title='Serviço', yaxis_title='Preço médio (USD)')
+        barras_erro = {} if modelo_destilado else {
+            'error_y': servicos['p90'] - servicos['preco'],
+            'error_y_minus': servicos['preco'] - servicos['p10'],
+        }
+        fig3 = px.bar(data_frame=servicos, x='name', y='preco', color='cab_type', **barras_erro)
+        fig3.update_layout(xaxis_title='Serviço', yaxis_title='Preço previsto (USD)')
 
         # Adicionar rótulos de preço nas barras
         fig3.update_traces(texttemplate='%{y:.2f}', textposition='outside')
 
         st.plotly_chart(fig3)
-    else:
-        st.info("Para ver a análise de preços, primeiro calcule o preço na aba 'Dados da Corrida'.")
 
 # Informações adicionais no sidebar
 st.sidebar.header("Sobre o modelo")
@@ -430,6 +549,35 @@ with st.sidebar.expander("APIs de Mapas Gratuitas"):
     - OSRM: motor de roteamento de código aberto
     """)
 
+# Uso do cache de previsões (acertos/faltas desde o início do servidor)
+if cache_previsoes is not None:
+    with st.sidebar.expander("Cache de previsões"):
+        st.json(cache_previsoes.estatisticas())
+
+# Uso do cache de rotas (acertos/faltas desde o início do servidor)
+if os.getenv('API_ORS'):
+    with st.sidebar.expander("Cache de rotas"):
+        st.json(obter_roteador_ors(os.getenv('API_ORS')).estatisticas())
+
+# Deriva das cotações recentes em relação ao treino (PSI e KS por feature)
+if monitor_deriva is not None:
+    deriva = monitor_deriva.estatisticas()
+    with st.sidebar.expander("Deriva dos dados"):
+        if deriva['alertas']:
+            st.warning(f"Deriva em: {', '.join(deriva['alertas'])}")
+        st.caption(f"{deriva['janela']} cotações na janela")
+        st.dataframe(pd.DataFrame(deriva['features']).T)
+
+# Latências por etapa (percentis estimados dos histogramas) e contadores
+with st.sidebar.expander("Métricas"):
+    st.json(metricas.para_dict())
+    st.download_button("Baixar (Prometheus)", metricas.para_prometheus(), file_name="metricas.prom",
+                       mime="text/plain")
+
+# Arquivo para o textfile collector do node_exporter, atualizado a cada execução
+if os.getenv('PRECO_METRICAS_ARQUIVO'):
+    metricas.exportar_arquivo(os.getenv('PRECO_METRICAS_ARQUIVO'))
+
 # Sidebar para explicação de Target Encoding
 with st.sidebar.expander("O que é Target Encoding?"):
     st.write("""
@@ -0,0 +1,368 @@
+"""
+Pacote de artefatos do modelo com carregamento por mmap.
+
+Formato (um diretório):
+    manifesto.json   versão, pré-processamento (encoding + padronização),
+                     fator de correção de rodovia (geo.py),
+                     hash/shape/dtype de cada array, distribuições de
+                     referência do treino para o monitor de deriva (deriva.py)
+                     e, em modelos destilados (destilacao.py), a versão do
+                     modelo de origem
+    <array>.npy      arrays da FlorestaPlana, abertos com np.load(mmap_mode='r')
+
+Abrir o pacote só lê o manifesto; as páginas dos arrays são carregadas sob
+demanda pelo sistema operacional e compartilhadas entre todos os processos
+do host que abrirem os mesmos arquivos.
+
+Cada versão é gravada em um diretório próprio, `.<nome>/<versao>/`, ao lado
+do caminho do pacote, e `<nome>` (ex.: artefatos) é um symlink para a versão
+atual. Reexportar nunca sobrescreve arquivos que app, serviço ou workers do
+backtest têm mapeados: a versão nova é montada à parte e entra com a troca
+do symlink (um único os.replace). Quem abre o pacote fixa o diretório da
+versão (realpath), então manifesto e arrays lidos depois são sempre da mesma
+versão; as últimas MANTER_VERSOES versões ficam no disco.
+
+Exportação a partir dos artefatos atuais:
+    python artefatos.py --modelo joblib/modelo_preco_uber.joblib \
+        --scaler joblib/scaler_preco_uber.joblib --encoders pkl/target_encoders.pkl
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import cached_property
+
+import joblib
+import numpy as np
+
+from floresta import FlorestaPlana, exportar_floresta
+from geo import FATOR_RODOVIA_PADRAO
+from precificacao import Precificador, carregar_precificador
+from preprocessamento import PreProcessador
+
+DIRETORIO_PADRAO = 'artefatos'
+DIRETORIO_COMPACTO = 'artefatos_compacto'
+MANIFESTO = 'manifesto.json'
+VERSAO_FORMATO = 2
+MANTER_VERSOES = 3
+
+# Camadas de modelo selecionáveis por configuração (env PRECO_CAMADA)
+CAMADAS = {'completo': DIRETORIO_PADRAO, 'compacto': DIRETORIO_COMPACTO}
+CAMADA_PADRAO = 'completo'
+
+
+def _sha256(caminho, bloco=1 << 20):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        while True:
+            dados = f.read(bloco)
+            if not dados:
+                return h.hexdigest()
+            h.update(dados)
+
+
+def _versao(manifesto):
+    """Identificador do conjunto modelo + pré-processamento."""
+    conteudo = {chave: valor for chave, valor in manifesto.items() if chave not in ('versao', 'criado_em')}
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def tamanho_pacote(diretorio):
+    """Soma do tamanho dos arquivos do pacote (bytes)."""
+    return sum(os.path.getsize(os.path.join(diretorio, nome)) for nome in os.listdir(diretorio))
+
+
+def _diretorio_versoes(diretorio):
+    """Onde ficam as versões do pacote: `artefatos` -> `.artefatos`."""
+    pai, nome = os.path.split(os.path.normpath(diretorio))
+    return os.path.join(pai, f'.{nome}')
+
+
+def _instalar(temporario, diretorio, versao, manter=MANTER_VERSOES):
+    """
+    Move um pacote completo para `.<nome>/<versao>/` e aponta `diretorio` para ele.
+
+    Args:
+        temporario: Diretório com o pacote já gravado, dentro de _diretorio_versoes
+        diretorio: Caminho publicado (symlink)
+        versao: Versão do manifesto
+        manter: Versões mantidas no disco, contando a atual
+    """
+    versoes = _diretorio_versoes(diretorio)
+    destino = os.path.join(versoes, versao)
+    if os.path.exists(os.path.join(destino, MANIFESTO)):
+        # Mesma versão já instalada: o conteúdo é o mesmo (a versão cobre os hashes)
+        shutil.rmtree(temporario)
+    else:
+        if os.path.exists(destino):
+            shutil.rmtree(destino)  # sobra incompleta, nunca publicada
+        os.chmod(temporario, 0o755)
+        os.replace(temporario, destino)
+
+    # O symlink novo é criado ao lado e troca o antigo em um único rename
+    link = f'{os.path.normpath(diretorio)}.tmp-{os.getpid()}'
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.join(os.path.basename(versoes), versao), link)
+    if os.path.isdir(diretorio) and not os.path.islink(diretorio):
+        # Pacote no formato antigo (diretório comum): sai do caminho uma única vez
+        os.replace(diretorio, os.path.join(versoes, f'legado-{time.strftime("%Y%m%d-%H%M%S")}'))
+    os.replace(link, diretorio)
+
+    # Arquivos já mapeados continuam válidos depois de apagados; só quem abriu
+    # o manifesto de uma versão podada e ainda não mapeou os arrays falharia
+    antigas = sorted((nome for nome in os.listdir(versoes) if nome != versao and not nome.startswith('.')),
+                     key=lambda nome: os.path.getmtime(os.path.join(versoes, nome)), reverse=True)
+    for nome in antigas[max(manter - 1, 0):]:
+        shutil.rmtree(os.path.join(versoes, nome), ignore_errors=True)
+
+
+def publicar(origem, diretorio, manter=MANTER_VERSOES):
+    """
+    Publica uma cópia do pacote `origem` em `diretorio`, com troca atômica.
+
+    Args:
+        origem: Pacote completo (ex.: o candidato escolhido por treino.py)
+        diretorio: Caminho publicado (ex.: artefatos)
+        manter: Versões mantidas no disco, contando a atual
+
+    Returns:
+        Versão publicada
+    """
+    with open(os.path.join(origem, MANIFESTO), encoding='utf-8') as f:
+        versao = json.load(f)['versao']
+    versoes = _diretorio_versoes(diretorio)
+    os.makedirs(versoes, exist_ok=True)
+    temporario = tempfile.mkdtemp(prefix='.tmp-', dir=versoes)
+    shutil.copytree(origem, temporario, dirs_exist_ok=True)
+    _instalar(temporario, diretorio, versao, manter)
+    return versao
+
+
+def diretorio_camada(camada=None):
+    """
+    Diretório do pacote da camada de modelo configurada.
+
+    Args:
+        camada: 'completo' (floresta original) ou 'compacto' (modelo destilado);
+            padrão: env PRECO_CAMADA ou 'completo'
+
+    Raises:
+        ValueError: Camada desconhecida
+        FileNotFoundError: Camada compacta pedida sem pacote exportado
+    """
+    camada = camada or os.getenv('PRECO_CAMADA', CAMADA_PADRAO)
+    if camada not in CAMADAS:
+        raise ValueError(f"Camada de modelo desconhecida: {camada!r} (use {sorted(CAMADAS)})")
+    diretorio = CAMADAS[camada]
+    if camada != CAMADA_PADRAO and not os.path.exists(os.path.join(diretorio, MANIFESTO)):
+        raise FileNotFoundError(f"Pacote da camada '{camada}' não encontrado em '{diretorio}' "
+                                f"(gere com python destilacao.py)")
+    return diretorio
+
+
+def salvar_artefatos(diretorio, modelo, preprocessador, fator_rodovia=None, destilacao=None, referencia=None):
+    """
+    Exporta modelo e pré-processamento para um pacote versionado.
+
+    O pacote é montado em um diretório temporário e publicado em `diretorio`
+    com troca atômica (ver _instalar); a versão em uso não é tocada.
+
+    Args:
+        diretorio: Caminho do pacote (symlink para a versão gravada)
+        modelo: RandomForestRegressor treinado ou FlorestaPlana
+        preprocessador: PreProcessador ajustado
+        fator_rodovia: Fator de correção de rodovia ajustado no treino
+            (None = fator padrão)
+        destilacao: Metadados de um modelo destilado (versão do modelo de
+            origem, hiperparâmetros); None para a floresta original
+        referencia: Distribuições das features e do preço no treino
+            (deriva.referencia_modelo); None desativa o monitor de deriva
+
+    Returns:
+        Versão gravada no manifesto
+    """
+    floresta = modelo if isinstance(modelo, FlorestaPlana) else exportar_floresta(modelo)
+    versoes = _diretorio_versoes(diretorio)
+    os.makedirs(versoes, exist_ok=True)
+    temporario = tempfile.mkdtemp(prefix='.tmp-', dir=versoes)
+    try:
+        manifesto = _gravar(temporario, floresta, preprocessador, fator_rodovia, destilacao, referencia)
+    except BaseException:
+        shutil.rmtree(temporario, ignore_errors=True)
+        raise
+    _instalar(temporario, diretorio, manifesto['versao'])
+    return manifesto['versao']
+
+
+def _gravar(diretorio, floresta, preprocessador, fator_rodovia, destilacao, referencia):
+    """Grava arrays e manifesto em um diretório novo (ainda não publicado)."""
+    arrays = {}
+    for nome in FlorestaPlana.ARRAYS:
+        array = np.ascontiguousarray(getattr(floresta, nome))
+        caminho = os.path.join(diretorio, f'{nome}.npy')
+        np.save(caminho, array)
+        arrays[nome] = {'arquivo': f'{nome}.npy', 'sha256': _sha256(caminho),
+                        'shape': list(array.shape), 'dtype': array.dtype.str}
+
+    manifesto = {
+        'formato': VERSAO_FORMATO,
+        'preprocessamento': preprocessador.para_dict(),
+        'floresta': {'profundidade': floresta.profundidade, 'n_features': floresta.n_features,
+                     'arrays': arrays},
+    }
+    if fator_rodovia is not None:
+        manifesto['fator_rodovia'] = float(fator_rodovia)
+    if destilacao is not None:
+        manifesto['destilacao'] = destilacao
+    if referencia is not None:
+        manifesto['deriva'] = referencia
+    manifesto['versao'] = _versao(manifesto)
+    manifesto['criado_em'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    # O diretório ainda não é visível para os leitores: nenhum deles vê um
+    # manifesto apontando para arrays de outra versão
+    with open(os.path.join(diretorio, MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    return manifesto
+
+
+class ArtefatosModelo:
+    """
+    Pacote de artefatos aberto; a floresta só é mapeada no primeiro acesso.
+    """
+
+    def __init__(self, diretorio, manifesto, mmap=True):
+        self.diretorio = diretorio
+        self.manifesto = manifesto
+        self.mmap = mmap
+
+    @property
+    def versao(self):
+        return self.manifesto['versao']
+
+    @property
+    def fator_rodovia(self):
+        return self.manifesto.get('fator_rodovia', FATOR_RODOVIA_PADRAO)
+
+    @property
+    def destilado(self):
+        """Modelo destilado: as árvores isoladas não são preços (sem quantis entre árvores)."""
+        return 'destilacao' in self.manifesto
+
+    @property
+    def referencia_deriva(self):
+        """Distribuições de referência do treino (deriva.py), ou None em pacotes sem elas."""
+        return self.manifesto.get('deriva')
+
+    @cached_property
+    def preprocessador(self):
+        return PreProcessador.de_dict(self.manifesto['preprocessamento'])
+
+    @cached_property
+    def floresta(self):
+        info = self.manifesto['floresta']
+        arrays = {}
+        for nome, meta in info['arrays'].items():
+            array = np.load(os.path.join(self.diretorio, meta['arquivo']),
+                            mmap_mode='r' if self.mmap else None)
+            if list(array.shape) != meta['shape'] or array.dtype.str != meta['dtype']:
+                raise ValueError(f"Array '{nome}' não corresponde ao manifesto {self.versao}")
+            arrays[nome] = array
+        return FlorestaPlana(**arrays, profundidade=info['profundidade'], n_features=info['n_features'])
+
+    def verificar(self):
+        """Confere o hash de todos os arrays (lê os arquivos inteiros)."""
+        for nome, meta in self.manifesto['floresta']['arrays'].items():
+            if _sha256(os.path.join(self.diretorio, meta['arquivo'])) != meta['sha256']:
+                raise ValueError(f"Hash de '{nome}' diverge do manifesto {self.versao}")
+        if _versao(self.manifesto) != self.versao:
+            raise ValueError("Manifesto alterado após a exportação")
+
+    def precificador(self):
+        return Precificador(self.floresta, self.preprocessador, destilado=self.destilado)
+
+
+def carregar_artefatos(diretorio=DIRETORIO_PADRAO, mmap=True, verificar=False):
+    """
+    Abre um pacote de artefatos.
+
+    Args:
+        diretorio: Diretório exportado por salvar_artefatos
+        mmap: Se True, os arrays são mapeados em memória (somente leitura)
+        verificar: Se True, confere o hash de todos os arrays antes de retornar
+
+    Returns:
+        ArtefatosModelo
+    """
+    # Fixa a versão atual: uma republicação depois disso não muda os arrays lidos
+    diretorio = os.path.realpath(diretorio)
+    with open(os.path.join(diretorio, MANIFESTO), encoding='utf-8') as f:
+        manifesto = json.load(f)
+    if manifesto.get('formato') != VERSAO_FORMATO:
+        raise ValueError(f"Formato de artefatos não suportado: {manifesto.get('formato')}")
+
+    artefatos = ArtefatosModelo(diretorio, manifesto, mmap=mmap)
+    if verificar:
+        artefatos.verificar()
+    return artefatos
+
+
+def abrir_precificador(diretorio=DIRETORIO_PADRAO):
+    """
+    Precificador a partir do pacote mmap, ou dos arquivos joblib/pickle se o
+    pacote ainda não tiver sido exportado.
+    """
+    if os.path.exists(os.path.join(diretorio, MANIFESTO)):
+        return carregar_artefatos(diretorio).precificador()
+    return carregar_precificador()
+
+
+def ler_versao(diretorio=DIRETORIO_PADRAO):
+    """Versão do pacote de artefatos, ou None se não houver pacote."""
+    if os.path.exists(os.path.join(diretorio, MANIFESTO)):
+        return carregar_artefatos(diretorio).versao
+    return None
+
+
+def ler_referencia_deriva(diretorio=DIRETORIO_PADRAO):
+    """Distribuições de referência do monitor de deriva, ou None sem pacote ou sem referência."""
+    if os.path.exists(os.path.join(diretorio, MANIFESTO)):
+        return carregar_artefatos(diretorio).referencia_deriva
+    return None
+
+
+def ler_fator_rodovia(diretorio=DIRETORIO_PADRAO):
+    """Fator de correção de rodovia do pacote, ou o padrão se não houver pacote."""
+    if os.path.exists(os.path.join(diretorio, MANIFESTO)):
+        return carregar_artefatos(diretorio).fator_rodovia
+    return FATOR_RODOVIA_PADRAO
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporta os artefatos para o formato mmap')
+    parser.add_argument('--modelo', default='joblib/modelo_preco_uber.joblib')
+    parser.add_argument('--scaler', default='joblib/scaler_preco_uber.joblib')
+    parser.add_argument('--encoders', default='pkl/target_encoders.pkl')
+    parser.add_argument('--saida', default=DIRETORIO_PADRAO)
+    parser.add_argument('--fator-rodovia', type=float, default=None,
+                        help='fator de correção de rodovia (ver geo.py)')
+    args = parser.parse_args()
+
+    modelo = joblib.load(args.modelo)
+    scaler = joblib.load(args.scaler)
+    with open(args.encoders, 'rb') as f:
+        target_encoders = pickle.load(f)
+
+    versao = salvar_artefatos(args.saida, modelo, PreProcessador.de_encoders(target_encoders, scaler),
+                              args.fator_rodovia)
+    print(f"Artefatos exportados em '{args.saida}' (versão {versao})")
+
+
+if __name__ == '__main__':
+    main()
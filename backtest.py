@@ -0,0 +1,215 @@
+"""
+Backtest do modelo sobre o histórico de corridas, em blocos e em paralelo.
+
+As corridas vêm do cache colunar (ingestao.py), aberto com mmap; o CSV, se
+informado, só é lido de novo quando mudou. Cada bloco de linhas é pontuado
+por um processo do pool, e todos os processos abrem o mesmo pacote de
+artefatos com mmap, então o modelo ocupa a memória uma vez só. Cada bloco
+grava previsões e erros em um arquivo Parquet e devolve as estatísticas da
+tabela de erro por faixa de preço do notebook, que é acumulada à medida que
+os blocos terminam.
+
+Uso:
+    python backtest.py --csv rideshare_kaggle.csv --artefatos artefatos \
+        --saida backtest --chunk 100000 --processos 4 [--teste]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from artefatos import DIRETORIO_PADRAO, carregar_artefatos
+from ingestao import ALVO, DIRETORIO_CACHE, TAMANHO_CHUNK, carregar_colunas, garantir_cache, ler_meta
+
+DIRETORIO_SAIDA = 'backtest'
+ARQUIVO_RESUMO = 'resumo.json'
+# Faixas de preço do notebook (pd.cut, intervalos fechados à direita)
+FAIXAS = [0, 10, 20, 30, 40, 100]
+# Colunas de identificação copiadas para o Parquet ao lado das previsões
+COLUNAS_SAIDA = ['source', 'destination', 'name', 'distance', 'surge_multiplier']
+
+_worker = {}
+
+
+def estatisticas_faixas(real, erro, faixas=FAIXAS):
+    """
+    Somas suficientes para a tabela de erro por faixa de um bloco.
+
+    Returns:
+        np.ndarray (4, n_faixas): contagem, soma do erro, soma do erro ao
+        quadrado e soma do erro absoluto
+    """
+    # Mesmo critério de pd.cut: faixa i contém faixas[i] < real <= faixas[i + 1]
+    faixa = np.searchsorted(faixas, real, side='left') - 1
+    validos = (faixa >= 0) & (faixa < len(faixas) - 1)
+    faixa, erro = faixa[validos], erro[validos]
+    n = len(faixas) - 1
+    return np.vstack([
+        np.bincount(faixa, minlength=n),
+        np.bincount(faixa, weights=erro, minlength=n),
+        np.bincount(faixa, weights=erro ** 2, minlength=n),
+        np.bincount(faixa, weights=np.abs(erro), minlength=n),
+    ]).astype(np.float64)
+
+
+def tabela_faixas(acumulado, faixas=FAIXAS):
+    """
+    Tabela de erro por faixa de preço (mean, std e count do notebook, mais o MAE).
+
+    Args:
+        acumulado: Soma das saídas de estatisticas_faixas de todos os blocos
+    """
+    contagem, soma, soma_quadrados, soma_abs = acumulado
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = soma / contagem
+        # Desvio padrão amostral (ddof=1), como o groupby do pandas
+        std = np.sqrt(np.maximum(soma_quadrados - contagem * media ** 2, 0) / (contagem - 1))
+        mae = soma_abs / contagem
+    rotulos = [f'({a}, {b}]' for a, b in zip(faixas[:-1], faixas[1:])]
+    return pd.DataFrame({'mean': media, 'std': std, 'count': contagem.astype(np.int64), 'mae': mae},
+                        index=pd.Index(rotulos, name='faixa_preco'))
+
+
+def _iniciar_worker(diretorio_artefatos, diretorio_cache, linhas):
+    precificador = carregar_artefatos(diretorio_artefatos).precificador()
+    # Categorias do histórico que o encoding não conhece recebem o prior em vez de abortar o bloco
+    precificador.preprocessador.politica_desconhecida = 'prior'
+    colunas, meta = carregar_colunas(diretorio_cache, mmap=True)
+    _worker.update(
+        precificador=precificador,
+        colunas=colunas,
+        vocabularios={col: np.asarray(valores, dtype=object) for col, valores in meta['categorias'].items()},
+        linhas=linhas,
+    )
+
+
+def pontuar_bloco(indice, inicio, fim, saida):
+    """
+    Pontua as linhas [inicio, fim) (do cache ou da seleção de linhas) e grava o Parquet.
+
+    Returns:
+        Tupla (índice, linhas, estatisticas_faixas, segundos de CPU)
+    """
+    cpu = time.process_time()
+    linhas = _worker['linhas']
+    selecao = slice(inicio, fim) if linhas is None else linhas[inicio:fim]
+
+    dados = {}
+    for col, valores in _worker['colunas'].items():
+        valores = valores[selecao]
+        if col in _worker['vocabularios']:
+            dados[col] = _worker['vocabularios'][col][valores]
+        else:
+            dados[col] = np.asarray(valores, dtype=np.float64)
+
+    previsto = _worker['precificador'].predict_batch(dados)
+    real = dados[ALVO]
+    erro = real - previsto
+
+    numero = np.arange(inicio, fim) if linhas is None else linhas[inicio:fim]
+    pd.DataFrame({
+        'linha': numero,
+        **{col: dados[col] for col in COLUNAS_SAIDA},
+        'real': real,
+        'previsto': previsto,
+        'erro': erro,
+    }).to_parquet(os.path.join(saida, f'parte_{indice:05d}.parquet'), index=False)
+    return indice, fim - inicio, estatisticas_faixas(real, erro), time.process_time() - cpu
+
+
+def backtest(diretorio_cache=DIRETORIO_CACHE, diretorio_artefatos=DIRETORIO_PADRAO, saida=DIRETORIO_SAIDA,
+             tamanho_chunk=TAMANHO_CHUNK, processos=None, somente_teste=False, seed=42):
+    """
+    Pontua o histórico inteiro (ou só a parte de teste) e grava Parquet + resumo.
+
+    Args:
+        diretorio_cache: Cache colunar gerado por ingestao.py
+        diretorio_artefatos: Pacote de artefatos do modelo
+        saida: Diretório dos arquivos Parquet e do resumo.json
+        tamanho_chunk: Linhas por bloco
+        processos: Tamanho do pool (padrão: número de CPUs)
+        somente_teste: Pontua só as linhas de teste da divisão 80/20 do treino
+        seed: Semente da divisão (a mesma de treino.py)
+
+    Returns:
+        Dicionário gravado em resumo.json (com a tabela por faixa)
+    """
+    n_linhas = ler_meta(diretorio_cache)['linhas']
+    linhas = None
+    if somente_teste:
+        # Mesma chamada de treino.py sobre as mesmas n linhas: mesmos índices de teste
+        _, teste = train_test_split(np.arange(n_linhas), test_size=0.2, random_state=seed)
+        linhas = np.sort(teste)
+    total = n_linhas if linhas is None else len(linhas)
+
+    os.makedirs(saida, exist_ok=True)
+    for nome in os.listdir(saida):
+        if nome.startswith('parte_') and nome.endswith('.parquet'):
+            os.remove(os.path.join(saida, nome))
+
+    processos = processos or os.cpu_count()
+    acumulado = np.zeros((4, len(FAIXAS) - 1))
+    pontuadas, cpu = 0, 0.0
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_worker,
+                             initargs=(diretorio_artefatos, diretorio_cache, linhas)) as pool:
+        futuros = [pool.submit(pontuar_bloco, i, a, min(a + tamanho_chunk, total), saida)
+                   for i, a in enumerate(range(0, total, tamanho_chunk))]
+        for futuro in as_completed(futuros):
+            _, n, estatisticas, segundos = futuro.result()
+            acumulado += estatisticas
+            pontuadas += n
+            cpu += segundos
+            print(f"\r{pontuadas:,}/{total:,} linhas", end='', flush=True)
+    print()
+    duracao = time.perf_counter() - inicio
+
+    tabela = tabela_faixas(acumulado)
+    contagem, soma, soma_quadrados, soma_abs = acumulado.sum(axis=1)
+    resumo = {
+        'versao_modelo': carregar_artefatos(diretorio_artefatos).versao,
+        'linhas': pontuadas,
+        'somente_teste': somente_teste,
+        'mae_faixas': float(soma_abs / contagem) if contagem else None,
+        'segundos': duracao,
+        'processos': processos,
+        'linhas_por_segundo': pontuadas / duracao,
+        'linhas_por_segundo_por_nucleo': pontuadas / duracao / processos,
+        'linhas_por_segundo_cpu': pontuadas / cpu if cpu else None,
+        'faixas': json.loads(tabela.reset_index().to_json(orient='records')),
+    }
+    with open(os.path.join(saida, ARQUIVO_RESUMO), 'w', encoding='utf-8') as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=2)
+    resumo['tabela'] = tabela
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest do modelo sobre o histórico de corridas')
+    parser.add_argument('--csv', help='CSV do Kaggle (ingerido para o cache se necessário)')
+    parser.add_argument('--cache', default=DIRETORIO_CACHE)
+    parser.add_argument('--artefatos', default=DIRETORIO_PADRAO)
+    parser.add_argument('--saida', default=DIRETORIO_SAIDA)
+    parser.add_argument('--chunk', type=int, default=TAMANHO_CHUNK)
+    parser.add_argument('--processos', type=int, default=None)
+    parser.add_argument('--teste', action='store_true', help='só as linhas de teste da divisão do treino')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.csv:
+        garantir_cache(args.csv, args.cache)
+    resumo = backtest(args.cache, args.artefatos, args.saida, args.chunk, args.processos, args.teste, args.seed)
+
+    print(resumo['tabela'].to_string(float_format=lambda v: f'{v:.3f}'))
+    print(f"{resumo['linhas']:,} linhas em {resumo['segundos']:.1f}s: "
+          f"{resumo['linhas_por_segundo']:,.0f} linhas/s, "
+          f"{resumo['linhas_por_segundo_por_nucleo']:,.0f} linhas/s por núcleo ({resumo['processos']} processos)")
+
+
+if __name__ == '__main__':
+    main()
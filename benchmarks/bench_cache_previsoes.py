@@ -0,0 +1,53 @@
+"""
+CachePrevisoes contra o Precificador direto em uma sequência de cotações de
+uma corrida em que os usuários alternam entre poucas configurações.
+
+Uso:
+    python -m benchmarks.bench_cache_previsoes [--cotacoes 3000 --configuracoes 50]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+from cache_previsoes import CachePrevisoes
+from floresta import exportar_floresta
+from precificacao import Precificador
+from preprocessamento import PreProcessador
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memo de previsões vs modelo direto')
+    parser.add_argument('--cotacoes', type=int, default=3000)
+    parser.add_argument('--configuracoes', type=int, default=50)
+    args = parser.parse_args()
+
+    modelo, scaler, target_encoders, _ = gerar_artefatos(n_corridas=20000, n_estimators=100)
+    preprocessador = PreProcessador.de_encoders(target_encoders, scaler)
+    configuracoes = gerar_corridas(args.configuracoes, seed=13).to_dict('records')
+    # Acessos concentrados em poucas configurações (Zipf), como cliques repetidos
+    rng = np.random.default_rng(13)
+    sequencia = np.minimum(rng.zipf(1.3, args.cotacoes) - 1, args.configuracoes - 1)
+
+    print(f"{'modelo':>14} {'direto (µs)':>12} {'memo (µs)':>10} {'acertos':>8}")
+    for nome, m in [('sklearn', modelo), ('FlorestaPlana', exportar_floresta(modelo))]:
+        precificador = Precificador(m, preprocessador)
+        cache = CachePrevisoes(precificador, versao=nome, capacidade=32)
+        entradas = [{col: [valor] for col, valor in configuracoes[i].items()} for i in sequencia]
+
+        inicio = time.perf_counter()
+        diretos = [precificador.predict_batch(e)[0] for e in entradas]
+        t_direto = (time.perf_counter() - inicio) / len(entradas)
+
+        inicio = time.perf_counter()
+        memo = [cache.predict_batch(e)[0] for e in entradas]
+        t_memo = (time.perf_counter() - inicio) / len(entradas)
+
+        assert np.allclose(diretos, memo)
+        print(f"{nome:>14} {t_direto * 1e6:>12.1f} {t_memo * 1e6:>10.1f} "
+              f"{cache.estatisticas()['taxa_acerto']:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Tempo de cold start: joblib/pickle contra o pacote de artefatos com mmap.
+
+Cada medição roda em um processo novo e cobre do início do carregamento até a
+primeira previsão. Também mostra quanto da memória residente é compartilhável
+(páginas mapeadas dos arquivos) e quanto é privada do processo.
+
+Uso:
+    python -m benchmarks.bench_cold_start [--arvores 100] [--processos 4]
+"""
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import joblib
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+
+
+def _memoria():
+    """Rss/Pss/privada/compartilhada (MB) do processo atual, via /proc."""
+    campos = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for linha in f:
+                partes = linha.split()
+                if len(partes) == 3 and partes[2] == 'kB':
+                    campos[partes[0].rstrip(':')] = int(partes[1]) / 1024
+    except OSError:
+        return {}
+    return {
+        'rss': campos.get('Rss', 0),
+        'pss': campos.get('Pss', 0),
+        'privada': campos.get('Private_Clean', 0) + campos.get('Private_Dirty', 0),
+        'compartilhada': campos.get('Shared_Clean', 0) + campos.get('Shared_Dirty', 0),
+    }
+
+
+def filho(modo, diretorio):
+    corrida = gerar_corridas(1, seed=5)
+
+    inicio = time.perf_counter()
+    if modo == 'joblib':
+        from precificacao import carregar_precificador
+        precificador = carregar_precificador(os.path.join(diretorio, 'modelo.joblib'),
+                                             os.path.join(diretorio, 'scaler.joblib'),
+                                             os.path.join(diretorio, 'encoders.pkl'))
+    else:
+        from artefatos import carregar_artefatos
+        precificador = carregar_artefatos(os.path.join(diretorio, 'artefatos')).precificador()
+    carregado = time.perf_counter()
+    precificador.predict_batch(corrida)
+    fim = time.perf_counter()
+
+    print(json.dumps({'carga': carregado - inicio, 'primeira': fim - inicio, **_memoria()}))
+
+
+def medir(modo, diretorio, processos):
+    comando = [sys.executable, '-m', 'benchmarks.bench_cold_start', '--filho', modo, diretorio]
+    execucoes = [subprocess.Popen(comando, stdout=subprocess.PIPE, text=True) for _ in range(processos)]
+    return [json.loads(p.communicate()[0]) for p in execucoes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start joblib vs mmap')
+    parser.add_argument('--arvores', type=int, default=100)
+    parser.add_argument('--processos', type=int, default=4, help='workers simultâneos por modo')
+    parser.add_argument('--filho', nargs=2, metavar=('MODO', 'DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        filho(*args.filho)
+        return
+
+    from artefatos import salvar_artefatos
+    from preprocessamento import PreProcessador
+
+    modelo, scaler, target_encoders, _ = gerar_artefatos(n_estimators=args.arvores)
+    modelo.set_params(n_jobs=1)
+    with tempfile.TemporaryDirectory() as diretorio:
+        joblib.dump(modelo, os.path.join(diretorio, 'modelo.joblib'))
+        joblib.dump(scaler, os.path.join(diretorio, 'scaler.joblib'))
+        with open(os.path.join(diretorio, 'encoders.pkl'), 'wb') as f:
+            pickle.dump(target_encoders, f)
+        salvar_artefatos(os.path.join(diretorio, 'artefatos'), modelo,
+                         PreProcessador.de_encoders(target_encoders, scaler))
+
+        print(f"{'modo':>7} {'carga (s)':>10} {'1ª previsão (s)':>16} {'RSS (MB)':>9} "
+              f"{'PSS (MB)':>9} {'privada (MB)':>13}")
+        for modo in ('joblib', 'mmap'):
+            resultados = medir(modo, diretorio, args.processos)
+            media = {k: sum(r[k] for r in resultados) / len(resultados) for k in resultados[0]}
+            print(f"{modo:>7} {media['carga']:>10.3f} {media['primeira']:>16.3f} "
+                  f"{media.get('rss', 0):>9.1f} {media.get('pss', 0):>9.1f} {media.get('privada', 0):>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Monitor de deriva (deriva.py): custo no caminho de uma cotação, vazão da
+thread de contagem e detecção por PSI/KS com cotações da mesma distribuição
+do treino e com multiplicador e distância deslocados.
+
+Uso:
+    python -m benchmarks.bench_deriva [--repeticoes 2000] [--janela 5000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+from deriva import MonitorDeriva, referencia_modelo
+from floresta import exportar_floresta
+from precificacao import Precificador
+from preprocessamento import PreProcessador
+
+
+def _tempo(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def _cotar(monitor, precificador, corridas, tamanho_lote=1):
+    """Cotações em lotes, como chegam do app (1) ou do serviço (micro-lotes)."""
+    for inicio in range(0, len(corridas), tamanho_lote):
+        lote = {col: valores.to_numpy() for col, valores in corridas.iloc[inicio:inicio + tamanho_lote].items()}
+        monitor.observar(lote, precificador.predict_batch(lote))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Custo e detecção do monitor de deriva')
+    parser.add_argument('--repeticoes', type=int, default=2000)
+    parser.add_argument('--janela', type=int, default=5000)
+    args = parser.parse_args()
+
+    modelo, scaler, target_encoders, treino = gerar_artefatos(n_corridas=20000, n_estimators=100)
+    preprocessador = PreProcessador.de_encoders(target_encoders, scaler)
+    precificador = Precificador(exportar_floresta(modelo), preprocessador)
+    referencia = referencia_modelo(preprocessador, treino, precificador.predict_batch(treino))
+
+    # 1) Custo no caminho da cotação: observar só enfileira
+    monitor = MonitorDeriva(referencia, preprocessador, args.janela, intervalo=3600)
+    corrida = {col: valores.to_numpy() for col, valores in gerar_corridas(1, seed=3).items()}
+    preco = precificador.predict_batch(corrida)
+
+    def cotar_e_observar():
+        monitor.observar(corrida, precificador.predict_batch(corrida))
+
+    # Medições alternadas (melhor de 5), para o ruído do predict não dominar a diferença
+    t_predict, t_com = float('inf'), float('inf')
+    for _ in range(5):
+        t_predict = min(t_predict, _tempo(lambda: precificador.predict_batch(corrida), args.repeticoes // 5))
+        t_com = min(t_com, _tempo(cotar_e_observar, args.repeticoes // 5))
+    t_observar = _tempo(lambda: monitor.observar(corrida, preco), args.repeticoes * 10)
+    print(f"predict (1 corrida):             {t_predict * 1e6:8.1f} µs")
+    print(f"predict + observar:              {t_com * 1e6:8.1f} µs ({t_com / t_predict - 1:+.1%})")
+    print(f"observar isolado:                {t_observar * 1e6:8.2f} µs ({t_observar / t_predict:.2%} de um predict)")
+
+    # Vazão da thread: contagem das faixas dos lotes enfileirados
+    pendentes = len(monitor._pendentes)
+    inicio = time.perf_counter()
+    monitor.processar()
+    t_processar = time.perf_counter() - inicio
+    print(f"contagem na thread:              {pendentes / t_processar:8.0f} cotações/s (lotes de 1)")
+    memoria = monitor._contagens.nbytes
+    monitor.fechar()
+
+    # 2) Mesma distribuição do treino: nenhum alerta
+    monitor = MonitorDeriva(referencia, preprocessador, args.janela, intervalo=3600)
+    _cotar(monitor, precificador, gerar_corridas(args.janela, seed=11), tamanho_lote=16)
+    estavel = monitor.estatisticas()
+    assert estavel['janela'] > 0 and not estavel['alertas'], estavel['alertas']
+    assert monitor._contagens.nbytes == memoria
+    monitor.fechar()
+
+    # 2b) Cotações como as do app: só 'temperature' (70 °F, o padrão do
+    #     formulário), com as temperaturas do modelo e a latitude derivadas;
+    #     o treino está por volta de 40 °F, então as temperaturas derivadas e
+    #     a informada entram em alerta e as demais features não
+    monitor = MonitorDeriva(referencia, preprocessador, args.janela, intervalo=3600)
+    do_app = gerar_corridas(args.janela, seed=13).drop(columns=['latitude', 'apparentTemperatureLow', 'temperatureHigh'])
+    do_app['temperature'] = 70.0
+    _cotar(monitor, precificador, do_app, tamanho_lote=16)
+    formulario = monitor.estatisticas()
+    assert {'temperature', 'apparentTemperatureLow', 'temperatureHigh'} <= set(formulario['alertas']), \
+        formulario['alertas']
+    assert not {'latitude', 'distance', 'surge_multiplier', 'pressure'} & set(formulario['alertas'])
+    monitor.fechar()
+
+    # 3) Multiplicador sempre alto e corridas mais longas: alertas nessas
+    #    features e no preço; o clima e a pressão continuam estáveis
+    alertas = []
+    monitor = MonitorDeriva(referencia, preprocessador, args.janela, intervalo=3600,
+                            ao_alertar=lambda nome, valores: alertas.append(nome))
+    _cotar(monitor, precificador, gerar_corridas(args.janela, seed=11), tamanho_lote=16)
+    deslocadas = gerar_corridas(args.janela, seed=12)
+    deslocadas['surge_multiplier'] = 2.0
+    deslocadas['distance'] *= 2
+    _cotar(monitor, precificador, deslocadas, tamanho_lote=16)
+    deriva = monitor.estatisticas()
+    assert {'surge_multiplier', 'distance', 'preco'} <= set(deriva['alertas']), deriva['alertas']
+    assert 'pressure' not in deriva['alertas'] and 'short_summary' not in deriva['alertas']
+    assert sorted(alertas) == sorted(deriva['alertas'])
+    assert monitor._contagens.nbytes == memoria
+    monitor.fechar()
+
+    print(f"memória da janela:               {memoria / 1024:8.1f} KiB (constante)")
+    print(f"{'feature':>24} {'PSI estável':>12} {'KS estável':>11} {'PSI deriva':>11} {'KS deriva':>10}")
+    for nome, valores in deriva['features'].items():
+        base = estavel['features'][nome]
+        marca = ' <- alerta' if valores['alerta'] else ''
+        print(f"{nome:>24} {base['psi']:12.4f} {base['ks']:11.4f} {valores['psi']:11.4f} {valores['ks']:10.4f}{marca}")
+    assert np.isfinite([v['psi'] for v in deriva['features'].values()]).all()
+
+
+if __name__ == '__main__':
+    main()
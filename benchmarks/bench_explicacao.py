@@ -0,0 +1,47 @@
+"""
+Custo da decomposição por caminhos de decisão (FlorestaPlana.contribuicoes)
+em relação à previsão, e conferência de que viés + contribuições = previsão.
+
+Uso:
+    python -m benchmarks.bench_explicacao [--corridas 1 100 5000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+from floresta import exportar_floresta
+from preprocessamento import PreProcessador
+
+
+def _tempo(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Explicações vs previsão')
+    parser.add_argument('--corridas', type=int, nargs='+', default=[1, 100, 5000])
+    args = parser.parse_args()
+
+    modelo, scaler, target_encoders, _ = gerar_artefatos(n_corridas=20000, n_estimators=100)
+    floresta = exportar_floresta(modelo)
+    X = PreProcessador.de_encoders(target_encoders, scaler).transform(gerar_corridas(max(args.corridas), seed=7))
+
+    vies, contribuicoes = floresta.contribuicoes(X)
+    erro = np.abs(vies + contribuicoes.sum(axis=1) - modelo.predict(X)).max()
+    print(f"máx |viés + contribuições - predict| = {erro:.2e}\n")
+
+    print(f"{'corridas':>9} {'predict (ms)':>13} {'explicação (ms)':>16} {'razão':>6}")
+    for n in args.corridas:
+        repeticoes = max(3, 2000 // n)
+        t_prever = _tempo(lambda: floresta.predict(X[:n]), repeticoes)
+        t_explicar = _tempo(lambda: floresta.contribuicoes(X[:n]), repeticoes)
+        print(f"{n:>9,} {t_prever * 1000:>13.2f} {t_explicar * 1000:>16.2f} {t_explicar / t_prever:>5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Equivalência e latência da FlorestaPlana contra RandomForestRegressor.predict.
+
+Uso:
+    python -m benchmarks.bench_floresta            # floresta sintética (100 árvores)
+    python -m benchmarks.bench_floresta --reais    # joblib/ e pkl/ do projeto
+"""
+import argparse
+import pickle
+import time
+
+import numpy as np
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+from floresta import exportar_floresta
+from precificacao import Precificador, carregar_precificador
+from preprocessamento import PreProcessador
+
+
+def latencia(funcao, X, repeticoes):
+    """Mediana do tempo (ms) de várias chamadas."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(X)
+        tempos.append(time.perf_counter() - inicio)
+    return np.median(tempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--reais', action='store_true', help='usar os artefatos treinados do projeto')
+    parser.add_argument('--arvores', type=int, default=100, help='árvores do modelo sintético')
+    args = parser.parse_args()
+
+    if args.reais:
+        precificador = carregar_precificador()
+    else:
+        modelo, scaler, target_encoders, _ = gerar_artefatos(n_estimators=args.arvores)
+        precificador = Precificador(modelo, PreProcessador.de_encoders(target_encoders, scaler))
+    modelo = precificador.modelo
+
+    inicio = time.perf_counter()
+    floresta = exportar_floresta(modelo)
+    print(f"exportação: {time.perf_counter() - inicio:.2f}s | {floresta.n_arvores} árvores, "
+          f"{floresta.n_nos:,} nós, profundidade {floresta.profundidade}")
+    print(f"tamanho: sklearn (pickle) {len(pickle.dumps(modelo)) / 1e6:.1f} MB | "
+          f"arrays planos {floresta.nbytes / 1e6:.1f} MB")
+
+    corridas = gerar_corridas(10_000, seed=3)
+    X = precificador.preprocessador.transform(corridas)
+
+    # Equivalência: lote inteiro e linha a linha
+    esperado = modelo.predict(X)
+    obtido = floresta.predict(X)
+    assert np.allclose(obtido, esperado, rtol=1e-12, atol=1e-12), np.abs(obtido - esperado).max()
+    for i in range(50):
+        assert np.allclose(floresta.predict(X[i]), modelo.predict(X[i:i + 1]), rtol=1e-12, atol=1e-12)
+    print(f"equivalência ok (diferença máxima {np.abs(obtido - esperado).max():.2e})")
+
+    print(f"{'lote':>8} {'sklearn (ms)':>14} {'plana (ms)':>12}")
+    for tamanho in (1, 100, 10_000):
+        lote = X[:tamanho]
+        repeticoes = 50 if tamanho == 1 else 5
+        print(f"{tamanho:>8} {latencia(modelo.predict, lote, repeticoes):>14.3f} "
+              f"{latencia(floresta.predict, lote, repeticoes):>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Haversine vetorizado (geo.py) contra o laço escalar com `math` que existia
+nos dois fallbacks de obter_rota_ors.
+
+Uso:
+    python -m benchmarks.bench_geo [--pares 1000 100000 1000000]
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from geo import ajustar_fator_rodovia, distancia_locais, distancia_pares
+from preprocessamento import COORDENADAS
+
+
+def haversine_escalar(origem, destino):
+    """Reprodução do fallback original de app.py para um par."""
+    lon1, lat1 = math.radians(origem[1]), math.radians(origem[0])
+    lon2, lat2 = math.radians(destino[1]), math.radians(destino[0])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    return c * 3956
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Haversine: laço escalar vs NumPy')
+    parser.add_argument('--pares', type=int, nargs='+', default=[1000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    print(f"{'pares':>10} {'escalar (ms)':>13} {'vetorizado (ms)':>16} {'speedup':>8}")
+    for n in args.pares:
+        # Pontos espalhados pela região de Boston
+        origens = np.column_stack([rng.uniform(42.30, 42.40, n), rng.uniform(-71.15, -71.00, n)])
+        destinos = np.column_stack([rng.uniform(42.30, 42.40, n), rng.uniform(-71.15, -71.00, n)])
+        pares_lista = list(zip(origens.tolist(), destinos.tolist()))
+
+        inicio = time.perf_counter()
+        escalar = [haversine_escalar(o, d) for o, d in pares_lista]
+        t_escalar = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        vetorizado = distancia_pares(origens, destinos)
+        t_vetorizado = time.perf_counter() - inicio
+
+        assert np.allclose(escalar, vetorizado, rtol=1e-12, atol=1e-12)
+        print(f"{n:>10,} {t_escalar * 1000:>13.1f} {t_vetorizado * 1000:>16.2f} "
+              f"{t_escalar / t_vetorizado:>7.0f}x")
+
+    # Um par só (caminho do app): a versão NumPy tem custo fixo maior
+    o, d = COORDENADAS['Back Bay'], COORDENADAS['Fenway']
+    repeticoes = 10_000
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        haversine_escalar(o, d)
+    t_escalar = (time.perf_counter() - inicio) / repeticoes
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        distancia_pares(o, d)
+    t_vetorizado = (time.perf_counter() - inicio) / repeticoes
+    print(f"\num par: escalar {t_escalar * 1e6:.1f} µs | vetorizado {t_vetorizado * 1e6:.1f} µs")
+
+    # Fator de rodovia em corridas sintéticas com trajeto 30% maior que a linha reta
+    locais = np.array(list(COORDENADAS), dtype=object)
+    source, destination = rng.choice(locais, 100_000), rng.choice(locais, 100_000)
+    distancia = 1.3 * distancia_locais(source, destination) * rng.lognormal(0, 0.1, 100_000)
+    print(f"fator de rodovia ajustado: {ajustar_fator_rodovia(source, destination, distancia):.3f} (real 1.3)")
+
+
+if __name__ == '__main__':
+    main()
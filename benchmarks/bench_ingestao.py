@@ -0,0 +1,98 @@
+"""
+Pico de RSS e tempo: pd.read_csv do CSV inteiro contra a ingestão em blocos e
+a leitura do cache colunar.
+
+Sem o CSV real, gera um arquivo sintético com o mesmo formato (57 colunas).
+Cada medição roda em um processo novo.
+
+Uso:
+    python -m benchmarks.bench_ingestao [--csv rideshare_kaggle.csv] [--corridas 690000]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def gerar_csv(caminho, n):
+    """CSV sintético com as 13 colunas do modelo e 44 colunas extras."""
+    # Importado aqui para não pesar na memória medida nos processos filhos
+    from benchmarks.sintetico import gerar_corridas
+
+    dados = gerar_corridas(n, seed=7)
+    rng = np.random.default_rng(7)
+    dados.insert(0, 'id', [f'{i:08x}-{i % 9973:04x}-4c2f-9e1d-{i:012x}' for i in range(n)])
+    dados.insert(1, 'datetime', '2018-11-26 03:40:46')
+    dados.insert(2, 'timezone', 'America/New_York')
+    dados['product_id'] = 'lyft_line'
+    for i in range(len(dados.columns), 57):
+        dados[f'extra_{i}'] = rng.random(n).round(4)
+    dados.to_csv(caminho, index=False)
+
+
+def pico_rss():
+    """Pico de memória residente (MB) do processo atual."""
+    # VmHWM é zerado no exec; ru_maxrss herdaria o pico do processo pai
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def filho(modo, csv, cache):
+    from ingestao import COLUNAS, carregar_cache, ingerir_csv
+    import pandas as pd
+
+    inicio = time.perf_counter()
+    if modo == 'read_csv':
+        df = pd.read_csv(csv)[COLUNAS]
+    elif modo == 'ingestao':
+        ingerir_csv(csv, cache)
+        df = None
+    else:
+        df = carregar_cache(cache)
+    tempo = time.perf_counter() - inicio
+    memoria = df.memory_usage(deep=True).sum() / 1e6 if df is not None else 0
+    print(json.dumps({'tempo': tempo, 'pico_rss': pico_rss(), 'dataframe': memoria}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingestão: read_csv vs cache colunar')
+    parser.add_argument('--csv', help='CSV real (padrão: gerar um sintético)')
+    parser.add_argument('--corridas', type=int, default=690_000)
+    parser.add_argument('--filho', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        filho(*args.filho)
+        return
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        csv = args.csv
+        if csv is None:
+            csv = os.path.join(diretorio, 'rideshare_sintetico.csv')
+            gerar_csv(csv, args.corridas)
+        cache = os.path.join(diretorio, 'cache')
+        print(f"CSV: {os.path.getsize(csv) / 1e6:.0f} MB")
+
+        print(f"{'etapa':>22} {'tempo (s)':>10} {'pico RSS (MB)':>14} {'DataFrame (MB)':>15}")
+        for modo, nome in [('read_csv', 'read_csv (antes)'), ('ingestao', 'ingestão (uma vez)'),
+                           ('cache', 'cache colunar (depois)')]:
+            saida = subprocess.run([sys.executable, '-m', 'benchmarks.bench_ingestao', '--filho', modo, csv, cache],
+                                   check=True, capture_output=True, text=True).stdout
+            r = json.loads(saida)
+            print(f"{nome:>22} {r['tempo']:>10.2f} {r['pico_rss']:>14.0f} {r['dataframe']:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Custo da instrumentação (metricas.py) no caminho de uma cotação: predict de
+uma corrida com e sem Metricas no Precificador, e o custo isolado de uma
+etapa medida e de um contador.
+
+Uso:
+    python -m benchmarks.bench_metricas [--repeticoes 2000]
+"""
+import argparse
+import time
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+from floresta import exportar_floresta
+from metricas import Metricas
+from precificacao import Precificador
+from preprocessamento import PreProcessador
+
+
+def _tempo(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Custo da instrumentação de latência')
+    parser.add_argument('--repeticoes', type=int, default=2000)
+    args = parser.parse_args()
+
+    modelo, scaler, target_encoders, _ = gerar_artefatos(n_corridas=20000, n_estimators=100)
+    preprocessador = PreProcessador.de_encoders(target_encoders, scaler)
+    floresta = exportar_floresta(modelo)
+    corrida = {col: valores.to_numpy() for col, valores in gerar_corridas(1, seed=3).items()}
+
+    metricas = Metricas(limiar_perfil_ms=None)
+    sem = Precificador(floresta, preprocessador)
+    com = Precificador(floresta, preprocessador, metricas)
+    assert (sem.predict_batch(corrida) == com.predict_batch(corrida)).all()
+
+    def etapa():
+        with metricas.etapa('vazia'):
+            pass
+
+    t_sem = _tempo(lambda: sem.predict_batch(corrida), args.repeticoes)
+    t_com = _tempo(lambda: com.predict_batch(corrida), args.repeticoes)
+    t_etapa = _tempo(etapa, args.repeticoes * 10)
+    t_contar = _tempo(lambda: metricas.contar('evento'), args.repeticoes * 10)
+    t_exportar = _tempo(metricas.para_prometheus, 100)
+
+    print(f"predict (1 corrida) sem métricas: {t_sem * 1e6:8.1f} µs")
+    print(f"predict (1 corrida) com métricas: {t_com * 1e6:8.1f} µs ({(t_com / t_sem - 1):+.1%})")
+    print(f"etapa vazia medida:               {t_etapa * 1e6:8.2f} µs")
+    print(f"contador:                         {t_contar * 1e6:8.2f} µs")
+    print(f"exportação Prometheus:            {t_exportar * 1e6:8.1f} µs ({len(metricas.etapas)} etapas)")
+    for nome, resumo in metricas.para_dict()['etapas'].items():
+        if nome != 'vazia':
+            print(f"  {nome:>14}: p50 {resumo['p50_ms'] * 1000:7.1f} µs | p99 {resumo['p99_ms'] * 1000:7.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark do Precificador.predict_batch em lotes de 1, 1 mil e 100 mil corridas.
+
+Uso:
+    python -m benchmarks.bench_predict_batch            # artefatos sintéticos
+    python -m benchmarks.bench_predict_batch --reais    # joblib/ e pkl/ do projeto
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+from precificacao import Precificador, carregar_precificador
+from preprocessamento import PreProcessador
+
+
+def medir(funcao, repeticoes):
+    """Retorna o menor tempo (s) entre as repetições."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--reais', action='store_true', help='usar os artefatos treinados do projeto')
+    parser.add_argument('--arvores', type=int, default=100, help='árvores do modelo sintético')
+    args = parser.parse_args()
+
+    if args.reais:
+        precificador = carregar_precificador()
+    else:
+        modelo, scaler, target_encoders, _ = gerar_artefatos(n_estimators=args.arvores)
+        precificador = Precificador(modelo, PreProcessador.de_encoders(target_encoders, scaler))
+
+    corridas = gerar_corridas(100_000, seed=1)
+    print(f"{'lote':>8} {'tempo (ms)':>12} {'corridas/s':>14}")
+    for tamanho in (1, 1_000, 100_000):
+        lote = corridas.iloc[:tamanho]
+        repeticoes = 20 if tamanho == 1 else 3
+        tempo = medir(lambda: precificador.predict_batch(lote), repeticoes)
+        print(f"{tamanho:>8} {tempo * 1000:>12.2f} {tamanho / tempo:>14,.0f}")
+
+    # Sanidade: o lote deve dar o mesmo resultado que prever uma a uma
+    amostra = corridas.iloc[:20]
+    individual = np.concatenate([precificador.predict_batch(amostra.iloc[[i]]) for i in range(len(amostra))])
+    assert np.allclose(individual, precificador.predict_batch(amostra))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+PreProcessador.transform contra o caminho antigo do app (dicionários por campo,
+DataFrame de uma linha reorganizado coluna a coluna e scaler.transform).
+
+Uso:
+    python -m benchmarks.bench_preprocessamento [--corridas 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+from preprocessamento import CATEGORICAS, PreProcessador
+
+
+def caminho_dicionarios(corrida, scaler, target_encoders):
+    """Reprodução do pré-processamento original de app.py para uma corrida."""
+    dados_entrada = pd.DataFrame({
+        col: [target_encoders[col][corrida[col]] if col in CATEGORICAS else corrida[col]]
+        for col in scaler.feature_names_in_
+    })
+    dados_organizados = pd.DataFrame()
+    for feature in scaler.feature_names_in_:
+        dados_organizados[feature] = dados_entrada[feature]
+    return scaler.transform(dados_organizados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pré-processamento: dicionários vs PreProcessador')
+    parser.add_argument('--corridas', type=int, default=2000)
+    args = parser.parse_args()
+
+    _, scaler, target_encoders, _ = gerar_artefatos(n_corridas=5000, n_estimators=1)
+    preprocessador = PreProcessador.de_encoders(target_encoders, scaler)
+    corridas = gerar_corridas(args.corridas, seed=4)
+    registros = corridas.to_dict('records')
+
+    inicio = time.perf_counter()
+    antigo = np.vstack([caminho_dicionarios(r, scaler, target_encoders) for r in registros])
+    t_antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for i in range(len(registros)):
+        preprocessador.transform({col: [valor] for col, valor in registros[i].items()})
+    t_linha = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    novo = preprocessador.transform(corridas)
+    t_lote = time.perf_counter() - inicio
+
+    assert np.allclose(antigo, novo), np.abs(antigo - novo).max()
+    n = len(registros)
+    print(f"{'caminho':>28} {'total (ms)':>11} {'µs/corrida':>11}")
+    for nome, tempo in [('dicionários (app antigo)', t_antigo),
+                        ('PreProcessador, 1 por vez', t_linha),
+                        ('PreProcessador, lote', t_lote)]:
+        print(f"{nome:>28} {tempo * 1000:>11.1f} {tempo / n * 1e6:>11.1f}")
+
+    # Política para categorias desconhecidas
+    nova = corridas.iloc[:1].assign(source='Harvard Square')
+    try:
+        preprocessador.transform(nova)
+    except ValueError as e:
+        print(f"política 'erro': {e}")
+    tolerante = PreProcessador.de_encoders(target_encoders, scaler, politica_desconhecida='prior')
+    print(f"política 'prior': {tolerante.transform(nova)[0, 6]:.3f} (source padronizada)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Custo de Precificador.predict_quantis (P10/P50/P90 entre as árvores) em
+relação ao predict simples, no sklearn e na FlorestaPlana.
+
+Uso:
+    python -m benchmarks.bench_quantis [--corridas 1 100 10000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+from floresta import exportar_floresta
+from precificacao import Precificador
+from preprocessamento import PreProcessador
+
+
+def _tempo(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantis vs predict')
+    parser.add_argument('--corridas', type=int, nargs='+', default=[1, 100, 10_000])
+    args = parser.parse_args()
+
+    modelo, scaler, target_encoders, _ = gerar_artefatos(n_corridas=20000, n_estimators=100)
+    preprocessador = PreProcessador.de_encoders(target_encoders, scaler)
+    corridas = gerar_corridas(max(args.corridas), seed=17)
+
+    sklearn = Precificador(modelo, preprocessador)
+    plana = Precificador(exportar_floresta(modelo), preprocessador)
+
+    # Quantis conferidos contra o percentil das previsões de cada estimador do sklearn
+    amostra = corridas.iloc[:200]
+    X = preprocessador.transform(amostra)
+    por_arvore = np.column_stack([estimador.predict(X) for estimador in modelo.estimators_])
+    esperado = np.quantile(por_arvore, (0.1, 0.5, 0.9), axis=1).T
+    assert np.allclose(sklearn.predict_quantis(amostra), esperado)
+    assert np.allclose(plana.predict_quantis(amostra), esperado)
+
+    print(f"{'corridas':>9} {'predict sklearn':>16} {'predict plana':>14} {'quantis':>9} {'razão (plana)':>14}")
+    for n in args.corridas:
+        lote = corridas.iloc[:n]
+        repeticoes = max(3, 1000 // n)
+        t_sklearn = _tempo(lambda: sklearn.predict_batch(lote), repeticoes)
+        t_plana = _tempo(lambda: plana.predict_batch(lote), repeticoes)
+        t_quantis = _tempo(lambda: plana.predict_quantis(lote), repeticoes)
+        print(f"{n:>9,} {t_sklearn * 1000:>13.2f} ms {t_plana * 1000:>11.2f} ms "
+              f"{t_quantis * 1000:>6.2f} ms {t_quantis / t_plana:>13.2f}x")
+
+
+if __name__ == '__main__':
+    main()
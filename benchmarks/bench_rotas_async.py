@@ -0,0 +1,116 @@
+"""
+Busca de rotas com prazo (rotas_async.py) contra o ORS simulado
+(benchmarks/mock_ors.py): respostas rápidas, lentas e com falha, e vazão de
+trajetos concorrentes no cliente assíncrono vs. o RoteadorORS síncrono.
+
+Uso:
+    python -m benchmarks.bench_rotas_async [--prazo 0.3] [--trajetos 64]
+"""
+import argparse
+import time
+from concurrent.futures import wait
+
+from benchmarks.mock_ors import FATOR_SIMULADO, iniciar
+from cache_rotas import CacheRotas
+from geo import distancia_pares
+from preprocessamento import COORDENADAS
+from rotas import ErroRota, RoteadorORS
+from rotas_async import ClienteRotasAsync, RotasComPrazo
+
+ORIGEM, DESTINO = COORDENADAS['Back Bay'], COORDENADAS['Financial District']
+
+
+def _montar(prazo, **opcoes):
+    servidor = iniciar(**opcoes)
+    roteador = RoteadorORS('teste', url=servidor.url)
+    rotas = RotasComPrazo(ClienteRotasAsync(roteador), CacheRotas(roteador), prazo=prazo)
+    return servidor, roteador, rotas
+
+
+def _cotar(rotas):
+    inicio = time.perf_counter()
+    resultado = rotas.rota(ORIGEM, DESTINO)
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rotas assíncronas com prazo vs. síncronas')
+    parser.add_argument('--prazo', type=float, default=0.3, help='prazo da cotação (s)')
+    parser.add_argument('--trajetos', type=int, default=64)
+    args = parser.parse_args()
+    esperada = float(distancia_pares(ORIGEM, DESTINO, FATOR_SIMULADO))
+
+    # 1) Backend rápido: a rota real chega dentro do prazo e vai para o cache
+    servidor, _, rotas = _montar(args.prazo, atraso_ms=20)
+    resultado, ms = _cotar(rotas)
+    assert resultado.fonte == 'backend' and resultado.pendente is None
+    assert abs(resultado.distancia - esperada) < 1e-9 and len(resultado.rota) > 2
+    assert _cotar(rotas)[0].fonte == 'cache'
+    print(f"rápido:  fonte={resultado.fonte:<8} {ms:7.1f} ms")
+    rotas.fechar()
+    servidor.shutdown()
+
+    # 2) Backend lento: o preço sai no prazo com a distância de reserva e a
+    #    polyline chega depois (e fica no cache para a próxima cotação)
+    servidor, roteador, rotas = _montar(args.prazo, atraso_ms=1500)
+    inicio = time.perf_counter()
+    resultado, ms = _cotar(rotas)
+    assert resultado.fonte == 'reserva' and resultado.pendente is not None
+    assert ms < args.prazo * 1000 + 100
+    repetido = rotas.rota(ORIGEM, DESTINO)
+    assert repetido.pendente is resultado.pendente  # reexecução não abre outra chamada
+    rota_tardia, distancia_tardia = resultado.pendente.result()
+    chegada = (time.perf_counter() - inicio) * 1000
+    time.sleep(0.05)  # o callback que grava no cache roda na thread do cliente
+    assert abs(distancia_tardia - esperada) < 1e-9 and _cotar(rotas)[0].fonte == 'cache'
+    assert servidor.requisicoes == 1
+    print(f"lento:   fonte={resultado.fonte:<8} {ms:7.1f} ms (reserva {resultado.distancia:.2f} mi; "
+          f"rota real {distancia_tardia:.2f} mi chegou em {chegada:.0f} ms)")
+
+    inicio = time.perf_counter()
+    RoteadorORS('teste', url=servidor.url).rota(ORIGEM, DESTINO)
+    print(f"         (o RoteadorORS síncrono bloqueia a cotação por {(time.perf_counter() - inicio) * 1000:.0f} ms)")
+    rotas.fechar()
+    servidor.shutdown()
+
+    # 3) Backend com falha: reserva imediata e falha lembrada pelo cache
+    servidor, _, rotas = _montar(args.prazo, atraso_ms=5, fracao_falhas=1.0)
+    resultado, ms = _cotar(rotas)
+    assert resultado.fonte == 'reserva' and resultado.pendente is None
+    time.sleep(0.05)
+    segundo, ms_segundo = _cotar(rotas)
+    assert segundo.fonte == 'reserva' and servidor.requisicoes == 1
+    try:
+        rotas.cliente.rota(ORIGEM, DESTINO)
+        raise AssertionError('esperava ErroRota')
+    except ErroRota:
+        pass
+    print(f"falha:   fonte={resultado.fonte:<8} {ms:7.1f} ms (repetição sem chamar o backend: {ms_segundo:.2f} ms)")
+    rotas.fechar()
+    servidor.shutdown()
+
+    # 4) Vazão: trajetos distintos concorrentes (50 ms por resposta)
+    servidor = iniciar(atraso_ms=50)
+    locais = list(COORDENADAS.values())
+    pares = [(locais[i % len(locais)], locais[(i * 7 + 1) % len(locais)]) for i in range(args.trajetos)]
+
+    roteador = RoteadorORS('teste', url=servidor.url)
+    inicio = time.perf_counter()
+    for origem, destino in pares:
+        roteador.rota(origem, destino)
+    t_sincrono = time.perf_counter() - inicio
+
+    cliente = ClienteRotasAsync(roteador, tamanho_pool=16)
+    inicio = time.perf_counter()
+    futuros = [cliente.buscar(origem, destino) for origem, destino in pares]
+    wait(futuros)
+    t_async = time.perf_counter() - inicio
+    assert all(f.exception() is None for f in futuros)
+    print(f"vazão ({args.trajetos} trajetos): síncrono {t_sincrono:.2f}s | assíncrono (pool 16) {t_async:.2f}s "
+          f"({t_sincrono / t_async:.1f}x)")
+    cliente.fechar()
+    servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Tempo de target.criar_target_encoders contra a versão original, que ajustava
+um category_encoders.TargetEncoder por coluna e chamava transform para cada
+categoria.
+
+Uso:
+    python -m benchmarks.bench_target [--corridas 600000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from benchmarks.sintetico import gerar_corridas
+from target import codificar_out_of_fold, criar_target_encoders
+
+CATEGORIAS = ['cab_type', 'source', 'destination', 'name', 'short_summary', 'long_summary']
+
+
+def criar_target_encoders_original(df, categorias, target='price'):
+    """Laço original de target.py (sem gravar o pickle)."""
+    from category_encoders import TargetEncoder
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        df.drop(columns=[target]), df[target], test_size=0.2, random_state=42
+    )
+    mapeamentos = {}
+    for categoria in categorias:
+        encoder = TargetEncoder(cols=[categoria])
+        encoder.fit(X_train[categoria], y_train)
+        mapeamento = {}
+        for valor in df[categoria].unique():
+            mapeamento[valor] = encoder.transform(pd.DataFrame({categoria: [valor]}))[categoria].iloc[0]
+        mapeamentos[categoria] = mapeamento
+    return mapeamentos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Target encoding: original vs uma passada')
+    parser.add_argument('--corridas', type=int, default=600_000)
+    args = parser.parse_args()
+
+    df = gerar_corridas(args.corridas, seed=6)
+
+    inicio = time.perf_counter()
+    novo = criar_target_encoders(df, CATEGORIAS, caminho_saida=None)
+    t_novo = time.perf_counter() - inicio
+    print(f"uma passada (bincount): {t_novo:.2f}s")
+
+    try:
+        inicio = time.perf_counter()
+        original = criar_target_encoders_original(df, CATEGORIAS)
+        t_original = time.perf_counter() - inicio
+    except ImportError:
+        print("category_encoders não instalado; comparação com a versão original ignorada")
+    else:
+        print(f"original (TargetEncoder): {t_original:.2f}s ({t_original / t_novo:.0f}x mais lento)")
+        for categoria in CATEGORIAS:
+            for valor, esperado in original[categoria].items():
+                assert np.isclose(novo[categoria][valor], esperado), (categoria, valor)
+        print("mapeamentos idênticos")
+
+    inicio = time.perf_counter()
+    oof = codificar_out_of_fold(df, CATEGORIAS, n_folds=5)
+    print(f"out-of-fold (5 folds): {time.perf_counter() - inicio:.2f}s, {oof.shape[0]:,} linhas")
+
+
+if __name__ == '__main__':
+    main()
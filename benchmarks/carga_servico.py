@@ -0,0 +1,112 @@
+"""
+Teste de carga do serviço HTTP de previsão (servico.py).
+
+Uso:
+    # 1) Subir uma instância local (artefatos reais: uvicorn servico:app)
+    python -m benchmarks.carga_servico servir --porta 8000
+
+    # 2) Disparar a carga e medir p50/p99 e vazão (e as etapas, de GET /metricas.json)
+    python -m benchmarks.carga_servico carga --porta 8000 --conexoes 64 --requisicoes 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+
+import numpy as np
+
+from benchmarks.sintetico import gerar_artefatos, gerar_corridas
+
+
+def servir(args):
+    import uvicorn
+
+    from precificacao import Precificador
+    from preprocessamento import PreProcessador
+    from servico import criar_app
+
+    modelo, scaler, target_encoders, _ = gerar_artefatos(n_estimators=args.arvores)
+    modelo.set_params(n_jobs=1)
+    app = criar_app(Precificador(modelo, PreProcessador.de_encoders(target_encoders, scaler)), espera_ms=args.espera_ms)
+    uvicorn.run(app, host='127.0.0.1', port=args.porta, log_level='warning')
+
+
+async def _cliente(host, porta, corpos, latencias, fim):
+    leitor, escritor = await asyncio.open_connection(host, porta)
+    try:
+        while time.perf_counter() < fim and corpos:
+            corpo = corpos.pop()
+            requisicao = (
+                f"POST /prever HTTP/1.1\r\nHost: {host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(corpo)}\r\n\r\n"
+            ).encode() + corpo
+            inicio = time.perf_counter()
+            escritor.write(requisicao)
+            await escritor.drain()
+
+            cabecalho = await leitor.readuntil(b'\r\n\r\n')
+            tamanho = 0
+            for linha in cabecalho.split(b'\r\n'):
+                if linha.lower().startswith(b'content-length:'):
+                    tamanho = int(linha.split(b':')[1])
+            await leitor.readexactly(tamanho)
+            if not cabecalho.startswith(b'HTTP/1.1 200'):
+                raise RuntimeError(cabecalho.split(b'\r\n')[0].decode())
+            latencias.append(time.perf_counter() - inicio)
+    finally:
+        escritor.close()
+
+
+async def _carga(args):
+    corridas = gerar_corridas(args.requisicoes, seed=2)
+    corridas['temperature'] = corridas['temperatureHigh'] - 5
+    campos = ['distance', 'surge_multiplier', 'source', 'destination', 'cab_type',
+              'name', 'short_summary', 'long_summary', 'temperature', 'pressure']
+    corpos = [json.dumps(r).encode() for r in corridas[campos].to_dict('records')]
+
+    latencias = []
+    inicio = time.perf_counter()
+    fim = inicio + args.duracao
+    await asyncio.gather(*[
+        _cliente(args.host, args.porta, corpos, latencias, fim) for _ in range(args.conexoes)
+    ])
+    return np.array(latencias), time.perf_counter() - inicio
+
+
+def carga(args):
+    latencias, duracao = asyncio.run(_carga(args))
+    ms = latencias * 1000
+    print(f"requisições: {len(latencias)} em {duracao:.2f}s ({args.conexoes} conexões)")
+    print(f"vazão: {len(latencias) / duracao:,.0f} req/s")
+    print(f"latência p50: {np.percentile(ms, 50):.2f} ms | p99: {np.percentile(ms, 99):.2f} ms")
+
+    # Onde o tempo foi gasto, do lado do serviço (histogramas por etapa)
+    with urllib.request.urlopen(f"http://{args.host}:{args.porta}/metricas.json") as resposta:
+        etapas = json.load(resposta)['etapas']
+    for nome, resumo in sorted(etapas.items()):
+        print(f"  {nome:>18}: n={resumo['contagem']:>6} | p50 {resumo['p50_ms']:.3f} ms | p99 {resumo['p99_ms']:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do serviço de previsão')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_servir = sub.add_parser('servir', help='sobe o serviço com artefatos sintéticos')
+    p_servir.add_argument('--porta', type=int, default=8000)
+    p_servir.add_argument('--arvores', type=int, default=100)
+    p_servir.add_argument('--espera-ms', type=float, default=2.0)
+
+    p_carga = sub.add_parser('carga', help='dispara requisições concorrentes')
+    p_carga.add_argument('--host', default='127.0.0.1')
+    p_carga.add_argument('--porta', type=int, default=8000)
+    p_carga.add_argument('--conexoes', type=int, default=64)
+    p_carga.add_argument('--requisicoes', type=int, default=5000)
+    p_carga.add_argument('--duracao', type=float, default=30.0, help='limite de tempo (s)')
+
+    args = parser.parse_args()
+    servir(args) if args.comando == 'servir' else carga(args)
+
+
+if __name__ == '__main__':
+    main()
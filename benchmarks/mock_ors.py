@@ -0,0 +1,125 @@
+"""
+Servidor simulado do OpenRouteService, com respostas lentas e falhas.
+
+Responde POST /v2/directions/<perfil> no formato GeoJSON do ORS, com uma
+rota em linha reta entre os pontos (distância haversine x 1,3). Uma fração
+das requisições pode demorar mais (`--lentas`) ou falhar com erro HTTP
+(`--falhas`), para exercitar o prazo e a rota de reserva de rotas_async.py.
+
+Uso:
+    python -m benchmarks.mock_ors --porta 8090 --atraso-ms 50 --lentas 0.3 --atraso-lento-ms 3000 --falhas 0.1
+    API_ORS=teste API_ORS_URL=http://127.0.0.1:8090/v2/directions/{perfil} streamlit run app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from geo import distancia_pares
+
+METROS_POR_MILHA = 1609.34
+FATOR_SIMULADO = 1.3
+PONTOS_ROTA = 20
+
+
+class ServidorORSSimulado(ThreadingHTTPServer):
+    daemon_threads = True
+    # O padrão (5) recusa conexões quando o cliente abre o pool inteiro de uma vez
+    request_queue_size = 128
+
+    def __init__(self, endereco, atraso_ms=0.0, fracao_lentas=0.0, atraso_lento_ms=3000.0,
+                 fracao_falhas=0.0, status_falha=503, seed=0):
+        super().__init__(endereco, _Manipulador)
+        self.atraso_ms = atraso_ms
+        self.fracao_lentas = fracao_lentas
+        self.atraso_lento_ms = atraso_lento_ms
+        self.fracao_falhas = fracao_falhas
+        self.status_falha = status_falha
+        self.aleatorio = random.Random(seed)
+        self.trava = threading.Lock()
+        self.requisicoes = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/v2/directions/{{perfil}}"
+
+    def sortear(self):
+        """Atraso (s) e se esta requisição falha."""
+        with self.trava:
+            self.requisicoes += 1
+            lenta = self.aleatorio.random() < self.fracao_lentas
+            falha = self.aleatorio.random() < self.fracao_falhas
+        return (self.atraso_lento_ms if lenta else self.atraso_ms) / 1000, falha
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        atraso, falha = self.server.sortear()
+        time.sleep(atraso)
+
+        if not self.path.startswith('/v2/directions/'):
+            self._responder(404, {'error': 'not found'})
+        elif falha:
+            self._responder(self.server.status_falha, {'error': {'code': 2099, 'message': 'simulated failure'}})
+        else:
+            (lon1, lat1), (lon2, lat2) = json.loads(corpo)['coordinates']
+            milhas = float(distancia_pares((lat1, lon1), (lat2, lon2), FATOR_SIMULADO))
+            passos = [i / (PONTOS_ROTA - 1) for i in range(PONTOS_ROTA)]
+            coordenadas = [[lon1 + (lon2 - lon1) * t, lat1 + (lat2 - lat1) * t] for t in passos]
+            self._responder(200, {'type': 'FeatureCollection', 'features': [{
+                'type': 'Feature',
+                'geometry': {'type': 'LineString', 'coordinates': coordenadas},
+                'properties': {'summary': {'distance': milhas * METROS_POR_MILHA, 'duration': milhas * 120}},
+            }]})
+
+    def _responder(self, status, conteudo):
+        corpo = json.dumps(conteudo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/geo+json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar(porta=0, **opcoes):
+    """
+    Sobe o servidor simulado em uma thread daemon.
+
+    Args:
+        porta: Porta local (0 = qualquer porta livre)
+        **opcoes: atraso_ms, fracao_lentas, atraso_lento_ms, fracao_falhas, status_falha, seed
+
+    Returns:
+        ServidorORSSimulado (url em .url; .shutdown() para parar)
+    """
+    servidor = ServidorORSSimulado(('127.0.0.1', porta), **opcoes)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor simulado do OpenRouteService')
+    parser.add_argument('--porta', type=int, default=8090)
+    parser.add_argument('--atraso-ms', type=float, default=50.0)
+    parser.add_argument('--lentas', type=float, default=0.0, help='fração de respostas lentas')
+    parser.add_argument('--atraso-lento-ms', type=float, default=3000.0)
+    parser.add_argument('--falhas', type=float, default=0.0, help='fração de respostas com erro')
+    parser.add_argument('--status-falha', type=int, default=503)
+    args = parser.parse_args()
+
+    servidor = ServidorORSSimulado(('127.0.0.1', args.porta), args.atraso_ms, args.lentas,
+                                   args.atraso_lento_ms, args.falhas, args.status_falha)
+    print(f"ORS simulado em {servidor.url}")
+    servidor.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Dados e artefatos sintéticos no formato do modelo real.
+
+Os benchmarks usam estes artefatos quando os arquivos treinados (joblib/ e
+pkl/) não estão disponíveis, para que possam rodar em qualquer máquina.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from precificacao import CATEGORICAS, COORDENADAS, FEATURES_MODELO
+
+# Serviços por empresa e um preço base aproximado de cada um
+SERVICOS = {
+    'Uber': {'UberPool': 8.0, 'UberX': 10.0, 'WAV': 10.0, 'UberXL': 16.0,
+             'Black': 21.0, 'Black SUV': 30.0, 'Taxi': 12.0},
+    'Lyft': {'Shared': 6.5, 'Lyft': 9.5, 'Lyft XL': 15.0, 'Lux': 17.0,
+             'Lux Black': 23.0, 'Lux Black XL': 32.0}
+}
+
+CLIMA = {
+    'Clear': ['Clear throughout the day.'],
+    'Mostly Cloudy': ['Mostly cloudy throughout the day.'],
+    'Overcast': ['Overcast throughout the day.'],
+    'Rain': ['Rain throughout the day.', 'Light rain in the morning.'],
+}
+
+
+def gerar_corridas(n, seed=0):
+    """
+    Gera um DataFrame de corridas sintéticas com as colunas brutas do Kaggle.
+
+    Args:
+        n: Número de corridas
+        seed: Semente do gerador aleatório
+
+    Returns:
+        DataFrame com as 12 features do modelo e a coluna 'price'
+    """
+    rng = np.random.default_rng(seed)
+    locais = np.array(list(COORDENADAS))
+    pares = [(empresa, nome) for empresa, nomes in SERVICOS.items() for nome in nomes]
+    base = np.array([SERVICOS[empresa][nome] for empresa, nome in pares])
+
+    escolha = rng.integers(len(pares), size=n)
+    short = rng.choice(list(CLIMA), size=n)
+    long_ = np.array([rng.choice(CLIMA[s]) for s in short]) if n < 50_000 else \
+        np.array([CLIMA[s][0] for s in short])
+
+    source = rng.choice(locais, size=n)
+    dados = pd.DataFrame({
+        'distance': rng.gamma(2.0, 1.1, size=n).round(2),
+        'surge_multiplier': rng.choice([1.0, 1.0, 1.0, 1.25, 1.5, 2.0], size=n),
+        'latitude': np.array([COORDENADAS[s][0] for s in source]),
+        'apparentTemperatureLow': rng.normal(30, 8, size=n).round(1),
+        'pressure': rng.normal(1010, 10, size=n).round(1),
+        'temperatureHigh': rng.normal(45, 8, size=n).round(1),
+        'source': source,
+        'destination': rng.choice(locais, size=n),
+        'cab_type': np.array([pares[i][0] for i in escolha]),
+        'name': np.array([pares[i][1] for i in escolha]),
+        'long_summary': long_,
+        'short_summary': short,
+    })
+    preco = (base[escolha] + 2.8 * dados['distance']) * dados['surge_multiplier']
+    dados['price'] = (preco + rng.normal(0, 1.5, size=n)).clip(2.5).round(1)
+    return dados
+
+
+def gerar_artefatos(n_corridas=20_000, n_estimators=100, max_depth=None, seed=0):
+    """
+    Treina modelo, scaler e target encoders sintéticos como no notebook.
+
+    Returns:
+        Tupla (modelo, scaler, target_encoders, corridas)
+    """
+    corridas = gerar_corridas(n_corridas, seed=seed)
+
+    # Target median encoding, como em uber_analise.ipynb
+    target_encoders = {
+        col: corridas.groupby(col)['price'].median().to_dict() for col in CATEGORICAS
+    }
+    X = corridas[FEATURES_MODELO].copy()
+    for col in CATEGORICAS:
+        X[col] = X[col].map(target_encoders[col])
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    modelo = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                   random_state=seed, n_jobs=-1)
+    modelo.fit(X_scaled, corridas['price'])
+    return modelo, scaler, target_encoders, corridas
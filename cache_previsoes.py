@@ -0,0 +1,152 @@
+"""
+Memoização de previsões por vetor de features codificado.
+
+O Streamlit reexecuta o app a cada interação e os usuários alternam entre
+poucas configurações, então o mesmo vetor de features é previsto muitas
+vezes. CachePrevisoes fica na frente do Precificador: a chave é o vetor
+codificado (antes da padronização) quantizado, mais a versão do modelo, e só
+as linhas que não estão no cache vão ao modelo, em uma única chamada.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metricas import medir
+from precificacao import QUANTIS
+
+CASAS_DECIMAIS = 4
+
+
+class CachePrevisoes:
+    """
+    Cache LRU de previsões com a mesma interface de Precificador.predict_batch.
+    """
+
+    def __init__(self, precificador, versao=None, capacidade=4096, casas_decimais=CASAS_DECIMAIS):
+        """
+        Args:
+            precificador: Precificador usado nas linhas fora do cache
+            versao: Versão do modelo; entra na chave, de modo que previsões de
+                outro modelo nunca são reaproveitadas
+            capacidade: Máximo de vetores guardados
+            casas_decimais: Quantização das features na chave; vetores que
+                diferem menos que isso recebem a mesma previsão
+        """
+        self.precificador = precificador
+        self.versao = versao
+        self.capacidade = capacidade
+        self.casas_decimais = casas_decimais
+
+        self._entradas = OrderedDict()
+        self._quantis = OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def _chaves(self, X):
+        quantizado = np.round(X, self.casas_decimais) + 0.0  # + 0.0 unifica -0.0 e 0.0
+        return [(self.versao, linha.tobytes()) for linha in quantizado]
+
+    def predict_batch(self, dados):
+        """
+        Preços das corridas, do cache quando possível.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+
+        Returns:
+            np.ndarray com o preço previsto de cada corrida
+        """
+        def prever(X):
+            return np.asarray(self.precificador.modelo.predict(X), dtype=np.float64).tolist()
+
+        return np.array(self._consultar(dados, self._entradas, (), prever, 'modelo'))
+
+    def predict_com_quantis(self, dados, quantis=QUANTIS):
+        """
+        Preços e quantis das corridas, do cache quando possível.
+
+        As linhas fora do cache passam uma única vez pelas árvores, que dão o
+        preço e os quantis; o preço também fica no cache de predict_batch.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+            quantis: Quantis desejados, entre 0 e 1 (padrão: P10, P50, P90)
+
+        Returns:
+            Tupla (np.ndarray com o preço de cada corrida,
+            np.ndarray de shape (n_corridas, len(quantis)))
+        """
+        quantis = tuple(quantis)
+        self.precificador._exigir_floresta()
+
+        def prever(X):
+            precos, previstos = self.precificador.floresta.prever_com_quantis(X, quantis)
+            return list(zip(precos.tolist(), map(tuple, previstos.tolist())))
+
+        resultados = self._consultar(dados, self._quantis, quantis, prever, 'quantis', guardar_preco=True)
+        precos = np.array([preco for preco, _ in resultados])
+        return precos, np.array([previstos for _, previstos in resultados]).reshape(len(resultados), len(quantis))
+
+    def _consultar(self, dados, entradas, extra, prever, etapa, guardar_preco=False):
+        """
+        Consulta `entradas` e manda só as linhas ausentes, padronizadas, a `prever`.
+
+        Com guardar_preco, o resultado é (preço, ...) e o preço também entra
+        no cache de predict_batch.
+        """
+        preprocessador = self.precificador.preprocessador
+        metricas = self.precificador.metricas
+        with medir(metricas, 'encoding'):
+            X = preprocessador.montar_features(dados)
+        chaves = [chave + extra for chave in self._chaves(X)]
+        resultados = [None] * len(chaves)
+
+        faltando = []
+        with self._trava:
+            for i, chave in enumerate(chaves):
+                resultado = entradas.get(chave)
+                if resultado is None:
+                    faltando.append(i)
+                else:
+                    entradas.move_to_end(chave)
+                    resultados[i] = resultado
+            self.acertos += len(chaves) - len(faltando)
+            self.faltas += len(faltando)
+
+        if faltando:
+            # Só as linhas ausentes vão ao modelo, fora da trava
+            with medir(metricas, 'escalonamento'):
+                X_faltando = preprocessador.escalonar(X[faltando])
+            with medir(metricas, etapa):
+                novos = prever(X_faltando)
+            with self._trava:
+                for i, resultado in zip(faltando, novos):
+                    resultados[i] = resultado
+                    entradas[chaves[i]] = resultado
+                    entradas.move_to_end(chaves[i])
+                    if guardar_preco:
+                        chave_preco = chaves[i][:2]
+                        self._entradas[chave_preco] = resultado[0]
+                        self._entradas.move_to_end(chave_preco)
+                for memo in (self._entradas, self._quantis):
+                    while len(memo) > self.capacidade:
+                        memo.popitem(last=False)
+        return resultados
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+            self._quantis.clear()
+
+    def estatisticas(self):
+        """Contadores de acertos e faltas e taxa de acerto."""
+        consultas = self.acertos + self.faltas
+        return {
+            'versao': self.versao,
+            'acertos': self.acertos,
+            'faltas': self.faltas,
+            'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+            'entradas': len(self._entradas),
+        }
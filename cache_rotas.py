@@ -0,0 +1,207 @@
+"""
+Cache de rotas com expiração (TTL), descarte LRU e persistência opcional.
+
+CacheRotas envolve qualquer roteador de rotas.py e expõe a mesma interface
+`rota(origem, destino)`. A chave é o par de coordenadas arredondado mais o
+perfil de transporte, então cliques repetidos (de qualquer usuário) no mesmo
+trajeto não chamam o backend de novo. Falhas também são lembradas, por um TTL
+curto, para que um backend fora do ar não seja consultado a cada requisição.
+Com `caminho_sqlite`, as rotas obtidas sobrevivem a reinícios.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from rotas import ErroRota
+
+TTL_PADRAO = 24 * 3600
+TTL_FALHA = 60
+# 4 casas decimais ~ 11 m de latitude
+CASAS_DECIMAIS = 4
+# Gravações entre duas limpezas das entradas vencidas
+LIMPEZA_A_CADA = 256
+
+
+class CacheRotas:
+    """
+    Cache LRU + TTL na frente de um roteador.
+    """
+
+    def __init__(self, roteador, capacidade=1024, ttl=TTL_PADRAO, ttl_falha=TTL_FALHA,
+                 casas_decimais=CASAS_DECIMAIS, caminho_sqlite=None, relogio=time.time,
+                 limpeza_a_cada=LIMPEZA_A_CADA):
+        """
+        Args:
+            roteador: Objeto com rota(origem, destino) e, opcionalmente, `perfil`
+            capacidade: Máximo de entradas em memória (as menos usadas saem primeiro)
+            ttl: Validade de uma rota obtida (s)
+            ttl_falha: Por quanto tempo uma falha é repetida sem consultar o backend (s)
+            casas_decimais: Arredondamento das coordenadas na chave
+            caminho_sqlite: Arquivo SQLite para persistir as rotas (None = só memória)
+            relogio: Função que retorna o tempo atual (s)
+            limpeza_a_cada: Gravações entre duas chamadas a limpar_expiradas
+        """
+        self.roteador = roteador
+        self.perfil = getattr(roteador, 'perfil', type(roteador).__name__)
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.ttl_falha = ttl_falha
+        self.casas_decimais = casas_decimais
+        self.relogio = relogio
+        self.limpeza_a_cada = limpeza_a_cada
+
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.falhas_evitadas = 0
+        self.erros = 0
+        self._gravacoes = 0
+
+        self._banco = None
+        if caminho_sqlite is not None:
+            self._banco = sqlite3.connect(caminho_sqlite, check_same_thread=False)
+            self._banco.execute(
+                "CREATE TABLE IF NOT EXISTS rotas ("
+                "chave TEXT PRIMARY KEY, rota TEXT NOT NULL, distancia REAL NOT NULL, expira REAL NOT NULL)"
+            )
+            self._banco.commit()
+            # Rotas vencidas de execuções anteriores não voltariam a ser lidas
+            self.limpar_expiradas()
+
+    def chave(self, origem, destino):
+        """Coordenadas arredondadas + perfil de transporte."""
+        return (*(round(float(c), self.casas_decimais) for c in (*origem, *destino)), self.perfil)
+
+    def consultar(self, origem, destino):
+        """
+        Só o cache, sem chamar o roteador.
+
+        Returns:
+            Tupla (rota, distancia_milhas), ou None se ausente/expirada
+
+        Raises:
+            ErroRota: O backend falhou há menos de `ttl_falha` segundos
+        """
+        chave = self.chave(origem, destino)
+        with self._trava:
+            entrada = self._buscar(chave, self.relogio())
+            if entrada is None:
+                self.faltas += 1
+                return None
+            valor, erro = entrada
+            if erro is not None:
+                self.falhas_evitadas += 1
+                raise ErroRota(f"Falha recente (em cache): {erro}")
+            self.acertos += 1
+            return valor
+
+    def registrar(self, origem, destino, valor=None, erro=None):
+        """
+        Guarda o resultado de uma consulta ao backend feita fora do cache
+        (ex.: uma rota que chegou depois do prazo, ver rotas_async.py).
+
+        Args:
+            valor: Tupla (rota, distancia_milhas) obtida
+            erro: Mensagem da falha, se o backend falhou (vale por `ttl_falha`)
+        """
+        chave = self.chave(origem, destino)
+        agora = self.relogio()
+        with self._trava:
+            if erro is not None:
+                self.erros += 1
+                self._guardar(chave, None, str(erro), agora + self.ttl_falha)
+            else:
+                self._guardar(chave, valor, None, agora + self.ttl)
+
+    def rota(self, origem, destino):
+        """
+        Rota do cache ou, se ausente/expirada, do roteador.
+
+        Returns:
+            Tupla (rota, distancia_milhas)
+
+        Raises:
+            ErroRota: O backend falhou agora ou há menos de `ttl_falha` segundos
+        """
+        valor = self.consultar(origem, destino)
+        if valor is not None:
+            return valor
+
+        # O backend é consultado fora da trava para não serializar os usuários
+        try:
+            valor = self.roteador.rota(origem, destino)
+        except ErroRota as e:
+            self.registrar(origem, destino, erro=e)
+            raise
+        self.registrar(origem, destino, valor)
+        return valor
+
+    def _buscar(self, chave, agora):
+        entrada = self._entradas.get(chave)
+        if entrada is not None:
+            valor, erro, expira = entrada
+            if expira > agora:
+                self._entradas.move_to_end(chave)
+                return valor, erro
+            del self._entradas[chave]
+
+        if self._banco is not None:
+            linha = self._banco.execute(
+                "SELECT rota, distancia, expira FROM rotas WHERE chave = ?", (json.dumps(chave),)
+            ).fetchone()
+            if linha is not None and linha[2] > agora:
+                valor = (json.loads(linha[0]), linha[1])
+                self._guardar_memoria(chave, valor, None, linha[2])
+                return valor, None
+        return None
+
+    def _guardar(self, chave, valor, erro, expira):
+        self._gravacoes += 1
+        if self._gravacoes % self.limpeza_a_cada == 0:
+            self._limpar(self.relogio())
+        self._guardar_memoria(chave, valor, erro, expira)
+        # Só rotas válidas são persistidas; falhas valem apenas para este processo
+        if self._banco is not None and erro is None:
+            rota, distancia = valor
+            self._banco.execute(
+                "INSERT OR REPLACE INTO rotas (chave, rota, distancia, expira) VALUES (?, ?, ?, ?)",
+                (json.dumps(chave), json.dumps(rota), distancia, expira)
+            )
+            self._banco.commit()
+
+    def _guardar_memoria(self, chave, valor, erro, expira):
+        self._entradas[chave] = (valor, erro, expira)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.capacidade:
+            self._entradas.popitem(last=False)
+
+    def limpar_expiradas(self):
+        """Remove entradas vencidas da memória e do SQLite."""
+        with self._trava:
+            self._limpar(self.relogio())
+
+    def _limpar(self, agora):
+        for chave in [c for c, (_, _, expira) in self._entradas.items() if expira <= agora]:
+            del self._entradas[chave]
+        if self._banco is not None:
+            self._banco.execute("DELETE FROM rotas WHERE expira <= ?", (agora,))
+            self._banco.commit()
+
+    def estatisticas(self):
+        """Contadores de acertos, faltas e falhas evitadas."""
+        consultas = self.acertos + self.faltas + self.falhas_evitadas
+        return {
+            'acertos': self.acertos,
+            'faltas': self.faltas,
+            'falhas_evitadas': self.falhas_evitadas,
+            'erros_backend': self.erros,
+            'taxa_acerto': (self.acertos + self.falhas_evitadas) / consultas if consultas else 0.0,
+            'entradas': len(self._entradas),
+        }
+
+    def fechar(self):
+        if self._banco is not None:
+            self._banco.close()
@@ -0,0 +1,127 @@
+"""
+Relatório de calibração dos quantis de preço (Precificador.predict_quantis).
+
+Os quantis vêm da dispersão entre as árvores da floresta. Este relatório
+confere, na divisão de teste do notebook (80/20, random_state=42), se eles
+se comportam como quantis: a fração de preços reais abaixo do P10 deveria
+ser ~10%, abaixo do P90 ~90%, e o intervalo P10-P90 deveria cobrir ~80% das
+corridas, inclusive nas faixas de preço mais altas.
+
+Uso:
+    python calibracao.py --cache cache --artefatos artefatos
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from artefatos import DIRETORIO_PADRAO, carregar_artefatos
+from backtest import FAIXAS
+from ingestao import ALVO, DIRETORIO_CACHE, carregar_cache, garantir_cache
+from precificacao import QUANTIS
+
+ARQUIVO_CALIBRACAO = 'calibracao.json'
+TAMANHO_BLOCO = 50_000
+
+
+def _pinball(y, previsto, q):
+    """Perda quantílica média (quanto menor, melhor)."""
+    diferenca = y - previsto
+    return float(np.mean(np.maximum(q * diferenca, (q - 1) * diferenca)))
+
+
+def relatorio_calibracao(precificador, dados, y, quantis=QUANTIS, faixas=FAIXAS):
+    """
+    Compara os quantis previstos com os preços reais.
+
+    Args:
+        precificador: Precificador com floresta (predict_quantis); um modelo
+            destilado é recusado com ValueError
+        dados: DataFrame com as corridas de teste
+        y: Preços reais
+        quantis: Quantis avaliados (o primeiro e o último formam o intervalo)
+        faixas: Faixas de preço para a cobertura por faixa
+
+    Returns:
+        Dicionário com a fração abaixo de cada quantil, cobertura e largura do
+        intervalo, perda quantílica e a cobertura por faixa de preço
+    """
+    if precificador.destilado:
+        raise ValueError("Calibração de quantis não se aplica a um modelo destilado; "
+                         "use o pacote da floresta original")
+    y = np.asarray(y, dtype=np.float64)
+    previstos = np.vstack([
+        precificador.predict_quantis(dados.iloc[i:i + TAMANHO_BLOCO], quantis)
+        for i in range(0, len(dados), TAMANHO_BLOCO)
+    ])
+    baixo, alto = previstos[:, 0], previstos[:, -1]
+    dentro = (y >= baixo) & (y <= alto)
+    nominal = quantis[-1] - quantis[0]
+
+    por_faixa = []
+    faixa = np.searchsorted(faixas, y, side='left') - 1
+    for i, (a, b) in enumerate(zip(faixas[:-1], faixas[1:])):
+        linhas = faixa == i
+        if not linhas.any():
+            continue
+        por_faixa.append({
+            'faixa_preco': f'({a}, {b}]',
+            'count': int(linhas.sum()),
+            'cobertura': float(dentro[linhas].mean()),
+            'abaixo_do_intervalo': float((y[linhas] < baixo[linhas]).mean()),
+            'acima_do_intervalo': float((y[linhas] > alto[linhas]).mean()),
+            'largura_media': float((alto[linhas] - baixo[linhas]).mean()),
+        })
+
+    return {
+        'corridas': int(len(y)),
+        'quantis': list(quantis),
+        'fracao_abaixo': {f'P{round(q * 100)}': float((y <= previstos[:, j]).mean()) for j, q in enumerate(quantis)},
+        'pinball': {f'P{round(q * 100)}': _pinball(y, previstos[:, j], q) for j, q in enumerate(quantis)},
+        'cobertura_nominal': nominal,
+        'cobertura': float(dentro.mean()),
+        'largura_media': float((alto - baixo).mean()),
+        'faixas': por_faixa,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibração dos quantis de preço na divisão de teste')
+    parser.add_argument('--csv', help='CSV do Kaggle (ingerido para o cache se necessário)')
+    parser.add_argument('--cache', default=DIRETORIO_CACHE)
+    parser.add_argument('--artefatos', default=DIRETORIO_PADRAO)
+    parser.add_argument('--saida', default=None, help=f'padrão: <artefatos>_{ARQUIVO_CALIBRACAO}')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.csv:
+        garantir_cache(args.csv, args.cache)
+    df = carregar_cache(args.cache)
+    _, teste = train_test_split(df, test_size=0.2, random_state=args.seed)
+
+    artefatos = carregar_artefatos(args.artefatos)
+    precificador = artefatos.precificador()
+    precificador.preprocessador.politica_desconhecida = 'prior'
+    relatorio = {'versao': artefatos.versao, **relatorio_calibracao(precificador, teste, teste[ALVO])}
+
+    # Ao lado do pacote, nunca dentro: uma versão publicada não é alterada
+    saida = args.saida or f'{args.artefatos.rstrip(os.sep)}_{ARQUIVO_CALIBRACAO}'
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    print(f"{relatorio['corridas']:,} corridas de teste")
+    for nome, fracao in relatorio['fracao_abaixo'].items():
+        print(f"  abaixo de {nome}: {fracao:.1%} | pinball {relatorio['pinball'][nome]:.3f}")
+    print(f"  cobertura P10-P90: {relatorio['cobertura']:.1%} (nominal {relatorio['cobertura_nominal']:.0%}), "
+          f"largura média ${relatorio['largura_media']:.2f}")
+    for faixa in relatorio['faixas']:
+        print(f"  {faixa['faixa_preco']:>10}: cobertura {faixa['cobertura']:.1%} "
+              f"(abaixo {faixa['abaixo_do_intervalo']:.1%}, acima {faixa['acima_do_intervalo']:.1%}), "
+              f"n={faixa['count']:,}")
+    print(f"Relatório gravado em '{saida}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Monitoramento de deriva das corridas cotadas em produção.
+
+As corridas que chegam ao modelo (multiplicador, distância, clima, locais) se
+afastam com o tempo dos dados de Boston de 2018 usados no treino. Na
+exportação do modelo (treino.py, destilacao.py) cada feature da matriz do
+modelo, antes da padronização, e o preço previsto ganham uma distribuição de
+referência: limites de faixas (quantis do treino, ou os próprios valores
+quando há poucos valores distintos, como nas categorias codificadas) e a
+proporção do treino em cada faixa, gravados no manifesto do pacote.
+Entram todas as features que o modelo recebe, inclusive as que o app deriva
+(latitude da origem; apparentTemperatureLow e temperatureHigh da
+temperatura, com deslocamentos fixos): a diferença entre o que o app
+sintetiza e o que foi medido no treino é deriva real do que chega ao
+modelo. A temperatura informada no formulário também é monitorada, contra a
+temperatura equivalente do treino (preprocessamento.temperatura_informada).
+
+Em produção, MonitorDeriva conta as cotações recentes nessas mesmas faixas,
+em uma janela deslizante de blocos com memória constante, e compara cada
+histograma com a referência por PSI e pela estatística KS (distância máxima
+entre as distribuições acumuladas nas faixas). O caminho da previsão só
+enfileira a corrida; montar as features e contar fica em uma thread
+separada.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+from preprocessamento import PreProcessador, colunas_entrada, temperatura_informada
+
+N_FAIXAS = 10
+MAX_DISTINTOS = 32
+COLUNA_PRECO = 'preco'
+COLUNA_TEMPERATURA = 'temperature'
+
+# PSI acima de 0,25 é o limiar usual de mudança relevante (0,1: moderada)
+LIMIAR_PSI = 0.25
+LIMIAR_KS = 0.1
+EPSILON = 1e-4
+
+
+def calcular_referencia(colunas, n_faixas=N_FAIXAS, max_distintos=MAX_DISTINTOS):
+    """
+    Distribuição de referência de cada coluna, em faixas.
+
+    Colunas com até `max_distintos` valores (multiplicador, latitude,
+    categorias codificadas) ganham uma faixa por valor, com limites nos
+    pontos médios; as demais, faixas nos quantis.
+
+    Args:
+        colunas: Dicionário nome -> array com os valores do treino
+        n_faixas: Número de faixas por quantil das colunas contínuas
+        max_distintos: Até este número de valores distintos, uma faixa por valor
+
+    Returns:
+        Dicionário nome -> {'limites', 'proporcoes', 'n'}, serializável em JSON
+    """
+    referencia = {}
+    for nome, valores in colunas.items():
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        distintos = np.unique(valores)
+        if len(distintos) <= max_distintos:
+            limites = (distintos[:-1] + distintos[1:]) / 2
+        else:
+            limites = np.unique(np.quantile(valores, np.linspace(0, 1, n_faixas + 1)[1:-1]))
+        contagens = np.bincount(np.searchsorted(limites, valores, side='right'), minlength=len(limites) + 1)
+        referencia[nome] = {'limites': limites.tolist(), 'proporcoes': (contagens / len(valores)).tolist(),
+                            'n': int(len(valores))}
+    return referencia
+
+
+def referencia_modelo(preprocessador, dados, previsto=None):
+    """
+    Referência das features do modelo (antes da padronização), da
+    temperatura informada e do preço.
+
+    Args:
+        preprocessador: PreProcessador ajustado
+        dados: Corridas de treino (DataFrame ou mapeamento coluna -> array)
+        previsto: Preços previstos pelo modelo para essas corridas (None = só
+            as features; o preço pode ser juntado depois com
+            calcular_referencia({COLUNA_PRECO: ...}))
+
+    Returns:
+        Dicionário de calcular_referencia
+    """
+    X = preprocessador.montar_features(dados)
+    colunas = dict(zip(preprocessador.features, X.T))
+    colunas[COLUNA_TEMPERATURA] = temperatura_informada(dados)
+    if previsto is not None:
+        colunas[COLUNA_PRECO] = previsto
+    return calcular_referencia(colunas)
+
+
+def psi(referencia, atual, epsilon=EPSILON):
+    """Population Stability Index entre duas distribuições nas mesmas faixas."""
+    p = np.maximum(np.asarray(referencia, dtype=np.float64), epsilon)
+    q = np.maximum(np.asarray(atual, dtype=np.float64), epsilon)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def ks(referencia, atual):
+    """Estatística KS nas faixas: maior diferença entre as acumuladas."""
+    return float(np.max(np.abs(np.cumsum(referencia) - np.cumsum(atual))))
+
+
+class MonitorDeriva:
+    """
+    Histogramas das cotações recentes comparados à referência do treino.
+
+    A janela é um anel de `n_blocos` blocos de contagens; quando o bloco atual
+    enche, o mais antigo é zerado e reaproveitado, então a memória não depende
+    do número de cotações e a janela cobre as últimas ~`tamanho_janela`.
+    """
+
+    def __init__(self, referencia, preprocessador, tamanho_janela=5000, n_blocos=10, minimo=500,
+                 limiar_psi=LIMIAR_PSI, limiar_ks=LIMIAR_KS, intervalo=1.0, max_pendentes=1024,
+                 metricas=None, ao_alertar=None):
+        """
+        Args:
+            referencia: Dicionário de calcular_referencia (manifesto do pacote)
+            preprocessador: PreProcessador do modelo; categorias desconhecidas
+                entram pelo prior, em vez de descartar a corrida
+            tamanho_janela: Número aproximado de cotações na janela
+            n_blocos: Blocos do anel (a janela anda de bloco em bloco)
+            minimo: Cotações na janela antes de qualquer alerta
+            limiar_psi: PSI a partir do qual a feature está em alerta
+            limiar_ks: KS a partir do qual a feature está em alerta
+            intervalo: Segundos entre as passadas da thread de contagem
+            max_pendentes: Lotes aguardando a thread; acima disso os mais
+                antigos são descartados (contados em 'descartadas')
+            metricas: Metricas opcional; conta 'alertas_deriva' e
+                'alertas_deriva_<feature>' quando uma feature entra em alerta
+            ao_alertar: Função chamada com (feature, estatisticas) quando uma
+                feature entra em alerta
+        """
+        self.preprocessador = PreProcessador.de_dict({**preprocessador.para_dict(), 'politica_desconhecida': 'prior'})
+        self.colunas = [f for f in self.preprocessador.features if f in referencia]
+        self.extras = [c for c in (COLUNA_TEMPERATURA, COLUNA_PRECO) if c in referencia]
+        self.nomes = self.colunas + self.extras
+        self._posicoes = [self.preprocessador.features.index(f) for f in self.colunas]
+        self.limites = [np.asarray(referencia[nome]['limites'], dtype=np.float64) for nome in self.nomes]
+        self.referencia = [np.asarray(referencia[nome]['proporcoes'], dtype=np.float64) for nome in self.nomes]
+
+        # Todas as faixas lado a lado em um vetor: a feature j ocupa [inicio[j], inicio[j + 1])
+        self._inicio = np.concatenate([[0], np.cumsum([len(p) for p in self.referencia])])
+        self.tamanho_bloco = max(1, tamanho_janela // n_blocos)
+        self._contagens = np.zeros((n_blocos, self._inicio[-1]), dtype=np.int64)
+        self._n_bloco = np.zeros(n_blocos, dtype=np.int64)
+        self._bloco = 0
+
+        self.minimo = minimo
+        self.limiar_psi = limiar_psi
+        self.limiar_ks = limiar_ks
+        self.metricas = metricas
+        self.ao_alertar = ao_alertar
+        self.observadas = 0
+        self.descartadas = 0
+        self.em_alerta = set()
+
+        self._pendentes = deque()
+        self.max_pendentes = max_pendentes
+        self._trava = threading.Lock()
+        self._trava_processar = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, args=(intervalo,), daemon=True)
+        self._thread.start()
+
+    def observar(self, dados, precos):
+        """
+        Enfileira corridas cotadas (custo de um append; a contagem é feita na thread).
+
+        Args:
+            dados: Corridas no formato do Precificador (DataFrame ou mapeamento
+                coluna -> array); não devem ser alteradas depois
+            precos: Preços cotados, na mesma ordem
+        """
+        if len(self._pendentes) >= self.max_pendentes:
+            try:
+                self._pendentes.popleft()
+                self.descartadas += 1
+            except IndexError:
+                pass  # a thread esvaziou a fila entre o len e o popleft
+        self._pendentes.append((dados, precos))
+
+    def _executar(self, intervalo):
+        while not self._parar.wait(intervalo):
+            try:
+                self.processar()
+            except Exception:
+                # Um lote malformado não pode parar o monitor
+                if self.metricas is not None:
+                    self.metricas.contar('deriva_erros')
+
+    def processar(self):
+        """Conta os lotes pendentes e atualiza os alertas."""
+        # A thread e uma consulta a estatisticas() podem processar ao mesmo tempo
+        with self._trava_processar:
+            lotes = []
+            while self._pendentes:
+                lotes.append(self._pendentes.popleft())
+            if not lotes:
+                return
+            indices = np.concatenate([self._faixas(dados, precos) for dados, precos in self._juntar(lotes)])
+            with self._trava:
+                self._acumular(indices)
+                self.observadas += len(indices)
+            self._atualizar_alertas()
+
+    @staticmethod
+    def _juntar(lotes):
+        """Lotes com as mesmas colunas viram um só (uma chamada a montar_features)."""
+        grupos = {}
+        for dados, precos in lotes:
+            colunas, _ = colunas_entrada(dados)
+            grupos.setdefault(frozenset(colunas), []).append((colunas, precos))
+        return [
+            ({col: np.concatenate([colunas[col] for colunas, _ in grupo]) for col in chaves},
+             np.concatenate([np.asarray(precos, dtype=np.float64) for _, precos in grupo]))
+            for chaves, grupo in grupos.items()
+        ]
+
+    def _faixas(self, dados, precos):
+        """Índice da faixa de cada corrida em cada coluna, já deslocado no vetor de faixas."""
+        X = self.preprocessador.montar_features(dados)
+        valores = [X[:, j] for j in self._posicoes]
+        if COLUNA_TEMPERATURA in self.extras:
+            valores.append(temperatura_informada(dados))
+        if COLUNA_PRECO in self.extras:
+            valores.append(np.asarray(precos, dtype=np.float64))
+        return np.column_stack([
+            np.searchsorted(limites, coluna, side='right') + inicio
+            for limites, coluna, inicio in zip(self.limites, valores, self._inicio)
+        ])
+
+    def _acumular(self, indices):
+        inicio = 0
+        while inicio < len(indices):
+            if self._n_bloco[self._bloco] >= self.tamanho_bloco:
+                self._bloco = (self._bloco + 1) % len(self._n_bloco)
+                self._contagens[self._bloco] = 0
+                self._n_bloco[self._bloco] = 0
+            parte = indices[inicio:inicio + self.tamanho_bloco - self._n_bloco[self._bloco]]
+            self._contagens[self._bloco] += np.bincount(parte.ravel(), minlength=self._contagens.shape[1])
+            self._n_bloco[self._bloco] += len(parte)
+            inicio += len(parte)
+
+    def _atualizar_alertas(self):
+        estatisticas = self.estatisticas(processar=False)
+        alertas = set(estatisticas['alertas'])
+        for nome in sorted(alertas - self.em_alerta):
+            if self.metricas is not None:
+                self.metricas.contar('alertas_deriva')
+                self.metricas.contar(f'alertas_deriva_{nome}')
+            if self.ao_alertar is not None:
+                self.ao_alertar(nome, estatisticas['features'][nome])
+        self.em_alerta = alertas
+
+    def estatisticas(self, processar=True):
+        """
+        PSI e KS de cada feature na janela atual.
+
+        Args:
+            processar: Se True, conta antes os lotes ainda pendentes
+
+        Returns:
+            Dicionário com 'janela' (cotações na janela), 'observadas',
+            'descartadas', 'features' (psi, ks e alerta por feature) e
+            'alertas' (features em alerta)
+        """
+        if processar:
+            self.processar()
+        with self._trava:
+            contagens = self._contagens.sum(axis=0)
+            janela = int(self._n_bloco.sum())
+
+        features = {}
+        for j, nome in enumerate(self.nomes):
+            if not janela:
+                features[nome] = {'psi': None, 'ks': None, 'alerta': False}
+                continue
+            atual = contagens[self._inicio[j]:self._inicio[j + 1]] / janela
+            valor_psi, valor_ks = psi(self.referencia[j], atual), ks(self.referencia[j], atual)
+            alerta = janela >= self.minimo and (valor_psi >= self.limiar_psi or valor_ks >= self.limiar_ks)
+            features[nome] = {'psi': valor_psi, 'ks': valor_ks, 'alerta': alerta}
+        return {
+            'janela': janela,
+            'observadas': self.observadas,
+            'descartadas': self.descartadas,
+            'features': features,
+            'alertas': [nome for nome, valores in features.items() if valores['alerta']],
+        }
+
+    def resumo(self):
+        """Campos numéricos planos para Metricas.registrar_coletor (psi_<feature>, ks_<feature>)."""
+        estatisticas = self.estatisticas()
+        resumo = {'janela': estatisticas['janela'], 'observadas': estatisticas['observadas'],
+                  'descartadas': estatisticas['descartadas'], 'alertas': len(estatisticas['alertas'])}
+        for nome, valores in estatisticas['features'].items():
+            if valores['psi'] is not None:
+                resumo[f'psi_{nome}'] = valores['psi']
+                resumo[f'ks_{nome}'] = valores['ks']
+        return resumo
+
+    def fechar(self):
+        self._parar.set()
+        self._thread.join()
@@ -0,0 +1,220 @@
+"""
+Destilação da floresta em um modelo compacto (camada 'compacto').
+
+O preço é dominado por distância, multiplicador dinâmico e serviço; uma
+floresta de 100 árvores profundas é muito mais do que essa função precisa.
+Aqui um GradientBoostingRegressor raso aprende as previsões da própria
+floresta (não o preço real): sobre as corridas de treino e sobre amostras
+sintéticas que cobrem o espaço do formulário (distâncias, multiplicadores e
+serviços sorteados), onde o histórico é esparso.
+
+O boosting é achatado em uma FlorestaPlana (floresta.exportar_boosting) e
+exportado no mesmo pacote de artefatos, então app, serviço, grade de preços
+e explicações o usam sem mudanças; a camada é escolhida pela env
+PRECO_CAMADA=compacto (ver artefatos.diretorio_camada). O relatório compara
+MAE no teste, tamanho do pacote e latência de uma corrida, e o pacote só é
+gravado se o MAE não piorar mais que `--delta-mae-max`.
+
+Uso:
+    python destilacao.py --cache cache --professor artefatos --saida artefatos_compacto \
+        --n-estimators 200 --max-depth 6 --delta-mae-max 0.1
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import train_test_split
+
+from artefatos import (DIRETORIO_COMPACTO, DIRETORIO_PADRAO, carregar_artefatos, publicar, salvar_artefatos,
+                       tamanho_pacote)
+from deriva import referencia_modelo
+from floresta import exportar_boosting
+from grade_precos import MULTIPLICADORES
+from ingestao import ALVO, DIRETORIO_CACHE, carregar_cache, garantir_cache
+from preprocessamento import FEATURES_MODELO, TIPO_SERVICO
+
+ARQUIVO_RELATORIO = 'destilacao.json'
+AMOSTRAS_LATENCIA = 300
+
+
+def amostras_sinteticas(X, n, preprocessador, seed=0):
+    """
+    Corridas do treino com distância, multiplicador e serviço sorteados.
+
+    O clima, a origem e o destino vêm de corridas reais; distância (uniforme
+    na faixa observada), multiplicador (valores do formulário) e serviço
+    (com o tipo correspondente) cobrem combinações raras no histórico.
+
+    Args:
+        X: DataFrame de corridas de treino (FEATURES_MODELO)
+        n: Número de amostras
+        preprocessador: PreProcessador do modelo (serviços conhecidos)
+        seed: Semente do sorteio
+
+    Returns:
+        DataFrame com n corridas
+    """
+    rng = np.random.default_rng(seed)
+    amostra = X.iloc[rng.integers(0, len(X), n)].reset_index(drop=True)
+    conhecidos = set(preprocessador.categorias['name'].tolist())
+    servicos = np.array([nome for nome in TIPO_SERVICO if nome in conhecidos], dtype=object)
+
+    amostra['distance'] = rng.uniform(X['distance'].min(), X['distance'].max(), n)
+    amostra['surge_multiplier'] = rng.choice(MULTIPLICADORES, n)
+    if len(servicos):
+        amostra['name'] = rng.choice(servicos, n)
+        amostra['cab_type'] = [TIPO_SERVICO[nome] for nome in amostra['name']]
+    return amostra
+
+
+def _latencias(precificador, corridas):
+    """p50 e p99 (ms) de previsões de uma corrida por vez, do dado bruto ao preço."""
+    tempos = []
+    for corrida in corridas:
+        inicio = time.perf_counter()
+        precificador.predict_batch({col: [valor] for col, valor in corrida.items()})
+        tempos.append(time.perf_counter() - inicio)
+    return float(np.percentile(tempos, 50) * 1000), float(np.percentile(tempos, 99) * 1000)
+
+
+def destilar(df, professor=DIRETORIO_PADRAO, saida=DIRETORIO_COMPACTO, n_estimators=200, max_depth=6,
+             learning_rate=0.1, n_amostras=300_000, n_sinteticas=100_000, delta_mae_max=0.1, seed=42):
+    """
+    Treina o modelo compacto sobre as previsões da floresta e grava pacote + relatório.
+
+    Args:
+        df: DataFrame com as colunas do modelo e o preço
+        professor: Pacote de artefatos da floresta
+        saida: Diretório do pacote compacto
+        n_estimators, max_depth, learning_rate: Hiperparâmetros do boosting
+        n_amostras: Máximo de corridas de treino usadas na destilação
+        n_sinteticas: Corridas sintéticas adicionadas (ver amostras_sinteticas)
+        delta_mae_max: Piora máxima aceita do MAE no teste (USD)
+        seed: Semente da divisão treino/teste (a mesma de treino.py) e do boosting
+
+    Returns:
+        Dicionário gravado em destilacao.json (com 'aprovado')
+    """
+    artefatos = carregar_artefatos(professor)
+    precificador = artefatos.precificador()
+    precificador.preprocessador.politica_desconhecida = 'prior'
+    preprocessador = precificador.preprocessador
+
+    X = df[FEATURES_MODELO]
+    y = df[ALVO].to_numpy(dtype=np.float64)
+    X_train, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=seed)
+
+    # Alvo da destilação: a previsão da floresta, no treino e nas sintéticas
+    if len(X_train) > n_amostras:
+        X_train = X_train.sample(n_amostras, random_state=seed)
+    sinteticas = amostras_sinteticas(X_train, n_sinteticas, preprocessador, seed)
+    X_destilacao = np.vstack([preprocessador.transform(X_train), preprocessador.transform(sinteticas)])
+    y_destilacao = precificador.modelo.predict(X_destilacao)
+
+    aluno = GradientBoostingRegressor(n_estimators=n_estimators, max_depth=max_depth, learning_rate=learning_rate,
+                                      subsample=0.8, random_state=seed)
+    inicio = time.perf_counter()
+    aluno.fit(X_destilacao, y_destilacao)
+    tempo_treino = time.perf_counter() - inicio
+
+    parametros = {'n_estimators': n_estimators, 'max_depth': max_depth, 'learning_rate': learning_rate,
+                  'subsample': 0.8, 'n_amostras': len(X_train), 'n_sinteticas': n_sinteticas}
+    amostra = X_test.sample(min(AMOSTRAS_LATENCIA, len(X_test)), random_state=seed)
+    corridas = json.loads(amostra.to_json(orient='records'))
+
+    # Referência de deriva com o preço do próprio modelo compacto nas corridas reais
+    referencia = referencia_modelo(preprocessador, X_train, aluno.predict(X_destilacao[:len(X_train)]))
+
+    with tempfile.TemporaryDirectory(prefix='destilacao_') as trabalho:
+        pacote = os.path.join(trabalho, 'compacto')
+        versao = salvar_artefatos(pacote, exportar_boosting(aluno), preprocessador, artefatos.fator_rodovia,
+                                  destilacao={'professor': artefatos.versao, 'modelo': 'GradientBoostingRegressor',
+                                              'parametros': parametros},
+                                  referencia=referencia)
+        compacto = carregar_artefatos(pacote).precificador()
+
+        previsto_professor = precificador.predict_batch(X_test)
+        previsto_aluno = compacto.predict_batch(X_test)
+        mae_professor = float(mean_absolute_error(y_test, previsto_professor))
+        mae_aluno = float(mean_absolute_error(y_test, previsto_aluno))
+        divergencia = np.abs(previsto_aluno - previsto_professor)
+
+        latencia_professor = _latencias(precificador, corridas)
+        latencia_aluno = _latencias(compacto, corridas)
+        relatorio = {
+            'versao': versao,
+            'professor': artefatos.versao,
+            'parametros': parametros,
+            'tempo_treino_s': tempo_treino,
+            'mae_professor': mae_professor,
+            'mae_compacto': mae_aluno,
+            'delta_mae': mae_aluno - mae_professor,
+            'delta_mae_max': delta_mae_max,
+            'divergencia_media': float(divergencia.mean()),
+            'divergencia_p99': float(np.percentile(divergencia, 99)),
+            'tamanho_professor_bytes': tamanho_pacote(professor),
+            'tamanho_compacto_bytes': tamanho_pacote(pacote),
+            'nos_professor': artefatos.floresta.n_nos,
+            'nos_compacto': compacto.modelo.n_nos,
+            'latencia_professor_ms': {'p50': latencia_professor[0], 'p99': latencia_professor[1]},
+            'latencia_compacto_ms': {'p50': latencia_aluno[0], 'p99': latencia_aluno[1]},
+        }
+        relatorio['aprovado'] = relatorio['delta_mae'] <= delta_mae_max
+        if relatorio['aprovado']:
+            # destilacao.json entra no pacote antes da troca atômica: a versão
+            # publicada nunca é alterada depois do symlink mudar
+            with open(os.path.join(pacote, ARQUIVO_RELATORIO), 'w', encoding='utf-8') as f:
+                json.dump(relatorio, f, ensure_ascii=False, indent=2)
+            publicar(pacote, saida)
+            caminho = os.path.join(saida, ARQUIVO_RELATORIO)
+
+    if not relatorio['aprovado']:
+        # Reprovado, o pacote compacto atual fica intacto e o relatório vai ao lado
+        caminho = f'{saida.rstrip(os.sep)}_{ARQUIVO_RELATORIO}'
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    relatorio['caminho'] = caminho
+    return relatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Destila a floresta em um modelo compacto')
+    parser.add_argument('--csv', help='CSV do Kaggle (ingerido para o cache se necessário)')
+    parser.add_argument('--cache', default=DIRETORIO_CACHE)
+    parser.add_argument('--professor', default=DIRETORIO_PADRAO)
+    parser.add_argument('--saida', default=DIRETORIO_COMPACTO)
+    parser.add_argument('--n-estimators', type=int, default=200)
+    parser.add_argument('--max-depth', type=int, default=6)
+    parser.add_argument('--learning-rate', type=float, default=0.1)
+    parser.add_argument('--amostras', type=int, default=300_000, help='máximo de corridas de treino')
+    parser.add_argument('--sinteticas', type=int, default=100_000)
+    parser.add_argument('--delta-mae-max', type=float, default=0.1, help='piora máxima do MAE (USD)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.csv:
+        garantir_cache(args.csv, args.cache)
+    relatorio = destilar(carregar_cache(args.cache), args.professor, args.saida, args.n_estimators, args.max_depth,
+                         args.learning_rate, args.amostras, args.sinteticas, args.delta_mae_max, args.seed)
+
+    print(f"MAE no teste: floresta {relatorio['mae_professor']:.3f} | compacto {relatorio['mae_compacto']:.3f} "
+          f"(Δ {relatorio['delta_mae']:+.3f}; divergência média ${relatorio['divergencia_media']:.3f})")
+    print(f"Tamanho: {relatorio['tamanho_professor_bytes'] / 1e6:.1f} MB -> "
+          f"{relatorio['tamanho_compacto_bytes'] / 1e6:.2f} MB")
+    print(f"Latência de uma corrida (p50/p99): "
+          f"{relatorio['latencia_professor_ms']['p50']:.2f}/{relatorio['latencia_professor_ms']['p99']:.2f} ms -> "
+          f"{relatorio['latencia_compacto_ms']['p50']:.2f}/{relatorio['latencia_compacto_ms']['p99']:.2f} ms")
+    if not relatorio['aprovado']:
+        print(f"Reprovado: Δ MAE acima de {args.delta_mae_max}; veja {relatorio['caminho']}")
+        sys.exit(1)
+    print(f"Pacote compacto (versão {relatorio['versao']}) gravado em '{args.saida}'")
+
+
+if __name__ == '__main__':
+    main()
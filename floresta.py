@@ -0,0 +1,303 @@
+"""
+Motor de inferência da Random Forest sobre arrays planos do NumPy.
+
+As árvores de um RandomForestRegressor treinado são achatadas em arrays
+contíguos (feature, limiar, filhos e valor de cada nó) e a previsão percorre
+todas as árvores e todas as linhas ao mesmo tempo, um nível por iteração,
+descartando os caminhos que já chegaram a uma folha.
+O resultado é idêntico ao de `modelo.predict`, sem o custo fixo do sklearn
+por chamada. Lotes grandes são percorridos em blocos de linhas, direto sobre
+os arrays (mapeados em memória pelo pacote de artefatos), sem cópias
+privadas dos nós.
+"""
+import numpy as np
+
+# Linhas processadas por vez; limita a memória intermediária (linhas x árvores)
+TAMANHO_BLOCO = 8192
+
+# Os caminhos que chegaram a uma folha só saem do conjunto ativo quando são
+# mais que esta fração dele; compactar a cada nível custa mais que carregá-los
+FRACAO_COMPACTAR = 0.5
+
+
+class FlorestaPlana:
+    """
+    Random Forest de regressão representada por arrays planos.
+
+    Os nós de todas as árvores ficam concatenados; `raizes` guarda o índice do
+    primeiro nó de cada árvore. Folhas apontam para si mesmas (esquerda e
+    direita), o que as identifica sem um array extra no arquivo.
+    """
+
+    ARRAYS = ('feature', 'limiar', 'esquerda', 'direita', 'valor', 'raizes')
+
+    def __init__(self, feature, limiar, esquerda, direita, valor, raizes, profundidade, n_features):
+        self.feature = feature
+        self.limiar = limiar
+        self.esquerda = esquerda
+        self.direita = direita
+        self.valor = valor
+        self.raizes = raizes
+        self.profundidade = int(profundidade)
+        self.n_features = int(n_features)
+
+    @property
+    def n_arvores(self):
+        return len(self.raizes)
+
+    @property
+    def n_nos(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, nome).nbytes for nome in self.ARRAYS)
+
+    def _preparar(self, X):
+        # O sklearn compara as features em float32 com limiares em float64;
+        # fazemos o mesmo para reproduzir exatamente as mesmas decisões.
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Esperadas {self.n_features} features, recebidas {X.shape[1]}")
+        return X
+
+    def _folhas_bloco(self, X):
+        n = X.shape[0]
+        Xf = X.ravel()
+        folhas = np.broadcast_to(self.raizes, (n, self.n_arvores)).ravel().copy()
+
+        # Pares (linha, árvore) ainda a caminho de uma folha; a cada nível os
+        # que chegaram saem do conjunto ativo, então o custo acompanha o
+        # comprimento real dos caminhos e não a profundidade máxima.
+        ativos = np.arange(folhas.size)
+        nos = folhas.copy()
+        base = np.repeat(np.arange(n, dtype=np.int64) * self.n_features, self.n_arvores)
+
+        while ativos.size:
+            vai_esquerda = Xf[base + self.feature[nos]] <= self.limiar[nos]
+            nos = np.where(vai_esquerda, self.esquerda[nos], self.direita[nos])
+            chegou = self.esquerda[nos] == nos
+            chegaram = np.count_nonzero(chegou)
+            if chegaram == nos.size:
+                folhas[ativos] = nos
+                break
+            # Folhas apontam para si mesmas: um caminho que ficou no conjunto
+            # ativo depois de chegar apenas repete a folha no nível seguinte
+            if chegaram > FRACAO_COMPACTAR * nos.size:
+                folhas[ativos[chegou]] = nos[chegou]
+                continua = ~chegou
+                ativos, nos, base = ativos[continua], nos[continua], base[continua]
+        return folhas.reshape(n, self.n_arvores)
+
+    def folhas(self, X):
+        """
+        Índice (global) da folha alcançada em cada árvore.
+
+        Args:
+            X: Matriz (n_linhas, n_features) já padronizada, ou um vetor de uma linha
+
+        Returns:
+            np.ndarray de shape (n_linhas, n_arvores)
+        """
+        X = self._preparar(X)
+        if X.shape[0] <= TAMANHO_BLOCO:
+            return self._folhas_bloco(X)
+        return np.concatenate([
+            self._folhas_bloco(X[i:i + TAMANHO_BLOCO]) for i in range(0, X.shape[0], TAMANHO_BLOCO)
+        ])
+
+    def prever_por_arvore(self, X):
+        """
+        Previsão de cada árvore para cada linha.
+
+        Returns:
+            np.ndarray de shape (n_linhas, n_arvores)
+        """
+        return self.valor[self.folhas(X)]
+
+    def predict(self, X):
+        """
+        Média das árvores, idêntica a RandomForestRegressor.predict.
+
+        Args:
+            X: Matriz (n_linhas, n_features) já padronizada
+
+        Returns:
+            np.ndarray com uma previsão por linha
+        """
+        return self._media(self.prever_por_arvore(X))
+
+    def _media(self, por_arvore):
+        # Soma na ordem das árvores, como o sklearn, para o mesmo arredondamento
+        soma = np.zeros(por_arvore.shape[0])
+        for t in range(self.n_arvores):
+            soma += por_arvore[:, t]
+        return soma / self.n_arvores
+
+    def quantis(self, X, quantis=(0.1, 0.5, 0.9)):
+        """
+        Quantis da distribuição das previsões das árvores para cada linha.
+
+        Args:
+            X: Matriz (n_linhas, n_features) já padronizada
+            quantis: Quantis desejados, entre 0 e 1
+
+        Returns:
+            np.ndarray de shape (n_linhas, len(quantis))
+        """
+        return np.quantile(self.prever_por_arvore(X), quantis, axis=1).T
+
+    def prever_com_quantis(self, X, quantis=(0.1, 0.5, 0.9)):
+        """
+        Previsão (média) e quantis das árvores a partir de um único percurso.
+
+        Returns:
+            Tupla (np.ndarray com uma previsão por linha, idêntica a `predict`,
+            np.ndarray de shape (n_linhas, len(quantis)))
+        """
+        por_arvore = self.prever_por_arvore(X)
+        return self._media(por_arvore), np.quantile(por_arvore, quantis, axis=1).T
+
+    def _contribuicoes_bloco(self, X):
+        n = X.shape[0]
+        Xf = X.ravel()
+        nos = np.tile(self.raizes, n)
+        base = np.repeat(np.arange(n, dtype=np.int64) * self.n_features, self.n_arvores)
+        acumulado = np.zeros(n * self.n_features)
+        folhas = np.empty(nos.size, dtype=np.int64)
+        ativos = np.arange(nos.size)
+
+        # Mesmo percurso de _folhas_bloco; cada passo credita a variação do
+        # valor do nó (filho - pai) à feature testada no pai
+        while nos.size:
+            feature = self.feature[nos]
+            vai_esquerda = Xf[base + feature] <= self.limiar[nos]
+            filhos = np.where(vai_esquerda, self.esquerda[nos], self.direita[nos])
+            acumulado += np.bincount(base + feature, weights=self.valor[filhos] - self.valor[nos],
+                                     minlength=acumulado.size)
+            continua = self.esquerda[filhos] != filhos
+            folhas[ativos[~continua]] = filhos[~continua]
+            nos, base, ativos = filhos[continua], base[continua], ativos[continua]
+        return acumulado.reshape(n, self.n_features) / self.n_arvores, folhas.reshape(n, self.n_arvores)
+
+    def _contribuicoes_e_folhas(self, X):
+        X = self._preparar(X)
+        blocos = [self._contribuicoes_bloco(X[i:i + TAMANHO_BLOCO]) for i in range(0, X.shape[0], TAMANHO_BLOCO)]
+        return np.concatenate([b[0] for b in blocos]), np.concatenate([b[1] for b in blocos])
+
+    def contribuicoes(self, X):
+        """
+        Decomposição de cada previsão pelos caminhos de decisão.
+
+        previsão = viés + soma das contribuições da linha, em que o viés é a
+        média dos valores das raízes (média do alvo no treino) e cada feature
+        recebe a soma das variações de valor nos nós em que foi testada,
+        média sobre as árvores.
+
+        Args:
+            X: Matriz (n_linhas, n_features) já padronizada
+
+        Returns:
+            Tupla (viés, np.ndarray de shape (n_linhas, n_features))
+        """
+        vies = float(np.mean(self.valor[self.raizes]))
+        return vies, self._contribuicoes_e_folhas(X)[0]
+
+    def contribuicoes_por_arvore(self, X):
+        """
+        Contribuições e previsão de cada árvore, de um único percurso.
+
+        Args:
+            X: Matriz (n_linhas, n_features) já padronizada
+
+        Returns:
+            Tupla (viés, contribuições como em `contribuicoes`, np.ndarray de
+            shape (n_linhas, n_arvores) como em `prever_por_arvore`)
+        """
+        vies = float(np.mean(self.valor[self.raizes]))
+        contribuicoes, folhas = self._contribuicoes_e_folhas(X)
+        return vies, contribuicoes, self.valor[folhas]
+
+    def salvar(self, caminho):
+        """Salva os arrays em um arquivo .npz."""
+        np.savez(caminho, profundidade=self.profundidade, n_features=self.n_features,
+                 **{nome: getattr(self, nome) for nome in self.ARRAYS})
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Carrega uma floresta salva com `salvar`."""
+        with np.load(caminho) as arquivo:
+            return cls(**{nome: arquivo[nome] for nome in cls.ARRAYS},
+                       profundidade=int(arquivo['profundidade']),
+                       n_features=int(arquivo['n_features']))
+
+
+def _achatar(arvores, n_features, escala=1.0, deslocamento=0.0):
+    """Concatena as árvores (sklearn Tree) em uma FlorestaPlana; folhas valem valor * escala + deslocamento."""
+    if any(arvore.n_outputs != 1 for arvore in arvores):
+        raise ValueError("Apenas modelos de regressão com uma saída são suportados")
+
+    tamanhos = np.array([arvore.node_count for arvore in arvores])
+    raizes = np.concatenate([[0], np.cumsum(tamanhos)[:-1]]).astype(np.int32)
+    feature, limiar, esquerda, direita, valor = [], [], [], [], []
+
+    for inicio, arvore in zip(raizes, arvores):
+        indices = np.arange(arvore.node_count, dtype=np.int32) + inicio
+        folha = arvore.children_left < 0
+        # Folhas viram laços: apontam para si mesmas e testam a feature 0
+        feature.append(np.where(folha, 0, arvore.feature).astype(np.int32))
+        limiar.append(np.where(folha, 0.0, arvore.threshold))
+        esquerda.append(np.where(folha, indices, arvore.children_left + inicio).astype(np.int32))
+        direita.append(np.where(folha, indices, arvore.children_right + inicio).astype(np.int32))
+        valor.append(arvore.value[:, 0, 0].astype(np.float64) * escala + deslocamento)
+
+    return FlorestaPlana(
+        feature=np.concatenate(feature),
+        limiar=np.concatenate(limiar),
+        esquerda=np.concatenate(esquerda),
+        direita=np.concatenate(direita),
+        valor=np.concatenate(valor),
+        raizes=raizes,
+        profundidade=max(arvore.max_depth for arvore in arvores),
+        n_features=n_features,
+    )
+
+
+def exportar_floresta(modelo):
+    """
+    Achata um RandomForestRegressor treinado em uma FlorestaPlana.
+
+    Args:
+        modelo: RandomForestRegressor (ou outro ensemble de DecisionTreeRegressor
+            com saída única) já treinado
+
+    Returns:
+        FlorestaPlana equivalente
+    """
+    return _achatar([estimador.tree_ for estimador in modelo.estimators_], modelo.n_features_in_)
+
+
+def exportar_boosting(modelo):
+    """
+    Achata um GradientBoostingRegressor (perda quadrática) em uma FlorestaPlana.
+
+    O boosting prevê base + taxa * soma das árvores; a FlorestaPlana prevê a
+    média das árvores. Com as folhas reescaladas para valor * taxa * n + base,
+    a média das n árvores é exatamente a previsão do boosting, e o mesmo
+    pacote de artefatos, motor de inferência e explicações servem aos dois.
+    As previsões de cada árvore isoladas, porém, deixam de ser preços: os
+    quantis entre as árvores não têm significado para um modelo destilado.
+
+    Args:
+        modelo: GradientBoostingRegressor treinado, com init padrão (média)
+
+    Returns:
+        FlorestaPlana equivalente
+    """
+    if modelo.loss != 'squared_error' or not hasattr(modelo.init_, 'constant_'):
+        raise ValueError("Apenas boosting com perda quadrática e init padrão é suportado")
+    arvores = [estimador.tree_ for estimador in modelo.estimators_[:, 0]]
+    base = float(np.ravel(modelo.init_.constant_)[0])
+    return _achatar(arvores, modelo.n_features_in_, escala=modelo.learning_rate * len(arvores), deslocamento=base)
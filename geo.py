@@ -0,0 +1,103 @@
+"""
+Distâncias geográficas vetorizadas.
+
+Todas as funções aceitam escalares ou arrays NumPy e fazem uma única passada
+vetorizada, de modo que a mesma rotina serve para o fallback de uma rota no
+app, para lotes de corridas no serviço e para milhões de pares históricos no
+backtest.
+
+A distância em linha reta subestima o trajeto real pelas ruas; o fator de
+correção de rodovia (razão mediana entre a distância das corridas e a
+distância haversine entre origem e destino) é ajustado nos dados de treino
+e gravado no pacote de artefatos.
+"""
+import numpy as np
+import pandas as pd
+
+from preprocessamento import COORDENADAS
+
+RAIO_TERRA_MILHAS = 3956
+FATOR_RODOVIA_PADRAO = 1.0
+
+
+def haversine_milhas(lat1, lon1, lat2, lon2):
+    """
+    Distância haversine (milhas) entre pontos em graus.
+
+    Args:
+        lat1, lon1: Latitude/longitude de origem (escalares ou arrays)
+        lat2, lon2: Latitude/longitude de destino (mesmo shape ou broadcast)
+
+    Returns:
+        np.ndarray (ou escalar NumPy) com as distâncias
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_MILHAS * np.arcsin(np.sqrt(a))
+
+
+def distancia_pares(origens, destinos, fator=FATOR_RODOVIA_PADRAO):
+    """
+    Distância estimada entre pares (lat, lon).
+
+    Args:
+        origens: Array (n, 2) ou um par (lat, lon)
+        destinos: Array (n, 2) ou um par (lat, lon)
+        fator: Fator de correção de rodovia (1.0 = linha reta)
+
+    Returns:
+        np.ndarray de shape (n,) (ou escalar para um único par)
+    """
+    origens, destinos = np.asarray(origens, dtype=np.float64), np.asarray(destinos, dtype=np.float64)
+    return fator * haversine_milhas(origens[..., 0], origens[..., 1], destinos[..., 0], destinos[..., 1])
+
+
+def _coordenadas_locais(locais, coordenadas):
+    """Array (n, 2) de coordenadas dos locais; NaN para locais desconhecidos."""
+    nomes = pd.Index(list(coordenadas))
+    tabela = np.vstack([np.array([coordenadas[nome] for nome in nomes], dtype=np.float64).reshape(-1, 2),
+                        [[np.nan, np.nan]]])
+    # get_indexer devolve -1 para desconhecidos, que cai na linha de NaN
+    return tabela[nomes.get_indexer(pd.Index(np.asarray(locais, dtype=object).ravel()))]
+
+
+def distancia_locais(source, destination, fator=FATOR_RODOVIA_PADRAO, coordenadas=None):
+    """
+    Distância estimada entre locais nomeados (ex.: colunas source/destination).
+
+    Args:
+        source: Sequência de nomes de origem
+        destination: Sequência de nomes de destino
+        fator: Fator de correção de rodovia
+        coordenadas: Dicionário local -> (lat, lon) (padrão: COORDENADAS)
+
+    Returns:
+        np.ndarray de shape (n,), NaN onde algum local não tem coordenadas
+    """
+    coordenadas = COORDENADAS if coordenadas is None else coordenadas
+    return distancia_pares(_coordenadas_locais(source, coordenadas),
+                           _coordenadas_locais(destination, coordenadas), fator)
+
+
+def ajustar_fator_rodovia(source, destination, distancia, coordenadas=None):
+    """
+    Razão mediana entre a distância percorrida e a distância em linha reta.
+
+    Só entram corridas entre locais com coordenadas conhecidas e diferentes;
+    sem nenhuma, o fator padrão (1.0) é devolvido.
+
+    Args:
+        source: Locais de origem das corridas de treino
+        destination: Locais de destino
+        distancia: Distância percorrida (milhas)
+        coordenadas: Dicionário local -> (lat, lon) (padrão: COORDENADAS)
+
+    Returns:
+        float
+    """
+    reta = distancia_locais(source, destination, coordenadas=coordenadas)
+    distancia = np.asarray(distancia, dtype=np.float64)
+    validos = np.isfinite(reta) & (reta > 0) & np.isfinite(distancia)
+    if not validos.any():
+        return FATOR_RODOVIA_PADRAO
+    return float(np.median(distancia[validos] / reta[validos]))
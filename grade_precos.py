@@ -0,0 +1,398 @@
+"""
+Grade de preços pré-calculada para o espaço discreto de cotações do app.
+
+Quase todos os campos do formulário são discretos: origem e destino entre os
+locais com coordenadas, o serviço (que determina o cab_type), os resumos do
+clima e o multiplicador dinâmico em passos de 0,1. O modelo é avaliado uma
+vez sobre toda a grade, com a distância pré-calculada de cada par de locais
+(matriz de rotas ou geo.py) e nós de temperatura e pressão, e o resultado
+fica em um array N-dimensional float32 aberto com mmap.
+
+Temperatura e pressão são interpoladas linearmente entre os nós. Os nós
+cobrem a faixa dos limiares usados pelas árvores nessas features; fora dela
+a floresta é constante, então valores fora da faixa são apenas truncados.
+
+Cada reconstrução grava um arquivo de preços novo (`precos-<carimbo>.npy`) e
+só então troca o grade.json que aponta para ele (os.replace), de modo que
+processos com a grade antiga mapeada nunca leem um arquivo pela metade.
+
+Uso:
+    python grade_precos.py --artefatos artefatos --saida grade_precos \
+        --temperaturas 6 --pressoes 5 --relatorio
+"""
+import argparse
+import json
+import os
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from artefatos import DIRETORIO_PADRAO, carregar_artefatos
+from geo import distancia_locais
+from preprocessamento import COORDENADAS, TIPO_SERVICO
+from rotas import ARQUIVO_MATRIZ, carregar_matriz
+
+DIRETORIO_GRADE = 'grade_precos'
+ARQUIVO_PRECOS = 'precos.npy'  # nome das grades gravadas antes de o arquivo ser versionado
+ARQUIVO_GRADE = 'grade.json'
+MANTER_GRADES = 2
+ARQUIVO_RELATORIO = 'relatorio.json'
+
+EIXOS_CATEGORICOS = ('source', 'destination', 'name', 'short_summary', 'long_summary')
+EIXOS_NUMERICOS = ('surge_multiplier', 'temperature', 'pressure')
+# Slider do app: 1.0 a 3.0 em passos de 0.1 (nós exatos, sem interpolação)
+MULTIPLICADORES = np.round(np.arange(1.0, 3.0 + 1e-9, 0.1), 1).tolist()
+
+# Deslocamento entre a temperatura do formulário e as features do modelo
+# (ver PreProcessador.montar_features)
+DERIVADAS_TEMPERATURA = {'apparentTemperatureLow': -10.0, 'temperatureHigh': 5.0}
+
+
+class GradePrecos:
+    """
+    Preços pré-calculados com consulta por índice e interpolação linear.
+    """
+
+    def __init__(self, precos, eixos, distancias, versao=None):
+        """
+        Args:
+            precos: Array com um eixo por campo, na ordem
+                EIXOS_CATEGORICOS + EIXOS_NUMERICOS
+            eixos: Dicionário campo -> valores (categorias ou nós numéricos)
+            distancias: Matriz (origem x destino) de distâncias usadas na grade
+            versao: Versão do pacote de artefatos avaliado
+        """
+        self.precos = precos
+        # Visão ndarray simples do memmap: indexar np.memmap tem custo extra por chamada
+        self._precos = np.asarray(precos)
+        self.eixos = {nome: list(eixos[nome]) for nome in EIXOS_CATEGORICOS + EIXOS_NUMERICOS}
+        self.distancias = np.asarray(distancias, dtype=np.float64)
+        self.versao = versao
+        self._posicoes = {nome: {v: i for i, v in enumerate(self.eixos[nome])} for nome in EIXOS_CATEGORICOS}
+
+    @property
+    def shape(self):
+        return self.precos.shape
+
+    def distancia(self, source, destination):
+        """Distância (milhas) usada na grade para o par de locais."""
+        posicao = self._posicoes
+        return float(self.distancias[posicao['source'][source], posicao['destination'][destination]])
+
+    def cobre(self, source, destination, name, short_summary, long_summary):
+        """Se a combinação de categorias está na grade."""
+        valores = (source, destination, name, short_summary, long_summary)
+        return all(v in self._posicoes[nome] for nome, v in zip(EIXOS_CATEGORICOS, valores))
+
+    @staticmethod
+    def _segmento(nos, x):
+        """Índice do nó à esquerda e peso do nó à direita (x truncado à faixa)."""
+        if len(nos) == 1:
+            return 0, 0.0
+        x = min(max(x, nos[0]), nos[-1])
+        i = min(bisect_right(nos, x) - 1, len(nos) - 2)
+        return i, (x - nos[i]) / (nos[i + 1] - nos[i])
+
+    def cotar(self, source, destination, name, short_summary, long_summary,
+              surge_multiplier, temperature, pressure):
+        """
+        Preço de uma corrida a partir da grade.
+
+        Raises:
+            KeyError: Alguma categoria não está na grade
+
+        Returns:
+            float
+        """
+        posicao = self._posicoes
+        (i, wi), (j, wj), (k, wk) = [
+            self._segmento(self.eixos[nome], float(x))
+            for nome, x in zip(EIXOS_NUMERICOS, (surge_multiplier, temperature, pressure))
+        ]
+        # Só os 2x2x2 nós vizinhos (multiplicador, temperatura, pressão) são
+        # lidos; a interpolação trilinear pula os nós com peso zero
+        cubo = self._precos[posicao['source'][source], posicao['destination'][destination],
+                            posicao['name'][name], posicao['short_summary'][short_summary],
+                            posicao['long_summary'][long_summary],
+                            i:i + 2, j:j + 2, k:k + 2].tolist()
+        preco = 0.0
+        for a, pa in ((0, 1.0 - wi), (1, wi)):
+            if not pa:
+                continue
+            for b, pb in ((0, 1.0 - wj), (1, wj)):
+                if not pb:
+                    continue
+                for c, pc in ((0, 1.0 - wk), (1, wk)):
+                    if pc:
+                        preco += pa * pb * pc * cubo[a][b][c]
+        return preco
+
+    def salvar(self, diretorio=DIRETORIO_GRADE):
+        os.makedirs(diretorio, exist_ok=True)
+        arquivo = _nome_precos()
+        np.save(os.path.join(diretorio, arquivo), np.ascontiguousarray(self.precos, dtype=np.float32))
+        self._salvar_meta(diretorio, arquivo)
+
+    def _salvar_meta(self, diretorio, arquivo):
+        """Troca o grade.json de forma atômica para apontar para `arquivo` e apaga grades antigas."""
+        meta = {
+            'versao': self.versao,
+            'arquivo': arquivo,
+            'eixos': self.eixos,
+            'distancias': self.distancias.tolist(),
+            'shape': list(self.precos.shape),
+            'criado_em': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        temporario = os.path.join(diretorio, ARQUIVO_GRADE + '.tmp')
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, os.path.join(diretorio, ARQUIVO_GRADE))
+        _podar(diretorio, arquivo)
+
+
+def _nome_precos():
+    """Nome único do arquivo de preços de uma reconstrução."""
+    return f"precos-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 1_000_000_000:09d}.npy"
+
+
+def _podar(diretorio, atual, manter=MANTER_GRADES):
+    """
+    Apaga arquivos de preços antigos, mantendo os `manter` mais recentes.
+
+    Apagar um arquivo mapeado não o invalida (as páginas continuam com quem
+    já o abriu); a anterior fica para quem leu o grade.json pouco antes da troca.
+    """
+    arquivos = sorted((nome for nome in os.listdir(diretorio)
+                       if nome.startswith('precos') and nome.endswith('.npy') and nome != atual),
+                      key=lambda nome: os.path.getmtime(os.path.join(diretorio, nome)), reverse=True)
+    for nome in arquivos[max(manter - 1, 0):]:
+        os.remove(os.path.join(diretorio, nome))
+
+
+def carregar_grade(diretorio=DIRETORIO_GRADE, mmap=True):
+    """GradePrecos salva, ou None se a grade ainda não tiver sido gerada."""
+    caminho = os.path.join(diretorio, ARQUIVO_GRADE)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        meta = json.load(f)
+    precos = np.load(os.path.join(diretorio, meta.get('arquivo', ARQUIVO_PRECOS)), mmap_mode='r' if mmap else None)
+    if list(precos.shape) != meta['shape']:
+        raise ValueError(f"Grade em '{diretorio}' não corresponde ao seu grade.json")
+    return GradePrecos(precos, meta['eixos'], meta['distancias'], meta['versao'])
+
+
+def _faixa_limiares(floresta, preprocessador, features):
+    """
+    Faixa (na unidade do formulário) dos limiares usados nas features dadas.
+
+    Args:
+        features: Dicionário feature do modelo -> deslocamento em relação ao
+            campo do formulário (feature = campo + deslocamento)
+
+    Returns:
+        Tupla (mínimo, máximo) ou None se as árvores não usam essas features
+    """
+    internos = floresta.esquerda != np.arange(floresta.n_nos)
+    faixas = []
+    for feature, deslocamento in features.items():
+        j = preprocessador.features.index(feature)
+        limiares = np.asarray(floresta.limiar)[internos & (np.asarray(floresta.feature) == j)]
+        if limiares.size:
+            brutos = limiares * preprocessador.escala[j] + preprocessador.media[j] - deslocamento
+            faixas.append((brutos.min(), brutos.max()))
+    if not faixas:
+        return None
+    return float(min(f[0] for f in faixas)), float(max(f[1] for f in faixas))
+
+
+def nos_numericos(floresta, preprocessador, n_temperaturas, n_pressoes):
+    """
+    Nós de interpolação de temperatura e pressão.
+
+    Abaixo do menor e acima do maior limiar a floresta não muda, então os nós
+    são distribuídos apenas nessa faixa (arredondados a décimos, com uma
+    folga para incluir os próprios limiares).
+    """
+    nos = {'surge_multiplier': MULTIPLICADORES}
+    for campo, features, n in [('temperature', DERIVADAS_TEMPERATURA, n_temperaturas),
+                               ('pressure', {'pressure': 0.0}, n_pressoes)]:
+        faixa = _faixa_limiares(floresta, preprocessador, features)
+        if faixa is None or n < 2:
+            meio = 0.0 if faixa is None else sum(faixa) / 2
+            nos[campo] = [round(meio, 1)]
+        else:
+            nos[campo] = np.round(np.linspace(np.floor(faixa[0]), np.ceil(faixa[1]), n), 1).tolist()
+    return nos
+
+
+def _distancias(locais, caminho_matriz, fator_rodovia):
+    """Distâncias da matriz de rotas; sem matriz, estimadas com geo.py."""
+    matriz = carregar_matriz(caminho_matriz)
+    if matriz is not None and all((o, d) in matriz for o in locais for d in locais):
+        return [[matriz.consultar(o, d)[1] for d in locais] for o in locais]
+    origens, destinos = np.repeat(locais, len(locais)), np.tile(locais, len(locais))
+    return distancia_locais(origens, destinos, fator_rodovia).reshape(len(locais), len(locais)).tolist()
+
+
+# Pacote de artefatos aberto uma vez por processo do pool
+_worker = {}
+
+
+def _iniciar_worker(diretorio_artefatos, caminho_precos, eixos, distancias):
+    _worker['precificador'] = carregar_artefatos(diretorio_artefatos).precificador()
+    _worker['precos'] = np.load(caminho_precos, mmap_mode='r+')
+    _worker['eixos'] = eixos
+    _worker['distancias'] = distancias
+
+
+def _avaliar_par(i, j):
+    """Preenche a fatia (origem i, destino j) da grade."""
+    eixos = _worker['eixos']
+    restantes = EIXOS_CATEGORICOS[2:] + EIXOS_NUMERICOS
+    indices = np.indices([len(eixos[nome]) for nome in restantes]).reshape(len(restantes), -1)
+    colunas = {nome: np.asarray(eixos[nome], dtype=object if nome in EIXOS_CATEGORICOS else np.float64)[idx]
+               for nome, idx in zip(restantes, indices)}
+    n = indices.shape[1]
+    colunas['source'] = np.full(n, eixos['source'][i], dtype=object)
+    colunas['destination'] = np.full(n, eixos['destination'][j], dtype=object)
+    colunas['distance'] = np.full(n, _worker['distancias'][i][j])
+    colunas['cab_type'] = np.array([TIPO_SERVICO[nome] for nome in eixos['name']], dtype=object)[indices[0]]
+
+    precos = _worker['precos']
+    precos[i, j] = _worker['precificador'].predict_batch(colunas).reshape(precos.shape[2:])
+    precos.flush()
+    return i, j
+
+
+def construir_grade(diretorio_artefatos=DIRETORIO_PADRAO, saida=DIRETORIO_GRADE, n_temperaturas=6,
+                    n_pressoes=5, caminho_matriz=ARQUIVO_MATRIZ, processos=None):
+    """
+    Avalia o modelo sobre a grade inteira e grava o array com mmap.
+
+    Cada par (origem, destino) é uma tarefa do pool; os processos abrem o
+    mesmo pacote de artefatos (mmap) e escrevem direto em um arquivo de
+    preços novo, que só passa a valer quando o grade.json é trocado.
+
+    Args:
+        diretorio_artefatos: Pacote exportado por artefatos.py
+        saida: Diretório da grade
+        n_temperaturas: Número de nós de temperatura
+        n_pressoes: Número de nós de pressão
+        caminho_matriz: Matriz de rotas com as distâncias entre os locais
+        processos: Tamanho do pool (padrão: número de CPUs)
+
+    Returns:
+        GradePrecos aberta a partir do disco
+    """
+    artefatos = carregar_artefatos(diretorio_artefatos)
+    preprocessador = artefatos.preprocessador
+    categorias = preprocessador.categorias
+
+    locais = [local for local in COORDENADAS if local in set(categorias['source']) & set(categorias['destination'])]
+    eixos = {
+        'source': locais,
+        'destination': locais,
+        'name': [nome for nome in categorias['name'].tolist() if nome in TIPO_SERVICO],
+        'short_summary': categorias['short_summary'].tolist(),
+        'long_summary': categorias['long_summary'].tolist(),
+        **nos_numericos(artefatos.floresta, preprocessador, n_temperaturas, n_pressoes),
+    }
+    distancias = _distancias(locais, caminho_matriz, artefatos.fator_rodovia)
+
+    os.makedirs(saida, exist_ok=True)
+    arquivo = _nome_precos()
+    caminho_precos = os.path.join(saida, arquivo)
+    shape = tuple(len(eixos[nome]) for nome in EIXOS_CATEGORICOS + EIXOS_NUMERICOS)
+    np.lib.format.open_memmap(caminho_precos, mode='w+', dtype=np.float32, shape=shape).flush()
+
+    pares = [(i, j) for i in range(len(locais)) for j in range(len(locais))]
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_worker,
+                             initargs=(diretorio_artefatos, caminho_precos, eixos, distancias)) as pool:
+        for futuro in [pool.submit(_avaliar_par, i, j) for i, j in pares]:
+            futuro.result()
+
+    # grade.json trocado por último: só aponta para grades completas, e a
+    # grade anterior continua intacta para quem a tem aberta
+    grade = GradePrecos(np.load(caminho_precos, mmap_mode='r'), eixos, distancias, artefatos.versao)
+    grade._salvar_meta(saida, arquivo)
+    return carregar_grade(saida)
+
+
+def relatorio_erro(grade, precificador, n=2000, seed=0):
+    """
+    Compara a grade com o modelo em corridas sorteadas no domínio do formulário.
+
+    Multiplicador, temperatura e pressão são sorteados nos passos do app
+    (0.1, 1 °F e 1 hPa), de modo que a interpolação é exercitada entre os nós.
+
+    Returns:
+        Dicionário com erros absolutos (USD) e tempos por cotação (µs)
+    """
+    rng = np.random.default_rng(seed)
+    corridas = {nome: rng.choice(np.asarray(grade.eixos[nome], dtype=object), n) for nome in EIXOS_CATEGORICOS}
+    corridas['surge_multiplier'] = rng.choice(MULTIPLICADORES, n)
+    corridas['temperature'] = rng.integers(0, 101, n).astype(np.float64)
+    corridas['pressure'] = rng.integers(900, 1101, n).astype(np.float64)
+    corridas['cab_type'] = np.array([TIPO_SERVICO[nome] for nome in corridas['name']], dtype=object)
+    corridas['distance'] = np.array([grade.distancia(o, d)
+                                     for o, d in zip(corridas['source'], corridas['destination'])])
+
+    campos = EIXOS_CATEGORICOS + EIXOS_NUMERICOS
+    linhas = list(zip(*(corridas[nome].tolist() for nome in campos)))
+    inicio = time.perf_counter()
+    da_grade = np.array([grade.cotar(*linha) for linha in linhas])
+    t_grade = (time.perf_counter() - inicio) / n
+
+    ao_vivo = precificador.predict_batch(corridas)
+    amostra = min(n, 200)
+    inicio = time.perf_counter()
+    for k in range(amostra):
+        precificador.predict_batch({nome: valores[k:k + 1] for nome, valores in corridas.items()})
+    t_modelo = (time.perf_counter() - inicio) / amostra
+
+    erro = np.abs(da_grade - ao_vivo)
+    return {
+        'corridas': n,
+        'mae': float(erro.mean()),
+        'p50': float(np.percentile(erro, 50)),
+        'p99': float(np.percentile(erro, 99)),
+        'maximo': float(erro.max()),
+        'ate_50_centavos': float((erro <= 0.5).mean()),
+        'us_por_cotacao_grade': t_grade * 1e6,
+        'us_por_cotacao_modelo': t_modelo * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pré-calcula a grade de preços do formulário')
+    parser.add_argument('--artefatos', default=DIRETORIO_PADRAO)
+    parser.add_argument('--saida', default=DIRETORIO_GRADE)
+    parser.add_argument('--matriz', default=ARQUIVO_MATRIZ)
+    parser.add_argument('--temperaturas', type=int, default=6)
+    parser.add_argument('--pressoes', type=int, default=5)
+    parser.add_argument('--processos', type=int, default=None)
+    parser.add_argument('--relatorio', action='store_true', help='compara a grade com o modelo')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    grade = construir_grade(args.artefatos, args.saida, args.temperaturas, args.pressoes,
+                            args.matriz, args.processos)
+    print(f"Grade {' x '.join(map(str, grade.shape))} ({grade.precos.nbytes / 1e6:.1f} MB) "
+          f"gravada em '{args.saida}' em {time.perf_counter() - inicio:.1f}s")
+
+    if args.relatorio:
+        relatorio = relatorio_erro(grade, carregar_artefatos(args.artefatos).precificador())
+        with open(os.path.join(args.saida, ARQUIVO_RELATORIO), 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, indent=2)
+        print(f"Erro vs modelo: MAE ${relatorio['mae']:.3f} | p99 ${relatorio['p99']:.3f} | "
+              f"máx ${relatorio['maximo']:.3f} | {relatorio['ate_50_centavos']:.1%} até $0.50")
+        print(f"Cotação: grade {relatorio['us_por_cotacao_grade']:.1f} µs | "
+              f"modelo {relatorio['us_por_cotacao_modelo']:.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Ingestão do rideshare_kaggle.csv em um cache colunar.
+
+O CSV (57 colunas, ~690 mil linhas) é lido em blocos, apenas com as 13 colunas
+do modelo e com tipos compactos: float32 para as numéricas e códigos inteiros
+para as categóricas. Cada coluna vira um arquivo .npy que pode ser aberto com
+mmap; os vocabulários das categóricas ficam em meta.json.
+
+Uso:
+    python ingestao.py rideshare_kaggle.csv --cache cache
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from preprocessamento import CATEGORICAS, FEATURES_MODELO
+
+DIRETORIO_CACHE = 'cache'
+META = 'meta.json'
+ALVO = 'price'
+NUMERICAS = [f for f in FEATURES_MODELO if f not in CATEGORICAS] + [ALVO]
+COLUNAS = FEATURES_MODELO + [ALVO]
+TAMANHO_CHUNK = 100_000
+
+
+def _origem(caminho_csv):
+    """Identifica a versão do CSV pelo tamanho e data de modificação."""
+    info = os.stat(caminho_csv)
+    return {'arquivo': os.path.abspath(caminho_csv), 'bytes': info.st_size, 'mtime': int(info.st_mtime)}
+
+
+def ingerir_csv(caminho_csv, diretorio_cache=DIRETORIO_CACHE, tamanho_chunk=TAMANHO_CHUNK):
+    """
+    Lê o CSV em blocos e grava o cache colunar.
+
+    Linhas sem preço ou sem alguma categoria são descartadas, como no notebook.
+
+    Args:
+        caminho_csv: Caminho do rideshare_kaggle.csv
+        diretorio_cache: Diretório de saída
+        tamanho_chunk: Linhas lidas por bloco
+
+    Returns:
+        Dicionário com o conteúdo de meta.json
+    """
+    os.makedirs(diretorio_cache, exist_ok=True)
+    tipos = {**{col: 'float32' for col in NUMERICAS}, **{col: 'category' for col in CATEGORICAS}}
+
+    partes = {col: [] for col in COLUNAS}
+    vocabularios = {col: {} for col in CATEGORICAS}
+    lidas = 0
+
+    for bloco in pd.read_csv(caminho_csv, usecols=COLUNAS, dtype=tipos, chunksize=tamanho_chunk):
+        lidas += len(bloco)
+        bloco = bloco.dropna(subset=CATEGORICAS + [ALVO])
+
+        for col in NUMERICAS:
+            partes[col].append(bloco[col].to_numpy(dtype=np.float32))
+
+        # Cada bloco traz seu próprio conjunto de categorias; os códigos locais
+        # são traduzidos para um vocabulário global que só cresce
+        for col in CATEGORICAS:
+            vocabulario = vocabularios[col]
+            locais = bloco[col].cat.categories
+            traducao = np.array([vocabulario.setdefault(c, len(vocabulario)) for c in locais], dtype=np.int16)
+            partes[col].append(traducao[bloco[col].cat.codes.to_numpy()])
+
+    n_linhas = 0
+    for col in COLUNAS:
+        array = np.concatenate(partes[col]) if partes[col] else np.empty(0, dtype=np.float32)
+        partes[col] = None
+        n_linhas = len(array)
+        np.save(os.path.join(diretorio_cache, f'{col}.npy'), array)
+
+    meta = {
+        'origem': _origem(caminho_csv),
+        'linhas_lidas': lidas,
+        'linhas': n_linhas,
+        'colunas': COLUNAS,
+        'categorias': {col: list(vocabularios[col]) for col in CATEGORICAS},
+    }
+    with open(os.path.join(diretorio_cache, META), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def ler_meta(diretorio_cache=DIRETORIO_CACHE):
+    with open(os.path.join(diretorio_cache, META), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def carregar_colunas(diretorio_cache=DIRETORIO_CACHE, mmap=True):
+    """
+    Abre as colunas do cache sem convertê-las para DataFrame.
+
+    Returns:
+        Tupla (dicionário coluna -> np.ndarray, meta). Categóricas vêm como
+        códigos inteiros; o vocabulário está em meta['categorias'].
+    """
+    meta = ler_meta(diretorio_cache)
+    colunas = {
+        col: np.load(os.path.join(diretorio_cache, f'{col}.npy'), mmap_mode='r' if mmap else None)
+        for col in meta['colunas']
+    }
+    return colunas, meta
+
+
+def carregar_cache(diretorio_cache=DIRETORIO_CACHE, colunas=None):
+    """
+    Carrega o cache como DataFrame (categóricas com dtype 'category').
+
+    Args:
+        diretorio_cache: Diretório gravado por ingerir_csv
+        colunas: Subconjunto de colunas (padrão: todas)
+
+    Returns:
+        DataFrame com as colunas do modelo e o preço
+    """
+    arrays, meta = carregar_colunas(diretorio_cache)
+    dados = {}
+    for col in colunas or meta['colunas']:
+        if col in meta['categorias']:
+            dados[col] = pd.Categorical.from_codes(arrays[col], categories=meta['categorias'][col])
+        else:
+            dados[col] = np.asarray(arrays[col])
+    return pd.DataFrame(dados)
+
+
+def garantir_cache(caminho_csv, diretorio_cache=DIRETORIO_CACHE):
+    """
+    Refaz a ingestão se o cache não existe ou foi gerado de outro CSV.
+
+    Returns:
+        Dicionário com o conteúdo de meta.json
+    """
+    try:
+        meta = ler_meta(diretorio_cache)
+        if meta['origem'] == _origem(caminho_csv):
+            return meta
+    except (OSError, KeyError, ValueError):
+        pass
+    return ingerir_csv(caminho_csv, diretorio_cache)
+
+
+def carregar_dados(caminho_csv, diretorio_cache=DIRETORIO_CACHE):
+    """
+    Dados de treino a partir do cache, refazendo a ingestão se o CSV mudou.
+
+    Returns:
+        DataFrame com as colunas do modelo e o preço
+    """
+    garantir_cache(caminho_csv, diretorio_cache)
+    return carregar_cache(diretorio_cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingestão do CSV para o cache colunar')
+    parser.add_argument('csv', help='caminho do rideshare_kaggle.csv')
+    parser.add_argument('--cache', default=DIRETORIO_CACHE)
+    parser.add_argument('--chunk', type=int, default=TAMANHO_CHUNK)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    meta = ingerir_csv(args.csv, args.cache, args.chunk)
+    print(f"{meta['linhas']:,} de {meta['linhas_lidas']:,} linhas gravadas em '{args.cache}' "
+          f"({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
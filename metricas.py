@@ -0,0 +1,259 @@
+"""
+Métricas de latência e contadores das etapas de uma cotação.
+
+Cada etapa (carga do modelo, rota, pré-processamento, modelo, mapa...) é
+medida com `with metricas.etapa('nome'):` e vai para um histograma de
+buckets fixos; eventos (acertos de cache, falhas do ORS, fallbacks) são
+contadores. Tudo pode ser exportado no formato texto do Prometheus (por
+HTTP, em GET /metricas do serviço ou em arquivo para o textfile collector
+do node_exporter) ou como JSON.
+
+Com um limiar de perfil (env PRECO_PERFIL_MS), cada requisição roda sob o
+cProfile e as que passam do limiar gravam um arquivo .prof (pstats; abre com
+snakeviz, `python -m pstats` ou ferramentas que leem o formato do cProfile).
+"""
+import cProfile
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites superiores dos buckets dos histogramas de duração (ms)
+LIMITES_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+DIRETORIO_PERFIS = 'perfis'
+
+
+def medir(metricas, nome):
+    """`metricas.etapa(nome)`, ou um contexto vazio se não houver métricas."""
+    return nullcontext() if metricas is None else metricas.etapa(nome)
+
+
+def perfilar(metricas, nome):
+    """`metricas.requisicao(nome)`, ou um contexto vazio se não houver métricas."""
+    return nullcontext() if metricas is None else metricas.requisicao(nome)
+
+
+class Histograma:
+    """Contagens por bucket (não cumulativas), soma e total de observações."""
+
+    def __init__(self, limites=LIMITES_MS):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1)
+        self.soma = 0.0
+        self.contagem = 0
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.contagem += 1
+        self.maximo = max(self.maximo, valor)
+
+    def quantil(self, q):
+        """Quantil estimado por interpolação linear dentro do bucket (limitado ao máximo observado)."""
+        if not self.contagem:
+            return None
+        alvo = q * self.contagem
+        acumulado = 0
+        for i, n in enumerate(self.contagens):
+            if n and acumulado + n >= alvo:
+                inferior = self.limites[i - 1] if i > 0 else 0.0
+                superior = self.limites[i] if i < len(self.limites) else self.limites[-1]
+                return min(inferior + (superior - inferior) * (alvo - acumulado) / n, self.maximo)
+            acumulado += n
+        return self.maximo
+
+
+class Metricas:
+    """
+    Registro de histogramas por etapa, contadores de eventos e informações.
+    """
+
+    def __init__(self, prefixo='preco', limites=LIMITES_MS, limiar_perfil_ms=None,
+                 diretorio_perfis=DIRETORIO_PERFIS):
+        """
+        Args:
+            prefixo: Prefixo dos nomes das métricas no Prometheus
+            limites: Limites dos buckets de duração (ms)
+            limiar_perfil_ms: Requisições mais lentas que isso gravam um perfil
+                do cProfile (padrão: env PRECO_PERFIL_MS; None desativa)
+            diretorio_perfis: Onde os arquivos .prof são gravados
+        """
+        if limiar_perfil_ms is None and os.getenv('PRECO_PERFIL_MS'):
+            limiar_perfil_ms = float(os.getenv('PRECO_PERFIL_MS'))
+        self.prefixo = prefixo
+        self.limites = tuple(limites)
+        self.limiar_perfil_ms = limiar_perfil_ms
+        self.diretorio_perfis = diretorio_perfis
+
+        self.etapas = {}
+        self.eventos = {}
+        self.info = {}
+        self.coletores = {}
+        self._trava = threading.Lock()
+
+    def observar(self, etapa, ms):
+        with self._trava:
+            histograma = self.etapas.get(etapa)
+            if histograma is None:
+                histograma = self.etapas[etapa] = Histograma(self.limites)
+            histograma.observar(ms)
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede a duração do bloco no histograma da etapa."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, (time.perf_counter() - inicio) * 1000)
+
+    def contar(self, evento, valor=1):
+        with self._trava:
+            self.eventos[evento] = self.eventos.get(evento, 0) + valor
+
+    def definir_info(self, nome, **rotulos):
+        """Informação estática (ex.: versão do modelo), exportada como gauge 1."""
+        with self._trava:
+            self.info[nome] = {chave: str(valor) for chave, valor in rotulos.items()}
+
+    def registrar_coletor(self, nome, funcao):
+        """
+        Função chamada a cada exportação que devolve um dicionário de números
+        (ex.: CachePrevisoes.estatisticas); cada campo vira um gauge.
+        """
+        self.coletores[nome] = funcao
+
+    @contextmanager
+    def requisicao(self, nome='cotacao'):
+        """
+        Mede uma requisição inteira e, com o perfil ativo, grava o perfil
+        do cProfile das que passarem do limiar.
+        """
+        perfil = cProfile.Profile() if self.limiar_perfil_ms is not None else None
+        inicio = time.perf_counter()
+        if perfil is not None:
+            try:
+                perfil.enable()
+            except ValueError:
+                # Python 3.12+: só um profiler ativo por vez no processo
+                perfil = None
+        try:
+            yield
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            ms = (time.perf_counter() - inicio) * 1000
+            self.observar(nome, ms)
+            if perfil is not None and ms >= self.limiar_perfil_ms:
+                self._gravar_perfil(perfil, nome, ms)
+
+    def _gravar_perfil(self, perfil, nome, ms):
+        os.makedirs(self.diretorio_perfis, exist_ok=True)
+        carimbo = time.strftime('%Y%m%d-%H%M%S')
+        caminho = os.path.join(self.diretorio_perfis, f'{nome}-{carimbo}-{ms:.0f}ms-{threading.get_ident()}.prof')
+        perfil.dump_stats(caminho)
+        self.contar('perfis_gravados')
+
+    def _coletar(self):
+        valores = {}
+        for nome, funcao in list(self.coletores.items()):
+            try:
+                dados = funcao()
+            except Exception:
+                continue
+            valores[nome] = {campo: valor for campo, valor in dados.items()
+                             if isinstance(valor, (int, float)) and not isinstance(valor, bool)}
+        return valores
+
+    def para_dict(self):
+        """Resumo em JSON: percentis estimados por etapa, eventos, info e coletores."""
+        with self._trava:
+            etapas = {
+                nome: {
+                    'contagem': h.contagem,
+                    'soma_ms': h.soma,
+                    'media_ms': h.soma / h.contagem if h.contagem else None,
+                    'p50_ms': h.quantil(0.5),
+                    'p90_ms': h.quantil(0.9),
+                    'p99_ms': h.quantil(0.99),
+                    'max_ms': h.maximo,
+                }
+                for nome, h in self.etapas.items()
+            }
+            eventos = dict(self.eventos)
+            info = {nome: dict(rotulos) for nome, rotulos in self.info.items()}
+        return {'etapas': etapas, 'eventos': eventos, 'info': info, 'coletores': self._coletar()}
+
+    def para_json(self):
+        return json.dumps(self.para_dict(), ensure_ascii=False, indent=2)
+
+    def para_prometheus(self):
+        """Métricas no formato texto de exposição do Prometheus."""
+        p = self.prefixo
+        linhas = []
+        with self._trava:
+            linhas += [f'# HELP {p}_etapa_ms Duração das etapas de uma cotação (ms)',
+                       f'# TYPE {p}_etapa_ms histogram']
+            for nome, h in sorted(self.etapas.items()):
+                acumulado = 0
+                for limite, n in zip(self.limites + ('+Inf',), h.contagens):
+                    acumulado += n
+                    linhas.append(f'{p}_etapa_ms_bucket{{etapa="{nome}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{p}_etapa_ms_sum{{etapa="{nome}"}} {h.soma}')
+                linhas.append(f'{p}_etapa_ms_count{{etapa="{nome}"}} {h.contagem}')
+
+            linhas += [f'# HELP {p}_eventos_total Eventos (acertos de cache, falhas, fallbacks)',
+                       f'# TYPE {p}_eventos_total counter']
+            linhas += [f'{p}_eventos_total{{evento="{nome}"}} {valor}' for nome, valor in sorted(self.eventos.items())]
+
+            for nome, rotulos in sorted(self.info.items()):
+                texto = ','.join(f'{chave}="{valor}"' for chave, valor in sorted(rotulos.items()))
+                linhas += [f'# TYPE {p}_{nome}_info gauge', f'{p}_{nome}_info{{{texto}}} 1']
+
+        for nome, campos in sorted(self._coletar().items()):
+            for campo, valor in sorted(campos.items()):
+                linhas += [f'# TYPE {p}_{nome}_{campo} gauge', f'{p}_{nome}_{campo} {valor}']
+        return '\n'.join(linhas) + '\n'
+
+    def exportar_arquivo(self, caminho):
+        """Grava o texto do Prometheus de forma atômica (textfile collector)."""
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(self.para_prometheus())
+        os.replace(temporario, caminho)
+
+    def servir_http(self, porta, host='0.0.0.0'):
+        """
+        Expõe GET /metricas (Prometheus) e /metricas.json em uma thread daemon.
+
+        Returns:
+            O ThreadingHTTPServer (use .shutdown() para parar)
+        """
+        metricas = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metricas':
+                    corpo, tipo = metricas.para_prometheus(), 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path == '/metricas.json':
+                    corpo, tipo = metricas.para_json(), 'application/json; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+                corpo = corpo.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        servidor = ThreadingHTTPServer((host, porta), Manipulador)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        return servidor
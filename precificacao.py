@@ -0,0 +1,174 @@
+import pickle
+from functools import cached_property
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from floresta import FlorestaPlana, exportar_floresta
+from metricas import medir
+from preprocessamento import CAMPO_FEATURE, CATEGORICAS, COORDENADAS, FEATURES_MODELO, PreProcessador  # noqa: F401
+
+# Faixa de preço cotada ao cliente (P10, P50, P90)
+QUANTIS = (0.1, 0.5, 0.9)
+
+
+class Precificador:
+    """
+    Aplica o pré-processamento e o modelo a lotes de corridas.
+
+    Todo o processamento é feito sobre colunas inteiras, sem laços Python por
+    linha, de forma que prever uma corrida ou cem mil custa as mesmas chamadas.
+    """
+
+    def __init__(self, modelo, preprocessador, metricas=None, destilado=False):
+        """
+        Args:
+            modelo: Regressor já treinado (RandomForestRegressor ou FlorestaPlana)
+            preprocessador: PreProcessador ajustado nos dados de treino
+            metricas: Metricas opcional; mede as etapas encoding, escalonamento e
+                modelo (arvores, quantis e explicar nas demais consultas)
+            destilado: Se True, o modelo é um boosting destilado: as árvores
+                isoladas não são preços e os quantis são recusados
+        """
+        self.modelo = modelo
+        self.preprocessador = preprocessador
+        self.metricas = metricas
+        self.destilado = destilado
+
+    def transformar(self, dados):
+        """Encoding + padronização, medidos em etapas separadas."""
+        with medir(self.metricas, 'encoding'):
+            X = self.preprocessador.montar_features(dados)
+        with medir(self.metricas, 'escalonamento'):
+            return self.preprocessador.escalonar(X)
+
+    def predict_batch(self, dados):
+        """
+        Prevê o preço de um lote de corridas em uma única chamada ao modelo.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+
+        Returns:
+            np.ndarray com o preço previsto de cada corrida
+        """
+        X = self.transformar(dados)
+        with medir(self.metricas, 'modelo'):
+            return np.asarray(self.modelo.predict(X), dtype=np.float64)
+
+    @cached_property
+    def floresta(self):
+        """O modelo como FlorestaPlana (um RandomForestRegressor é achatado uma vez)."""
+        return self.modelo if isinstance(self.modelo, FlorestaPlana) else exportar_floresta(self.modelo)
+
+    def predict_por_arvore(self, dados):
+        """
+        Previsão de cada árvore para um lote de corridas, em uma única passada.
+
+        A média das colunas é a previsão do modelo; a dispersão entre as
+        árvores indica a incerteza da floresta para cada corrida.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+
+        Returns:
+            np.ndarray de shape (n_corridas, n_arvores)
+        """
+        X = self.transformar(dados)
+        with medir(self.metricas, 'arvores'):
+            return self.floresta.prever_por_arvore(X)
+
+    def predict_quantis(self, dados, quantis=QUANTIS):
+        """
+        Quantis do preço a partir da dispersão entre as árvores da floresta.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+            quantis: Quantis desejados, entre 0 e 1 (padrão: P10, P50, P90)
+
+        Returns:
+            np.ndarray de shape (n_corridas, len(quantis))
+        """
+        self._exigir_floresta()
+        X = self.transformar(dados)
+        with medir(self.metricas, 'quantis'):
+            return self.floresta.quantis(X, quantis)
+
+    def predict_com_quantis(self, dados, quantis=QUANTIS):
+        """
+        Preço e quantis em uma única passada pelas árvores.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+            quantis: Quantis desejados, entre 0 e 1 (padrão: P10, P50, P90)
+
+        Returns:
+            Tupla (np.ndarray com o preço de cada corrida, igual ao de
+            predict_batch, np.ndarray de shape (n_corridas, len(quantis)))
+        """
+        self._exigir_floresta()
+        X = self.transformar(dados)
+        with medir(self.metricas, 'quantis'):
+            return self.floresta.prever_com_quantis(X, quantis)
+
+    def _exigir_floresta(self):
+        if self.destilado:
+            raise ValueError("Modelo destilado: as árvores do boosting não são preços, "
+                             "então não há quantis entre elas")
+
+    def explicar(self, dados, por_campo=False):
+        """
+        Decompõe cada preço em viés + contribuição de cada feature.
+
+        As contribuições saem dos caminhos de decisão das árvores
+        (FlorestaPlana.contribuicoes) e somam, com o viés, o preço previsto.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+            por_campo: Se True, features derivadas são somadas no campo de
+                origem (latitude em source; temperaturas em temperature)
+
+        Returns:
+            Tupla (viés, DataFrame com uma coluna por feature ou campo)
+        """
+        X = self.transformar(dados)
+        with medir(self.metricas, 'explicar'):
+            vies, contribuicoes = self.floresta.contribuicoes(X)
+        return vies, self._tabela(contribuicoes, por_campo)
+
+    def explicar_por_arvore(self, dados, por_campo=False):
+        """
+        Explicação (como em `explicar`) e previsão de cada árvore (como em
+        `predict_por_arvore`) em uma única passada pelas árvores.
+
+        Returns:
+            Tupla (viés, DataFrame de contribuições, np.ndarray de shape
+            (n_corridas, n_arvores))
+        """
+        X = self.transformar(dados)
+        with medir(self.metricas, 'explicar'):
+            vies, contribuicoes, por_arvore = self.floresta.contribuicoes_por_arvore(X)
+        return vies, self._tabela(contribuicoes, por_campo), por_arvore
+
+    def _tabela(self, contribuicoes, por_campo):
+        tabela = pd.DataFrame(contribuicoes, columns=self.preprocessador.features)
+        if por_campo:
+            tabela = tabela.T.groupby(lambda f: CAMPO_FEATURE.get(f, f), sort=False).sum().T
+        return tabela
+
+
+def carregar_precificador(caminho_modelo='joblib/modelo_preco_uber.joblib',
+                          caminho_scaler='joblib/scaler_preco_uber.joblib',
+                          caminho_encoders='pkl/target_encoders.pkl'):
+    """
+    Carrega os artefatos salvos e monta um Precificador.
+
+    Returns:
+        Precificador pronto para uso
+    """
+    modelo = joblib.load(caminho_modelo)
+    scaler = joblib.load(caminho_scaler)
+    with open(caminho_encoders, 'rb') as f:
+        target_encoders = pickle.load(f)
+    return Precificador(modelo, PreProcessador.de_encoders(target_encoders, scaler))
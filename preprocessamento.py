@@ -0,0 +1,339 @@
+"""
+Pré-processamento único do modelo de preços.
+
+Um objeto PreProcessador ajustado concentra tudo o que acontece entre a
+corrida bruta e a matriz que entra no modelo: codificação das categorias em
+inteiros, busca do valor codificado por indexação de array, derivação dos
+campos de temperatura/latitude e padronização. É serializável em JSON e
+substitui os dicionários de target encoders usados separadamente no
+notebook, em target.py e no app.
+"""
+import numpy as np
+import pandas as pd
+
+# Ordem das features usada no treinamento do modelo (ver uber_analise.ipynb)
+FEATURES_MODELO = [
+    'distance', 'surge_multiplier', 'latitude',
+    'apparentTemperatureLow', 'pressure', 'temperatureHigh',
+    'source', 'destination', 'cab_type',
+    'name', 'long_summary', 'short_summary'
+]
+
+# Variáveis categóricas que passam pelo target encoding
+CATEGORICAS = ['source', 'destination', 'cab_type', 'name', 'short_summary', 'long_summary']
+
+# Features derivadas -> campo da corrida de onde vêm (ver PreProcessador.montar_features)
+CAMPO_FEATURE = {'latitude': 'source', 'apparentTemperatureLow': 'temperature', 'temperatureHigh': 'temperature'}
+
+# Temperaturas do modelo derivadas da 'temperature' do app: temperatura + deslocamento (°F)
+DESLOCAMENTO_TEMPERATURA = {'apparentTemperatureLow': -10.0, 'temperatureHigh': 5.0}
+
+# Coordenadas aproximadas dos locais de Boston (lat, lon) oferecidos no app;
+# a latitude que entra no modelo vem do treino (latitudes_por_local)
+COORDENADAS = {
+    "Back Bay": (42.3503, -71.0810),
+    "Beacon Hill": (42.3588, -71.0707),
+    "Boston University": (42.3505, -71.1054),
+    "Fenway": (42.3429, -71.1003),
+    "Financial District": (42.3559, -71.0550),
+    "Northeastern University": (42.3398, -71.0892)
+}
+
+# Serviços de cada tipo de corrida (opções do formulário do app)
+SERVICOS = {
+    'Uber': ['UberXL', 'Black', 'UberX', 'WAV', 'Black SUV', 'UberPool', 'Taxi'],
+    'Lyft': ['Shared', 'Lux', 'Lyft', 'Lux Black XL', 'Lyft XL', 'Lux Black']
+}
+TIPO_SERVICO = {nome: tipo for tipo, nomes in SERVICOS.items() for nome in nomes}
+
+# Políticas para categorias não vistas no treino
+POLITICAS_DESCONHECIDA = ('erro', 'prior')
+
+# Até este tamanho de lote os códigos saem de um dict; acima, de um hash vetorizado
+LOTE_PEQUENO = 16
+
+
+def colunas_entrada(dados):
+    """
+    Normaliza a entrada colunar para um dicionário de arrays NumPy.
+
+    Args:
+        dados: DataFrame ou mapeamento coluna -> sequência/array
+
+    Returns:
+        Tupla (dicionário coluna -> np.ndarray, número de linhas)
+    """
+    if isinstance(dados, pd.DataFrame):
+        colunas = {col: dados[col].to_numpy() for col in dados.columns}
+    else:
+        colunas = {col: np.atleast_1d(np.asarray(valores)) for col, valores in dados.items()}
+
+    tamanhos = {len(valores) for valores in colunas.values()}
+    if len(tamanhos) != 1:
+        raise ValueError(f"Colunas com tamanhos diferentes: {sorted(tamanhos)}")
+    return colunas, tamanhos.pop()
+
+
+def latitudes_por_local(dados):
+    """
+    Latitude mediana de cada origem nos dados de treino.
+
+    Cobre todas as origens vistas no treino, não só os locais de COORDENADAS,
+    de modo que qualquer origem válida tem latitude também na política 'erro'.
+
+    Args:
+        dados: DataFrame ou mapeamento coluna -> array com 'source' e 'latitude'
+
+    Returns:
+        Dicionário local -> latitude
+    """
+    colunas, _ = colunas_entrada(dados)
+    latitude = pd.Series(np.asarray(colunas['latitude'], dtype=np.float64))
+    mediana = latitude.groupby(colunas['source']).median().dropna()
+    return {str(local): float(lat) for local, lat in mediana.items()}
+
+
+def temperatura_informada(dados):
+    """
+    Temperatura da corrida na escala do campo 'temperature' do app.
+
+    Corridas do app trazem 'temperature'; nos dados de treino só há as
+    temperaturas do modelo, e a temperatura equivalente é a média delas
+    menos os deslocamentos que o app aplica (DESLOCAMENTO_TEMPERATURA).
+
+    Args:
+        dados: DataFrame ou mapeamento coluna -> array com as corridas
+
+    Returns:
+        np.ndarray com uma temperatura por corrida
+    """
+    colunas, _ = colunas_entrada(dados)
+    if 'temperature' in colunas:
+        return colunas['temperature'].astype(np.float64)
+    faltando = [c for c in DESLOCAMENTO_TEMPERATURA if c not in colunas]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes: {faltando}")
+    return np.mean([colunas[c].astype(np.float64) - d for c, d in DESLOCAMENTO_TEMPERATURA.items()], axis=0)
+
+
+class PreProcessador:
+    """
+    Transforma corridas brutas na matriz padronizada do modelo.
+
+    Cada coluna categórica tem um vocabulário (`categorias`) e uma tabela de
+    valores alinhada a ele; a codificação é `tabela[codigos]`, com os códigos
+    obtidos por hash sobre o vocabulário inteiro de uma vez.
+    """
+
+    def __init__(self, categorias, tabelas, prior, media, escala, features=None,
+                 latitudes=None, politica_desconhecida='erro'):
+        """
+        Args:
+            categorias: Dicionário coluna -> lista de categorias
+            tabelas: Dicionário coluna -> valores codificados, alinhados às categorias
+            prior: Dicionário coluna -> valor usado para categorias desconhecidas
+                (com a política 'prior')
+            media: Média de cada feature (padronização)
+            escala: Desvio padrão de cada feature (padronização)
+            features: Ordem das features na matriz (padrão: FEATURES_MODELO)
+            latitudes: Dicionário local -> latitude, usado para derivar 'latitude'
+                da origem (padrão: COORDENADAS)
+            politica_desconhecida: 'erro' (ValueError) ou 'prior'
+        """
+        if politica_desconhecida not in POLITICAS_DESCONHECIDA:
+            raise ValueError(f"Política inválida: {politica_desconhecida}")
+
+        self.features = list(FEATURES_MODELO if features is None else features)
+        self.categorias = {col: np.asarray(valores, dtype=object) for col, valores in categorias.items()}
+        self.tabelas = {col: np.asarray(valores, dtype=np.float64) for col, valores in tabelas.items()}
+        self.prior = {col: float(valor) for col, valor in prior.items()}
+        self.media = np.asarray(media, dtype=np.float64)
+        self.escala = np.asarray(escala, dtype=np.float64)
+        if latitudes is None:
+            latitudes = {local: lat for local, (lat, _) in COORDENADAS.items()}
+        self.latitudes = {str(local): float(lat) for local, lat in latitudes.items()}
+        self.politica_desconhecida = politica_desconhecida
+
+        self._indices = {col: pd.Index(valores) for col, valores in self.categorias.items()}
+        self._posicoes = {col: {v: i for i, v in enumerate(valores)} for col, valores in self.categorias.items()}
+        self._indice_latitude = pd.Index(list(self.latitudes))
+        self._posicoes['latitude'] = {v: i for i, v in enumerate(self.latitudes)}
+        self._tabela_latitude = np.fromiter(self.latitudes.values(), dtype=np.float64)
+
+    @classmethod
+    def de_encoders(cls, target_encoders, scaler=None, politica_desconhecida='erro'):
+        """
+        Monta o pré-processador a partir dos artefatos antigos.
+
+        Args:
+            target_encoders: Dicionário coluna -> {categoria: valor codificado}
+            scaler: StandardScaler ajustado (None = sem padronização)
+            politica_desconhecida: 'erro' ou 'prior'
+
+        Returns:
+            PreProcessador equivalente aos dicionários + scaler
+        """
+        features = list(getattr(scaler, 'feature_names_in_', FEATURES_MODELO))
+        n = len(features)
+        media = getattr(scaler, 'mean_', None)
+        escala = getattr(scaler, 'scale_', None)
+        return cls(
+            categorias={col: list(mapa.keys()) for col, mapa in target_encoders.items()},
+            tabelas={col: list(mapa.values()) for col, mapa in target_encoders.items()},
+            # Sem o alvo original, o prior é a mediana dos valores codificados
+            prior={col: np.median(list(mapa.values())) for col, mapa in target_encoders.items()},
+            media=np.zeros(n) if media is None else media,
+            escala=np.ones(n) if escala is None else escala,
+            features=features,
+            politica_desconhecida=politica_desconhecida,
+        )
+
+    @classmethod
+    def fit(cls, dados, y, estatistica='mediana', politica_desconhecida='erro', latitudes=None):
+        """
+        Ajusta encoding e padronização nos dados de treino, como no notebook.
+
+        Args:
+            dados: DataFrame com as colunas brutas do modelo
+            y: Preços (alvo)
+            estatistica: 'mediana' (Target Median Encoding do notebook) ou 'media'
+            politica_desconhecida: 'erro' ou 'prior'
+            latitudes: Dicionário local -> latitude (padrão: mediana por origem
+                nos dados, se houver a coluna 'latitude'; senão, COORDENADAS)
+
+        Returns:
+            PreProcessador ajustado
+        """
+        if estatistica not in ('mediana', 'media'):
+            raise ValueError(f"Estatística inválida: {estatistica}")
+        colunas, _ = colunas_entrada(dados)
+        y = pd.Series(np.asarray(y, dtype=np.float64))
+        if latitudes is None and 'latitude' in colunas:
+            latitudes = {local: lat for local, (lat, _) in COORDENADAS.items()}
+            latitudes.update(latitudes_por_local(colunas))
+
+        categorias, tabelas, prior = {}, {}, {}
+        for col in CATEGORICAS:
+            codigos, vocabulario = pd.factorize(colunas[col], sort=True)
+            agrupado = y.groupby(codigos)
+            resumo = agrupado.median() if estatistica == 'mediana' else agrupado.mean()
+            categorias[col] = list(vocabulario)
+            tabelas[col] = resumo.reindex(range(len(vocabulario))).to_numpy()
+            prior[col] = y.median() if estatistica == 'mediana' else y.mean()
+
+        n = len(FEATURES_MODELO)
+        processador = cls(categorias, tabelas, prior, np.zeros(n), np.ones(n),
+                          latitudes=latitudes, politica_desconhecida=politica_desconhecida)
+
+        # Padronização ajustada na matriz já codificada (ddof=0, como o StandardScaler)
+        X = processador.montar_features(dados)
+        escala = X.std(axis=0)
+        processador.media = X.mean(axis=0)
+        processador.escala = np.where(escala == 0, 1.0, escala)
+        return processador
+
+    def codificar(self, coluna, valores):
+        """
+        Codifica uma coluna categórica inteira.
+
+        Args:
+            coluna: Nome da coluna categórica
+            valores: Array com as categorias brutas
+
+        Returns:
+            np.ndarray float64 com os valores codificados
+        """
+        codigos = self._codigos(self._indices[coluna], self._posicoes[coluna], valores)
+        return self._buscar(codigos, self.tabelas[coluna], self.prior[coluna], valores, coluna)
+
+    @staticmethod
+    def _codigos(indice, posicoes, valores):
+        # Para uma corrida, o custo fixo do get_indexer domina; um dict resolve
+        if len(valores) <= LOTE_PEQUENO:
+            return np.fromiter((posicoes.get(v, -1) for v in valores), dtype=np.intp, count=len(valores))
+        return indice.get_indexer(valores)
+
+    def _buscar(self, codigos, tabela, prior, valores, coluna):
+        desconhecidos = codigos < 0
+        if not desconhecidos.any():
+            return tabela[codigos]
+        if self.politica_desconhecida == 'erro':
+            exemplos = sorted({str(v) for v in np.asarray(valores)[desconhecidos]})[:5]
+            raise ValueError(f"Categorias desconhecidas em '{coluna}': {exemplos}")
+        return np.where(desconhecidos, prior, tabela[codigos])
+
+    def montar_features(self, dados):
+        """
+        Monta a matriz de features (não padronizada) na ordem do modelo.
+
+        Campos derivados seguem as simplificações do app: a latitude vem da
+        origem e, se só 'temperature' for informada, apparentTemperatureLow e
+        temperatureHigh são derivadas dela.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+
+        Returns:
+            np.ndarray de shape (n_corridas, n_features)
+        """
+        colunas, n = colunas_entrada(dados)
+
+        if 'latitude' not in colunas and 'source' in colunas:
+            codigos = self._codigos(self._indice_latitude, self._posicoes['latitude'], colunas['source'])
+            colunas['latitude'] = self._buscar(codigos, self._tabela_latitude, self._tabela_latitude.mean(),
+                                               colunas['source'], 'source')
+        if 'temperature' in colunas:
+            temperatura = colunas['temperature'].astype(np.float64)
+            for coluna, deslocamento in DESLOCAMENTO_TEMPERATURA.items():
+                colunas.setdefault(coluna, temperatura + deslocamento)
+
+        faltando = [f for f in self.features if f not in colunas]
+        if faltando:
+            raise ValueError(f"Colunas obrigatórias ausentes: {faltando}")
+
+        X = np.empty((n, len(self.features)), dtype=np.float64)
+        for j, feature in enumerate(self.features):
+            if feature in self.tabelas:
+                X[:, j] = self.codificar(feature, colunas[feature])
+            else:
+                X[:, j] = colunas[feature]
+        return X
+
+    def escalonar(self, X):
+        """Padronização equivalente a StandardScaler.transform."""
+        return (X - self.media) / self.escala
+
+    def transform(self, dados):
+        """
+        Corridas brutas -> matriz padronizada pronta para o modelo.
+
+        Args:
+            dados: DataFrame ou mapeamento coluna -> array com as corridas
+
+        Returns:
+            np.ndarray de shape (n_corridas, n_features)
+        """
+        return self.escalonar(self.montar_features(dados))
+
+    def mapeamentos(self):
+        """Tabelas no formato antigo: coluna -> {categoria: valor codificado}."""
+        return {col: dict(zip(self.categorias[col].tolist(), self.tabelas[col].tolist()))
+                for col in self.categorias}
+
+    def para_dict(self):
+        """Representação serializável em JSON."""
+        return {
+            'features': self.features,
+            'categorias': {col: [str(v) for v in valores] for col, valores in self.categorias.items()},
+            'tabelas': {col: valores.tolist() for col, valores in self.tabelas.items()},
+            'prior': self.prior,
+            'media': self.media.tolist(),
+            'escala': self.escala.tolist(),
+            'latitudes': self.latitudes,
+            'politica_desconhecida': self.politica_desconhecida,
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Reconstrói um PreProcessador salvo com `para_dict`."""
+        return cls(**dados)
@@ -0,0 +1,244 @@
+"""
+Roteamento: matriz de rotas pré-calculada entre os locais e backends plugáveis.
+
+Os locais de origem/destino do app são fixos (COORDENADAS), então as rotas
+entre eles são calculadas uma vez, offline, e carregadas na inicialização:
+uma cotação entre locais conhecidos não faz nenhuma chamada de rede. Para
+coordenadas arbitrárias há roteadores plugáveis com a mesma interface
+`rota(origem, destino) -> (rota, distancia_milhas)`:
+
+    RoteadorORS        OpenRouteService (sessão HTTP com pool e timeout)
+    RoteadorOSRM       servidor OSRM local (grafo próprio, sem chave de API)
+    RoteadorLinhaReta  substituto sem rede: linha reta e distância haversine (geo.py)
+
+Construção da matriz:
+    python rotas.py --backend ors --saida matriz_rotas.json
+"""
+import argparse
+import json
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from geo import FATOR_RODOVIA_PADRAO, distancia_pares
+from preprocessamento import COORDENADAS
+
+ARQUIVO_MATRIZ = 'matriz_rotas.json'
+METROS_POR_MILHA = 1609.34
+
+# (conexão, leitura) em segundos
+TIMEOUT_PADRAO = (3.05, 10)
+
+
+class ErroRota(Exception):
+    """Falha ao obter uma rota do backend."""
+
+
+class RoteadorLinhaReta:
+    """
+    Rota em linha reta; não depende de rede (útil em testes e como fallback).
+
+    A distância é a haversine multiplicada pelo fator de correção de rodovia
+    (ver geo.py), para se aproximar da distância percorrida pelas ruas.
+    """
+
+    perfil = 'linha-reta'
+
+    def __init__(self, fator=FATOR_RODOVIA_PADRAO):
+        self.fator = fator
+
+    def rota(self, origem, destino):
+        return [list(origem), list(destino)], float(distancia_pares(origem, destino, self.fator))
+
+
+class _RoteadorHTTP:
+    """Base dos roteadores HTTP: uma sessão reutilizada, com pool e timeout."""
+
+    def __init__(self, timeout=TIMEOUT_PADRAO, tamanho_pool=10, cabecalhos=None):
+        self.timeout = timeout
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=tamanho_pool, pool_maxsize=tamanho_pool, max_retries=0)
+        self.sessao.mount('http://', adaptador)
+        self.sessao.mount('https://', adaptador)
+        self.sessao.headers.update(cabecalhos or {})
+
+    def _requisitar(self, metodo, url, **kwargs):
+        try:
+            resposta = self.sessao.request(metodo, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise ErroRota(f"Falha de rede: {e}") from e
+        if resposta.status_code != 200:
+            raise ErroRota(f"Resposta {resposta.status_code}: {resposta.text[:200]}")
+        return resposta.json()
+
+    def fechar(self):
+        self.sessao.close()
+
+
+class RoteadorORS(_RoteadorHTTP):
+    """OpenRouteService (https://openrouteservice.org)."""
+
+    URL = "https://api.openrouteservice.org/v2/directions/{perfil}"
+
+    def __init__(self, api_key, perfil='driving-car', url=None, **kwargs):
+        super().__init__(cabecalhos={
+            'Accept': 'application/json, application/geo+json, application/gpx+xml',
+            'Authorization': api_key or '',
+            'Content-Type': 'application/json; charset=utf-8'
+        }, **kwargs)
+        self.perfil = perfil
+        self.url = (url or self.URL).format(perfil=perfil)
+
+    def requisicao(self, origem, destino):
+        """Método, URL e argumentos da chamada (compartilhados com rotas_async.py)."""
+        body = {
+            "coordinates": [[origem[1], origem[0]], [destino[1], destino[0]]],
+            "format": "geojson"
+        }
+        return 'POST', self.url, {'json': body}
+
+    @staticmethod
+    def interpretar(data):
+        """Resposta GeoJSON do ORS -> (rota [[lat, lon], ...], distancia_milhas)."""
+        try:
+            feature = data["features"][0]
+            # OpenRouteService retorna [lon, lat]; o folium usa [lat, lon]
+            rota = [[coord[1], coord[0]] for coord in feature["geometry"]["coordinates"]]
+            distancia = feature["properties"]["summary"]["distance"] / METROS_POR_MILHA
+        except (KeyError, IndexError, TypeError) as e:
+            raise ErroRota(f"Resposta inesperada do ORS: {e!r}") from e
+        return rota, distancia
+
+    def rota(self, origem, destino):
+        metodo, url, kwargs = self.requisicao(origem, destino)
+        return self.interpretar(self._requisitar(metodo, url, **kwargs))
+
+
+class RoteadorOSRM(_RoteadorHTTP):
+    """Servidor OSRM local (osrm-routed) sobre um grafo de ruas próprio."""
+
+    def __init__(self, url_base='http://localhost:5000', perfil='driving', **kwargs):
+        super().__init__(**kwargs)
+        self.url_base = url_base.rstrip('/')
+        self.perfil = perfil
+
+    def requisicao(self, origem, destino):
+        """Método, URL e argumentos da chamada (compartilhados com rotas_async.py)."""
+        coordenadas = f"{origem[1]},{origem[0]};{destino[1]},{destino[0]}"
+        url = f"{self.url_base}/route/v1/{self.perfil}/{coordenadas}"
+        return 'GET', url, {'params': {'overview': 'full', 'geometries': 'geojson'}}
+
+    @staticmethod
+    def interpretar(data):
+        """Resposta do OSRM -> (rota [[lat, lon], ...], distancia_milhas)."""
+        try:
+            melhor = data["routes"][0]
+            rota = [[coord[1], coord[0]] for coord in melhor["geometry"]["coordinates"]]
+            distancia = melhor["distance"] / METROS_POR_MILHA
+        except (KeyError, IndexError, TypeError) as e:
+            raise ErroRota(f"Resposta inesperada do OSRM: {e!r}") from e
+        return rota, distancia
+
+    def rota(self, origem, destino):
+        metodo, url, kwargs = self.requisicao(origem, destino)
+        return self.interpretar(self._requisitar(metodo, url, **kwargs))
+
+
+class MatrizRotas:
+    """
+    Distâncias e polylines pré-calculadas entre todos os pares de locais.
+    """
+
+    def __init__(self, locais, distancias, rotas, perfil):
+        """
+        Args:
+            locais: Lista de nomes dos locais
+            distancias: Matriz (origem x destino) de distâncias em milhas
+            rotas: Matriz (origem x destino) de polylines [[lat, lon], ...]
+            perfil: Perfil/backend usado na construção
+        """
+        self.locais = list(locais)
+        self.distancias = distancias
+        self.rotas = rotas
+        self.perfil = perfil
+        self._posicao = {local: i for i, local in enumerate(self.locais)}
+
+    def __contains__(self, par):
+        origem, destino = par
+        return origem in self._posicao and destino in self._posicao
+
+    def consultar(self, origem, destino):
+        """
+        Rota entre dois locais da matriz.
+
+        Returns:
+            Tupla (rota, distancia_milhas)
+        """
+        i, j = self._posicao[origem], self._posicao[destino]
+        return self.rotas[i][j], self.distancias[i][j]
+
+    def salvar(self, caminho=ARQUIVO_MATRIZ):
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump({'locais': self.locais, 'distancias': self.distancias,
+                       'rotas': self.rotas, 'perfil': self.perfil}, f, ensure_ascii=False)
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_MATRIZ):
+        with open(caminho, encoding='utf-8') as f:
+            return cls(**json.load(f))
+
+
+def construir_matriz(roteador, coordenadas=None):
+    """
+    Calcula a rota de cada par (origem, destino) com o roteador informado.
+
+    Pares com a mesma origem e destino ficam com distância zero.
+
+    Args:
+        roteador: Objeto com o método rota(origem, destino)
+        coordenadas: Dicionário local -> (lat, lon) (padrão: COORDENADAS)
+
+    Returns:
+        MatrizRotas
+    """
+    coordenadas = COORDENADAS if coordenadas is None else coordenadas
+    locais = list(coordenadas)
+    distancias = [[0.0] * len(locais) for _ in locais]
+    rotas = [[[list(coordenadas[local])] for _ in locais] for local in locais]
+
+    for i, origem in enumerate(locais):
+        for j, destino in enumerate(locais):
+            if i != j:
+                rotas[i][j], distancias[i][j] = roteador.rota(coordenadas[origem], coordenadas[destino])
+    return MatrizRotas(locais, distancias, rotas, getattr(roteador, 'perfil', type(roteador).__name__))
+
+
+def carregar_matriz(caminho=ARQUIVO_MATRIZ):
+    """MatrizRotas salva, ou None se ainda não tiver sido construída."""
+    return MatrizRotas.carregar(caminho) if os.path.exists(caminho) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Constrói a matriz de rotas entre os locais')
+    parser.add_argument('--backend', choices=['ors', 'osrm', 'reta'], default='ors')
+    parser.add_argument('--osrm-url', default='http://localhost:5000')
+    parser.add_argument('--saida', default=ARQUIVO_MATRIZ)
+    args = parser.parse_args()
+
+    if args.backend == 'ors':
+        from dotenv import load_dotenv
+        load_dotenv()
+        roteador = RoteadorORS(os.getenv('API_ORS'))
+    elif args.backend == 'osrm':
+        roteador = RoteadorOSRM(args.osrm_url)
+    else:
+        roteador = RoteadorLinhaReta()
+
+    matriz = construir_matriz(roteador)
+    matriz.salvar(args.saida)
+    print(f"Matriz {len(matriz.locais)}x{len(matriz.locais)} ({matriz.perfil}) gravada em '{args.saida}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Busca de rotas assíncrona, com prazo e rota de reserva.
+
+ClienteRotasAsync faz as chamadas de um roteador HTTP de rotas.py (ORS ou
+OSRM) com um httpx.AsyncClient (pool de conexões e timeout) rodando em um
+event loop próprio, em uma thread daemon: o script do Streamlit continua
+síncrono e apenas aguarda um futuro.
+
+RotasComPrazo é o que o app usa: consulta o cache e, se a rota não estiver
+nele, espera o backend no máximo `prazo` segundos. Se a rota não chegar a
+tempo, devolve na hora a rota de reserva (linha reta + fator de rodovia,
+ver geo.py), para que o preço saia imediatamente, junto com o futuro da
+chamada em andamento; quando ela termina, a rota vai para o cache e a
+polyline pode ser exibida no mapa.
+
+Servidor simulado para testes: python -m benchmarks.mock_ors
+"""
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import TimeoutError as TempoEsgotado
+
+import httpx
+
+from rotas import TIMEOUT_PADRAO, ErroRota, RoteadorLinhaReta
+
+# Quanto a cotação espera pelo backend antes de usar a rota de reserva (s)
+PRAZO_PADRAO = 0.8
+
+# fonte: 'cache', 'backend' ou 'reserva'; pendente: futuro da rota que ainda
+# não chegou (None se não há chamada em andamento)
+ResultadoRota = namedtuple('ResultadoRota', ['rota', 'distancia', 'fonte', 'pendente'])
+
+
+class ClienteRotasAsync:
+    """
+    Chamadas de um roteador HTTP (RoteadorORS/RoteadorOSRM) via httpx.AsyncClient.
+    """
+
+    def __init__(self, roteador, tamanho_pool=10, timeout=TIMEOUT_PADRAO):
+        """
+        Args:
+            roteador: Roteador de rotas.py com requisicao(), interpretar() e
+                `sessao` (de onde vêm os cabeçalhos, como a chave de API)
+            tamanho_pool: Máximo de conexões simultâneas (e mantidas abertas)
+            timeout: (conexão, leitura) em segundos
+        """
+        self.roteador = roteador
+        self.perfil = getattr(roteador, 'perfil', type(roteador).__name__)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='rotas-async', daemon=True)
+        self._thread.start()
+
+        async def criar_cliente():
+            return httpx.AsyncClient(
+                headers=dict(roteador.sessao.headers),
+                limits=httpx.Limits(max_connections=tamanho_pool, max_keepalive_connections=tamanho_pool),
+                timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+            )
+        self._cliente = asyncio.run_coroutine_threadsafe(criar_cliente(), self._loop).result()
+
+    async def rota_async(self, origem, destino):
+        """
+        Returns:
+            Tupla (rota, distancia_milhas)
+
+        Raises:
+            ErroRota: Falha de rede, timeout, status diferente de 200 ou resposta inesperada
+        """
+        metodo, url, kwargs = self.roteador.requisicao(origem, destino)
+        try:
+            resposta = await self._cliente.request(metodo, url, **kwargs)
+        except httpx.HTTPError as e:
+            raise ErroRota(f"Falha de rede: {e!r}") from e
+        if resposta.status_code != 200:
+            raise ErroRota(f"Resposta {resposta.status_code}: {resposta.text[:200]}")
+        try:
+            data = resposta.json()
+        except ValueError as e:
+            raise ErroRota(f"Resposta inválida: {e}") from e
+        return self.roteador.interpretar(data)
+
+    def buscar(self, origem, destino):
+        """Inicia a chamada no event loop do cliente e devolve um concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self.rota_async(origem, destino), self._loop)
+
+    def rota(self, origem, destino):
+        """Interface síncrona de rotas.py (bloqueia até a resposta ou o timeout)."""
+        return self.buscar(origem, destino).result()
+
+    def fechar(self):
+        asyncio.run_coroutine_threadsafe(self._cliente.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class RotasComPrazo:
+    """
+    Cache -> backend com prazo -> rota de reserva, sem nunca bloquear além do prazo.
+    """
+
+    def __init__(self, cliente, cache=None, reserva=None, prazo=PRAZO_PADRAO):
+        """
+        Args:
+            cliente: ClienteRotasAsync (ou objeto com buscar(origem, destino) -> Future)
+            cache: CacheRotas opcional; rotas que chegam depois do prazo também são guardadas nele
+            reserva: Roteador síncrono sem rede (padrão: RoteadorLinhaReta())
+            prazo: Espera máxima pelo backend, em segundos
+        """
+        self.cliente = cliente
+        self.cache = cache
+        self.reserva = reserva if reserva is not None else RoteadorLinhaReta()
+        self.prazo = prazo
+        self._em_andamento = {}
+        self._trava = threading.Lock()
+
+    def _buscar(self, origem, destino):
+        # Pedidos repetidos do mesmo trajeto (ex.: reexecuções do Streamlit)
+        # aguardam a mesma chamada em vez de abrir outra
+        chave = (*map(float, origem), *map(float, destino))
+        with self._trava:
+            futuro = self._em_andamento.get(chave)
+            nova = futuro is None
+            if nova:
+                futuro = self.cliente.buscar(origem, destino)
+                self._em_andamento[chave] = futuro
+        if nova:
+            # Fora da trava: se a chamada já terminou, o callback roda aqui mesmo
+            futuro.add_done_callback(lambda f: self._concluir(chave, origem, destino, f))
+        return futuro
+
+    def _concluir(self, chave, origem, destino, futuro):
+        with self._trava:
+            self._em_andamento.pop(chave, None)
+        if self.cache is None or futuro.cancelled():
+            return
+        erro = futuro.exception()
+        if erro is None:
+            self.cache.registrar(origem, destino, futuro.result())
+        elif isinstance(erro, ErroRota):
+            self.cache.registrar(origem, destino, erro=erro)
+
+    def rota(self, origem, destino):
+        """
+        Rota em no máximo `prazo` segundos.
+
+        Returns:
+            ResultadoRota; com fonte 'reserva' e `pendente` preenchido, a rota
+            real ainda está a caminho (pendente.result() a devolve)
+        """
+        if self.cache is not None:
+            try:
+                valor = self.cache.consultar(origem, destino)
+            except ErroRota:
+                # Backend falhou há pouco: reserva direto, sem nova chamada
+                return ResultadoRota(*self.reserva.rota(origem, destino), 'reserva', None)
+            if valor is not None:
+                return ResultadoRota(*valor, 'cache', None)
+
+        futuro = self._buscar(origem, destino)
+        try:
+            return ResultadoRota(*futuro.result(timeout=self.prazo), 'backend', None)
+        except TempoEsgotado:
+            return ResultadoRota(*self.reserva.rota(origem, destino), 'reserva', futuro)
+        except ErroRota:
+            return ResultadoRota(*self.reserva.rota(origem, destino), 'reserva', None)
+
+    def estatisticas(self):
+        dados = self.cache.estatisticas() if self.cache is not None else {}
+        return {**dados, 'em_andamento': len(self._em_andamento)}
+
+    def fechar(self):
+        self.cliente.fechar()
+        if self.cache is not None:
+            self.cache.fechar()
@@ -0,0 +1,377 @@
+"""
+Serviço HTTP (ASGI) de previsão de preços com micro-lotes.
+
+Requisições que chegam com poucos milissegundos de diferença são agrupadas em
+uma única chamada a Precificador.predict_batch, já que em lotes de 1 o custo
+fixo de cada chamada ao modelo domina o tempo de resposta.
+
+Execução:
+    uvicorn servico:app --port 8000
+
+Exemplo:
+    curl -X POST localhost:8000/prever -d '{"distance": 2.1, "surge_multiplier": 1.0,
+        "source": "Back Bay", "destination": "Fenway", "cab_type": "Uber",
+        "name": "UberX", "short_summary": "Clear", "long_summary": "..."}'
+
+Sem "distance", a distância é estimada (haversine corrigida pelo fator de
+rodovia do pacote, ver geo.py) para origem e destino com coordenadas conhecidas.
+
+POST /explicar recebe o mesmo corpo e devolve o preço decomposto em viés +
+contribuição de cada campo (caminhos de decisão da floresta).
+
+GET /metricas expõe as latências por etapa e os contadores no formato texto
+do Prometheus (GET /metricas.json: o mesmo resumo em JSON, ver metricas.py).
+
+GET /deriva compara as corridas previstas recentemente com as distribuições
+do treino gravadas no pacote (PSI e KS por feature, ver deriva.py); o PSI e o
+KS também saem em /metricas e cada feature que entra em alerta conta em
+alertas_deriva.
+"""
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+
+from artefatos import abrir_precificador, diretorio_camada, ler_fator_rodovia, ler_referencia_deriva, ler_versao
+from deriva import MonitorDeriva
+from geo import FATOR_RODOVIA_PADRAO, distancia_locais
+from metricas import Metricas, perfilar
+from preprocessamento import COORDENADAS
+
+# Campos obrigatórios do contrato de previsão
+CAMPOS_OBRIGATORIOS = ['distance', 'surge_multiplier', 'source', 'destination',
+                       'cab_type', 'name', 'short_summary', 'long_summary']
+
+# Valores padrão do clima, iguais aos valores iniciais do formulário do app
+CAMPOS_PADRAO = {'temperature': 70.0, 'pressure': 1000.0}
+
+
+def validar_corrida(corrida):
+    """
+    Valida e completa uma corrida recebida pela API.
+
+    Args:
+        corrida: Dicionário com os campos do contrato
+
+    Returns:
+        Dicionário com os campos padrão preenchidos
+    """
+    if not isinstance(corrida, dict):
+        raise ValueError("Cada corrida deve ser um objeto JSON")
+    faltando = [campo for campo in CAMPOS_OBRIGATORIOS if campo not in corrida]
+    # A distância pode ser estimada quando origem e destino têm coordenadas
+    if faltando == ['distance'] and corrida['source'] in COORDENADAS and corrida['destination'] in COORDENADAS:
+        faltando = []
+    if faltando:
+        raise ValueError(f"Campos obrigatórios ausentes: {faltando}")
+    return {**CAMPOS_PADRAO, 'distance': None, **corrida}
+
+
+class MicroLote:
+    """
+    Agrupa previsões concorrentes em lotes.
+
+    A primeira corrida da fila abre uma janela de `espera_ms`; tudo o que chegar
+    nessa janela (até `tamanho_maximo`) é previsto em uma única chamada.
+    """
+
+    def __init__(self, precificador, espera_ms=2.0, tamanho_maximo=512, fator_rodovia=FATOR_RODOVIA_PADRAO,
+                 metricas=None, monitor=None):
+        self.precificador = precificador
+        self.metricas = metricas
+        self.monitor = monitor
+        self.fator_rodovia = fator_rodovia
+        self.espera = espera_ms / 1000
+        self.tamanho_maximo = tamanho_maximo
+        self.fila = asyncio.Queue()
+        self.lotes = 0
+        self.corridas = 0
+        self._tarefa = None
+
+    def iniciar(self):
+        self._tarefa = asyncio.get_running_loop().create_task(self._coletar())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+
+    async def prever(self, corridas):
+        """
+        Enfileira corridas e aguarda os preços.
+
+        Args:
+            corridas: Lista de dicionários já validados
+
+        Returns:
+            Lista de preços, na mesma ordem
+        """
+        loop = asyncio.get_running_loop()
+        futuros = []
+        for corrida in corridas:
+            futuro = loop.create_future()
+            self.fila.put_nowait((corrida, futuro, time.perf_counter()))
+            futuros.append(futuro)
+        return await asyncio.gather(*futuros)
+
+    async def _coletar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pendentes = [await self.fila.get()]
+            limite = loop.time() + self.espera
+            while len(pendentes) < self.tamanho_maximo:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    pendentes.append(await asyncio.wait_for(self.fila.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+            # O modelo roda fora do event loop para não bloquear novas conexões
+            await loop.run_in_executor(None, self._processar, pendentes)
+
+    def _processar(self, pendentes):
+        corridas = [corrida for corrida, _, _ in pendentes]
+        self.lotes += 1
+        self.corridas += len(corridas)
+        if self.metricas is not None:
+            # Tempo na fila da corrida mais antiga do lote (janela + espera pelo executor)
+            self.metricas.observar('fila', (time.perf_counter() - pendentes[0][2]) * 1000)
+            self.metricas.contar('lotes')
+            self.metricas.contar('corridas', len(corridas))
+        try:
+            # O lote roda no executor: é aqui que o perfil de requisições lentas é gravado
+            with perfilar(self.metricas, 'lote'):
+                precos = self._prever_lote(corridas)
+            resultados = [(preco, None) for preco in precos]
+        except Exception:
+            # Uma corrida inválida não deve derrubar o lote inteiro: refaz uma a uma
+            resultados = []
+            for corrida in corridas:
+                try:
+                    resultados.append((self._prever_lote([corrida])[0], None))
+                except Exception as e:
+                    resultados.append((None, e))
+                    if self.metricas is not None:
+                        self.metricas.contar('corridas_invalidas')
+
+        for (_, futuro, _), (preco, erro) in zip(pendentes, resultados):
+            futuro.get_loop().call_soon_threadsafe(_resolver, futuro, preco, erro)
+
+    def _prever_lote(self, corridas):
+        colunas = self.colunas(corridas)
+        precos = self.precificador.predict_batch(colunas)
+        if self.monitor is not None:
+            # Só enfileira; as faixas são contadas na thread do monitor
+            self.monitor.observar(colunas, precos)
+        return precos.tolist()
+
+    def colunas(self, corridas):
+        """Corridas validadas -> lote colunar, com as distâncias ausentes estimadas."""
+        campos = CAMPOS_OBRIGATORIOS + list(CAMPOS_PADRAO)
+        colunas = {campo: [corrida[campo] for corrida in corridas] for campo in campos}
+
+        # Distâncias ausentes estimadas para o lote inteiro em uma passada
+        distancia = np.array(colunas['distance'], dtype=np.float64)
+        ausentes = np.isnan(distancia)
+        if ausentes.any():
+            estimada = distancia_locais(colunas['source'], colunas['destination'], self.fator_rodovia)
+            distancia[ausentes] = estimada[ausentes]
+            colunas['distance'] = distancia
+        return colunas
+
+
+def _resolver(futuro, preco, erro):
+    if futuro.done():
+        return
+    if erro is not None:
+        futuro.set_exception(erro)
+    else:
+        futuro.set_result(preco)
+
+
+async def _ler_corpo(receive):
+    corpo = b''
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get('body', b'')
+        if not mensagem.get('more_body', False):
+            return corpo
+
+
+async def _ler_corridas(receive):
+    """Corpo JSON -> (corridas validadas, se veio uma lista)."""
+    conteudo = json.loads(await _ler_corpo(receive) or b'null')
+    lote = isinstance(conteudo, list)
+    corridas = [validar_corrida(c) for c in (conteudo if lote else [conteudo])]
+    if not corridas:
+        raise ValueError("Nenhuma corrida informada")
+    return corridas, lote
+
+
+async def _responder(send, status, conteudo):
+    corpo = json.dumps(conteudo, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json; charset=utf-8'),
+                    (b'content-length', str(len(corpo)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+async def _responder_texto(send, texto):
+    corpo = texto.encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/plain; version=0.0.4; charset=utf-8'),
+                    (b'content-length', str(len(corpo)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+def criar_app(precificador=None, espera_ms=None, tamanho_maximo=None, metricas=None, camada=None, monitor=None):
+    """
+    Cria a aplicação ASGI.
+
+    Args:
+        precificador: Precificador já carregado; se None, os artefatos são
+            carregados no startup (evento lifespan), preferindo o pacote mmap
+        espera_ms: Janela de agrupamento em ms (padrão: env PRECO_ESPERA_MS ou 2)
+        tamanho_maximo: Tamanho máximo do lote (padrão: env PRECO_LOTE_MAXIMO ou 512)
+        metricas: Registro de métricas (padrão: um novo Metricas; o perfil de
+            requisições lentas é ativado pela env PRECO_PERFIL_MS)
+        camada: Camada de modelo carregada no startup, 'completo' ou 'compacto'
+            (padrão: env PRECO_CAMADA ou 'completo'; ver destilacao.py)
+        monitor: MonitorDeriva das corridas previstas (padrão: criado a partir
+            da referência do pacote, com janela da env PRECO_DERIVA_JANELA ou
+            5000 corridas; sem referência no pacote, não há monitor)
+
+    Returns:
+        Callable ASGI
+    """
+    espera_ms = float(os.getenv('PRECO_ESPERA_MS', 2.0)) if espera_ms is None else espera_ms
+    tamanho_maximo = int(os.getenv('PRECO_LOTE_MAXIMO', 512)) if tamanho_maximo is None else tamanho_maximo
+    metricas = Metricas() if metricas is None else metricas
+    estado = {}
+
+    async def iniciar():
+        diretorio = diretorio_camada(camada)
+        with metricas.etapa('carregar_modelo'):
+            modelo = precificador if precificador is not None else abrir_precificador(diretorio)
+        modelo.metricas = metricas
+        estado['camada'] = camada or os.getenv('PRECO_CAMADA', 'completo')
+        metricas.definir_info('modelo', versao=ler_versao(diretorio) or 'joblib', camada=estado['camada'])
+        monitor_deriva = monitor
+        referencia = ler_referencia_deriva(diretorio)
+        if monitor_deriva is None and referencia is not None:
+            monitor_deriva = MonitorDeriva(referencia, modelo.preprocessador,
+                                           int(os.getenv('PRECO_DERIVA_JANELA', 5000)), metricas=metricas)
+        if monitor_deriva is not None:
+            metricas.registrar_coletor('deriva', monitor_deriva.resumo)
+        estado['monitor'] = monitor_deriva
+        estado['lote'] = MicroLote(modelo, espera_ms, tamanho_maximo, ler_fator_rodovia(diretorio), metricas,
+                                   monitor_deriva)
+        estado['lote'].iniciar()
+
+    async def lifespan(receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                try:
+                    await iniciar()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                await estado['lote'].parar()
+                if estado.get('monitor') is not None:
+                    estado['monitor'].fechar()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def prever(receive, send):
+        try:
+            corridas, lote = await _ler_corridas(receive)
+        except (ValueError, TypeError) as e:
+            await _responder(send, 400, {'erro': str(e)})
+            return
+
+        try:
+            precos = await estado['lote'].prever(corridas)
+        except ValueError as e:
+            await _responder(send, 422, {'erro': str(e)})
+            return
+
+        precos = [float(np.round(p, 4)) for p in precos]
+        await _responder(send, 200, {'precos': precos} if lote else {'preco': precos[0]})
+
+    async def explicar(receive, send):
+        # Explicações não passam pelo micro-lote: são pedidas uma a uma e a
+        # decomposição é vetorizada sobre as corridas do próprio pedido
+        try:
+            corridas, lote = await _ler_corridas(receive)
+        except (ValueError, TypeError) as e:
+            await _responder(send, 400, {'erro': str(e)})
+            return
+
+        micro = estado['lote']
+        try:
+            vies, tabela = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: micro.precificador.explicar(micro.colunas(corridas), por_campo=True))
+        except ValueError as e:
+            await _responder(send, 422, {'erro': str(e)})
+            return
+
+        explicacoes = [
+            {'preco': round(vies + sum(linha.values()), 4), 'vies': round(vies, 4),
+             'contribuicoes': {campo: round(valor, 4) for campo, valor in linha.items()}}
+            for linha in tabela.to_dict('records')
+        ]
+        await _responder(send, 200, {'explicacoes': explicacoes} if lote else explicacoes[0])
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        rota = (scope['method'], scope['path'])
+        if rota == ('POST', '/prever'):
+            with metricas.etapa('requisicao_prever'):
+                await prever(receive, send)
+        elif rota == ('POST', '/explicar'):
+            with metricas.etapa('requisicao_explicar'):
+                await explicar(receive, send)
+        elif rota == ('GET', '/metricas'):
+            await _responder_texto(send, metricas.para_prometheus())
+        elif rota == ('GET', '/metricas.json'):
+            await _responder(send, 200, metricas.para_dict())
+        elif rota == ('GET', '/deriva'):
+            if estado.get('monitor') is None:
+                await _responder(send, 404, {'erro': 'monitor de deriva indisponível (pacote sem referência do treino)'})
+            else:
+                await _responder(send, 200, estado['monitor'].estatisticas())
+        elif rota == ('GET', '/saude'):
+            micro = estado.get('lote')
+            await _responder(send, 200, {
+                'status': 'ok' if micro is not None else 'carregando',
+                'camada': estado.get('camada'),
+                'lotes': micro.lotes if micro else 0,
+                'corridas': micro.corridas if micro else 0,
+            })
+        else:
+            await _responder(send, 404, {'erro': 'rota não encontrada'})
+
+    return app
+
+
+app = criar_app()
@@ -1,90 +1,190 @@
 import pandas as pd
 import numpy as np
 import pickle
+from scipy.special import expit
 from sklearn.model_selection import train_test_split
-from category_encoders import TargetEncoder
+
+from ingestao import carregar_dados
 
 # Este script demonstra como criar e salvar target encoders
 # Você precisaria executá-lo com seus dados reais de treinamento
 
+# Parâmetros de suavização (mesmos padrões do category_encoders.TargetEncoder)
+MIN_SAMPLES_LEAF = 20
+SUAVIZACAO = 10
+
+
+def _codigos_concatenados(df, categorias):
+    """
+    Codifica todas as colunas categóricas em um único espaço de inteiros.
+
+    Cada coluna recebe um intervalo próprio de códigos (deslocamento), de modo
+    que uma só chamada a np.bincount conta todas as categorias de todas as
+    colunas. Valores ausentes ficam com código -1.
+
+    Returns:
+        Tupla (códigos de shape (n_linhas, n_colunas), lista de vocabulários,
+        deslocamento de cada coluna, total de códigos)
+    """
+    codigos = np.empty((len(df), len(categorias)), dtype=np.int64)
+    vocabularios, deslocamentos = [], []
+    total = 0
+    for j, categoria in enumerate(categorias):
+        codigo, vocabulario = pd.factorize(df[categoria])
+        codigos[:, j] = np.where(codigo < 0, -1, codigo + total)
+        vocabularios.append(vocabulario)
+        deslocamentos.append(total)
+        total += len(vocabulario)
+    return codigos, vocabularios, deslocamentos, total
+
+
+def _suavizar(soma, contagem, prior, min_samples_leaf, suavizacao):
+    """
+    Média por categoria suavizada em direção ao prior (sigmoide da contagem).
+
+    Categorias sem linhas ou com uma só linha recebem o próprio prior, como
+    no TargetEncoder: a média de uma linha seria o alvo dessa corrida.
+    """
+    peso = expit((contagem - min_samples_leaf) / suavizacao)
+    media = np.divide(soma, contagem, out=np.zeros_like(soma), where=contagem > 0)
+    return np.where(contagem > 1, prior * (1 - peso) + media * peso, prior)
+
+
+def _estatisticas(codigos, y, total, grupos=None, n_grupos=1):
+    """
+    Contagem e soma do alvo por código, em uma passada de bincount.
+
+    Com `grupos` (ex.: o fold de cada linha), devolve as estatísticas
+    separadas por grupo, com shape (n_grupos, total).
+    """
+    validos = codigos >= 0
+    linhas = np.nonzero(validos)[0]
+    chaves = codigos[validos]
+    if grupos is not None:
+        chaves = grupos[linhas] * total + chaves
+    contagem = np.bincount(chaves, minlength=total * n_grupos).astype(np.float64)
+    soma = np.bincount(chaves, weights=y[linhas], minlength=total * n_grupos)
+    return contagem.reshape(n_grupos, total), soma.reshape(n_grupos, total)
+
+
 # Função para criar e salvar target encoders
-def criar_target_encoders(df, categorias, target='price'):
+def criar_target_encoders(df, categorias, target='price', min_samples_leaf=MIN_SAMPLES_LEAF,
+                          suavizacao=SUAVIZACAO, caminho_saida='target_encoders.pkl'):
     """
     Cria target encoders para variáveis categóricas.
-    
+
+    Equivalente a ajustar um category_encoders.TargetEncoder por coluna, mas
+    todas as colunas são ajustadas juntas em uma passada sobre os dados de
+    treino e o mapeamento sai direto das estatísticas, sem um transform por
+    categoria.
+
     Args:
         df: DataFrame com os dados
         categorias: Lista de colunas categóricas para codificar
         target: Nome da coluna alvo
-    
+        min_samples_leaf: Contagem em que a média da categoria e o prior têm o mesmo peso
+        suavizacao: Inclinação da transição entre prior e média da categoria
+        caminho_saida: Arquivo pickle de saída (None para não salvar)
+
     Returns:
-        Dicionário com os target encoders
+        Dicionário coluna -> {categoria: valor codificado}
     """
     # Dividir os dados em treino e teste
     # Usamos apenas os dados de treino para calcular os encoders
     # para evitar vazamento de dados
     X_train, X_test, y_train, y_test = train_test_split(
-        df.drop(columns=[target]),
+        df[categorias],
         df[target],
         test_size=0.2,
         random_state=42
     )
-    
-    # Dicionário para armazenar os encoders
-    encoders = {}
-    
-    # Dicionário para armazenar os mapeamentos
+    y_train = y_train.to_numpy(dtype=np.float64)
+    prior = y_train.mean()
+
+    # Estatísticas de todas as colunas de uma vez
+    codigos, vocabularios, deslocamentos, total = _codigos_concatenados(X_train, categorias)
+    contagem, soma = _estatisticas(codigos.ravel(), np.repeat(y_train, len(categorias)), total)
+    valores = _suavizar(soma[0], contagem[0], prior, min_samples_leaf, suavizacao)
+
+    # Criar um dicionário com os mapeamentos de cada coluna; categorias que só
+    # aparecem fora do treino (ou ausentes) recebem o prior, como no TargetEncoder
     mapeamentos = {}
-    
-    # Para cada categoria, criar um target encoder
-    for categoria in categorias:
-        # Criar o encoder
-        encoder = TargetEncoder(cols=[categoria])
-        
-        # Ajustar o encoder aos dados de treino
-        encoder.fit(X_train[categoria], y_train)
-        
-        # Armazenar o encoder
-        encoders[categoria] = encoder
-        
-        # Criar um dicionário com os mapeamentos
-        valores_unicos = df[categoria].unique()
-        mapeamento = {}
-        
-        for valor in valores_unicos:
-            # Transformar o valor usando o encoder
-            encoded_val = encoder.transform(pd.DataFrame({categoria: [valor]}))[categoria].iloc[0]
-            mapeamento[valor] = encoded_val
-        
-        # Armazenar o mapeamento
+    for categoria, vocabulario, inicio in zip(categorias, vocabularios, deslocamentos):
+        mapeamento = {valor: prior for valor in df[categoria].unique()}
+        mapeamento.update(zip(vocabulario, valores[inicio:inicio + len(vocabulario)].tolist()))
         mapeamentos[categoria] = mapeamento
-    
+
     # Salvar os mapeamentos em um arquivo pickle
-    with open('target_encoders.pkl', 'wb') as f:
-        pickle.dump(mapeamentos, f)
-    
+    if caminho_saida is not None:
+        with open(caminho_saida, 'wb') as f:
+            pickle.dump(mapeamentos, f)
+
     return mapeamentos
 
+
+def codificar_out_of_fold(df, categorias, target='price', n_folds=5, random_state=42,
+                          min_samples_leaf=MIN_SAMPLES_LEAF, suavizacao=SUAVIZACAO):
+    """
+    Target encoding out-of-fold (K-fold) para os dados de treino.
+
+    Cada linha é codificada com estatísticas calculadas apenas nos outros
+    folds, de modo que o alvo da própria linha não vaza para a feature. As
+    estatísticas por fold saem de um único bincount; o valor fora do fold é
+    o total menos o fold.
+
+    Args:
+        df: DataFrame de treino
+        categorias: Lista de colunas categóricas para codificar
+        target: Nome da coluna alvo
+        n_folds: Número de folds
+        random_state: Semente da divisão em folds
+        min_samples_leaf: Ver criar_target_encoders
+        suavizacao: Ver criar_target_encoders
+
+    Returns:
+        DataFrame com as colunas categóricas codificadas (mesmo índice de df)
+    """
+    y = df[target].to_numpy(dtype=np.float64)
+    n = len(df)
+    folds = np.random.default_rng(random_state).permutation(n) % n_folds
+
+    codigos, _, _, total = _codigos_concatenados(df, categorias)
+    n_colunas = len(categorias)
+    contagem, soma = _estatisticas(codigos.ravel(), np.repeat(y, n_colunas), total,
+                                   grupos=np.repeat(folds, n_colunas), n_grupos=n_folds)
+
+    # Estatísticas "fora do fold": total de todas as linhas menos o próprio fold
+    contagem_fora = contagem.sum(axis=0) - contagem
+    soma_fora = soma.sum(axis=0) - soma
+    n_fold = np.bincount(folds, minlength=n_folds)
+    prior_fora = (y.sum() - np.bincount(folds, weights=y, minlength=n_folds)) / (n - n_fold)
+
+    valores = _suavizar(soma_fora, contagem_fora, prior_fora[:, None], min_samples_leaf, suavizacao)
+    codificado = valores[folds[:, None], np.maximum(codigos, 0)]
+    codificado = np.where(codigos >= 0, codificado, prior_fora[folds][:, None])
+    return pd.DataFrame(codificado, index=df.index, columns=categorias)
+
+
 caminho = r"C:\Users\Gabriel Lopes\Documents\PROJETOS_PROGRAMAÇÃO\TABELA DE PRECO DINAMICO\preco-dinamico\ipynb\csv\rideshare_kaggle.csv"
 
 # Exemplo de uso (você precisaria adaptar para seus dados reais)
 if __name__ == "__main__":
     # Carregar os dados (exemplo simulado)
     # No seu caso, carregue seus dados reais aqui
-    df = pd.read_csv(caminho)
+    # O CSV é lido uma vez em blocos para o cache colunar; as execuções
+    # seguintes carregam só o cache (ver ingestao.py)
+    df = carregar_dados(caminho)
 
-    df['price'] = df['price'].fillna(df['price'].median())
-    
     # Lista de colunas categóricas a serem codificadas
     categorias = ['cab_type', 'source', 'destination', 'name', 'short_summary', 'long_summary']
-    
+
     # Criar e salvar os target encoders
     mapeamentos = criar_target_encoders(df, categorias, target='price')
-    
+
     print("Target encoders criados e salvos com sucesso!")
-    
+
     # Exibir exemplos de mapeamentos
     for categoria, mapeamento in mapeamentos.items():
         print(f"\nMapeamento para {categoria}:")
         for valor, encoded in list(mapeamento.items())[:3]:  # Mostrar apenas os 3 primeiros
-            print(f"  {valor} -> {encoded:.2f}")
\ No newline at end of file
+            print(f"  {valor} -> {encoded:.2f}")
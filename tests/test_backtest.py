@@ -0,0 +1,33 @@
+"""Tabela de erro por faixa de preço do backtest contra pd.cut + groupby (notebook)."""
+import numpy as np
+import pandas as pd
+
+from backtest import FAIXAS, estatisticas_faixas, tabela_faixas
+
+
+def _dados():
+    rng = np.random.default_rng(0)
+    real = rng.uniform(-5, 120, size=5000).round(1)
+    # Limites exatos das faixas e valores fora delas
+    real[:8] = [0, 10, 20, 30, 40, 100, 100.1, -1]
+    erro = rng.normal(0, 2, size=real.size)
+    return real, erro
+
+
+def test_tabela_igual_ao_pd_cut():
+    real, erro = _dados()
+    tabela = tabela_faixas(estatisticas_faixas(real, erro))
+
+    esperado = pd.DataFrame({'erro': erro}).groupby(pd.cut(real, FAIXAS))['erro'].agg(['mean', 'std', 'count'])
+    np.testing.assert_allclose(tabela['mean'], esperado['mean'], rtol=1e-10)
+    np.testing.assert_allclose(tabela['std'], esperado['std'], rtol=1e-8)
+    np.testing.assert_array_equal(tabela['count'], esperado['count'])
+    mae = pd.Series(np.abs(erro)).groupby(pd.cut(real, FAIXAS)).mean()
+    np.testing.assert_allclose(tabela['mae'], mae, rtol=1e-10)
+    assert list(tabela.index) == [str(intervalo) for intervalo in esperado.index]
+
+
+def test_blocos_somam_ao_todo():
+    real, erro = _dados()
+    por_bloco = sum(estatisticas_faixas(real[i:i + 700], erro[i:i + 700]) for i in range(0, len(real), 700))
+    np.testing.assert_allclose(por_bloco, estatisticas_faixas(real, erro), rtol=1e-12)
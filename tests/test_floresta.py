@@ -0,0 +1,101 @@
+"""Equivalência da FlorestaPlana com o sklearn (RandomForestRegressor e GradientBoostingRegressor)."""
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+
+import floresta
+from floresta import FlorestaPlana, exportar_boosting, exportar_floresta
+
+
+@pytest.fixture(scope='module')
+def dados():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(3000, 6))
+    # Valores repetidos exercitam empates exatos com os limiares
+    X[:, 0] = np.round(X[:, 0], 1)
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + X[:, 2] * X[:, 3] + rng.normal(scale=0.1, size=len(X))
+    return X, y
+
+
+@pytest.fixture(scope='module')
+def floresta_rf(dados):
+    X, y = dados
+    modelo = RandomForestRegressor(n_estimators=20, random_state=0).fit(X[:2000], y[:2000])
+    return modelo, exportar_floresta(modelo)
+
+
+@pytest.mark.parametrize('n', [1, 7, 256, 1000])
+def test_predict_igual_ao_sklearn(dados, floresta_rf, n):
+    X, _ = dados
+    modelo, plana = floresta_rf
+    np.testing.assert_allclose(plana.predict(X[-n:]), modelo.predict(X[-n:]), rtol=1e-12, atol=1e-12)
+
+
+def test_vetor_de_uma_linha(dados, floresta_rf):
+    X, _ = dados
+    modelo, plana = floresta_rf
+    np.testing.assert_allclose(plana.predict(X[5]), modelo.predict(X[5:6]), rtol=1e-12)
+
+
+def test_folhas_iguais_ao_apply(dados, floresta_rf):
+    X, _ = dados
+    modelo, plana = floresta_rf
+    esperado = np.column_stack([e.apply(X[:500].astype(np.float32)) for e in modelo.estimators_]) + plana.raizes
+    np.testing.assert_array_equal(plana.folhas(X[:500]), esperado)
+
+
+def test_blocos_de_linhas(monkeypatch, dados, floresta_rf):
+    X, _ = dados
+    modelo, plana = floresta_rf
+    # Lote maior que o bloco, com um bloco final incompleto
+    monkeypatch.setattr(floresta, 'TAMANHO_BLOCO', 64)
+    np.testing.assert_allclose(plana.predict(X[:1000]), modelo.predict(X[:1000]), rtol=1e-12, atol=1e-12)
+    _, contribuicoes = plana.contribuicoes(X[:150])
+    monkeypatch.setattr(floresta, 'TAMANHO_BLOCO', 8192)
+    np.testing.assert_allclose(contribuicoes, plana.contribuicoes(X[:150])[1], rtol=1e-12)
+
+
+def test_quantis_das_arvores(dados, floresta_rf):
+    X, _ = dados
+    modelo, plana = floresta_rf
+    por_arvore = np.column_stack([e.predict(X[:400]) for e in modelo.estimators_])
+    esperado = np.quantile(por_arvore, (0.1, 0.5, 0.9), axis=1).T
+    np.testing.assert_allclose(plana.quantis(X[:400]), esperado, rtol=1e-12)
+
+
+def test_contribuicoes_somam_a_previsao(dados, floresta_rf):
+    X, _ = dados
+    _, plana = floresta_rf
+    vies, contribuicoes = plana.contribuicoes(X[:50])
+    np.testing.assert_allclose(vies + contribuicoes.sum(axis=1), plana.predict(X[:50]), rtol=1e-9)
+
+
+def test_boosting_exportado(dados):
+    X, y = dados
+    modelo = GradientBoostingRegressor(n_estimators=30, max_depth=4, random_state=0).fit(X[:2000], y[:2000])
+    plana = exportar_boosting(modelo)
+    for lote in (X[:10], X[:1000]):
+        np.testing.assert_allclose(plana.predict(lote), modelo.predict(lote), rtol=1e-9, atol=1e-9)
+
+
+def test_salvar_e_carregar(tmp_path, dados, floresta_rf):
+    X, _ = dados
+    _, plana = floresta_rf
+    caminho = tmp_path / 'floresta.npz'
+    plana.salvar(caminho)
+    carregada = FlorestaPlana.carregar(caminho)
+    np.testing.assert_array_equal(carregada.predict(X[:300]), plana.predict(X[:300]))
+
+
+def test_features_a_mais_sao_recusadas(floresta_rf):
+    _, plana = floresta_rf
+    with pytest.raises(ValueError):
+        plana.predict(np.zeros((2, plana.n_features + 1)))
+
+
+def test_contribuicoes_por_arvore_no_mesmo_percurso(dados, floresta_rf):
+    X, _ = dados
+    _, plana = floresta_rf
+    vies, contribuicoes, por_arvore = plana.contribuicoes_por_arvore(X[:300])
+    np.testing.assert_array_equal(por_arvore, plana.prever_por_arvore(X[:300]))
+    assert (vies, contribuicoes.tolist()) == (plana.contribuicoes(X[:300])[0], plana.contribuicoes(X[:300])[1].tolist())
@@ -0,0 +1,62 @@
+"""PreProcessador: latitudes aprendidas no treino e ida e volta pelo JSON."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessamento import COORDENADAS, PreProcessador, latitudes_por_local, temperatura_informada
+
+
+@pytest.fixture
+def treino():
+    # Origens fora de COORDENADAS, como no CSV do Kaggle (12 locais)
+    dados = pd.DataFrame({
+        'distance': [1.0, 2.0, 3.0, 1.5, 2.5, 0.8],
+        'surge_multiplier': [1.0] * 6,
+        'latitude': [42.3503, 42.3503, 42.3647, 42.3647, 42.3661, 42.3661],
+        'apparentTemperatureLow': [30.0, 31.0, 29.0, 28.0, 35.0, 33.0],
+        'pressure': [1010.0, 1011.0, 1009.0, 1012.0, 1008.0, 1010.0],
+        'temperatureHigh': [45.0, 44.0, 46.0, 47.0, 43.0, 45.0],
+        'source': ['Back Bay', 'Back Bay', 'North End', 'North End', 'North Station', 'North Station'],
+        'destination': ['North End', 'North Station', 'Back Bay', 'North Station', 'Back Bay', 'North End'],
+        'cab_type': ['Uber', 'Lyft'] * 3,
+        'name': ['UberX', 'Lyft'] * 3,
+        'long_summary': ['Overcast throughout the day.'] * 6,
+        'short_summary': [' Overcast '] * 6,
+    })
+    return dados, np.array([10.0, 12.0, 15.0, 9.0, 20.0, 11.0])
+
+
+def test_latitudes_por_local(treino):
+    dados, _ = treino
+    assert latitudes_por_local(dados) == {'Back Bay': 42.3503, 'North End': 42.3647, 'North Station': 42.3661}
+
+
+def test_fit_cobre_origens_fora_de_coordenadas(treino):
+    dados, y = treino
+    assert 'North End' not in COORDENADAS
+    processador = PreProcessador.fit(dados, y)  # política 'erro'
+    assert processador.latitudes['North End'] == 42.3647
+    assert set(COORDENADAS) <= set(processador.latitudes)
+
+    # Cotação sem latitude (como no app): derivada da origem, sem erro
+    corrida = dados.drop(columns=['latitude', 'apparentTemperatureLow', 'temperatureHigh']).assign(temperature=40.0)
+    X = processador.montar_features(corrida)
+    np.testing.assert_array_equal(X[:, processador.features.index('latitude')], dados['latitude'])
+
+
+def test_para_dict_preserva_latitudes(treino):
+    dados, y = treino
+    processador = PreProcessador.fit(dados, y)
+    copia = PreProcessador.de_dict(processador.para_dict())
+    assert copia.latitudes == processador.latitudes
+    np.testing.assert_array_equal(copia.transform(dados), processador.transform(dados))
+
+
+def test_temperatura_informada_inverte_a_derivacao(treino):
+    dados, y = treino
+    processador = PreProcessador.fit(dados, y)
+    corrida = dados.drop(columns=['apparentTemperatureLow', 'temperatureHigh']).assign(temperature=[40.0, 55.5] * 3)
+    X = processador.montar_features(corrida)
+    derivadas = pd.DataFrame(X, columns=processador.features)
+    np.testing.assert_allclose(temperatura_informada(derivadas), corrida['temperature'])
+    np.testing.assert_array_equal(temperatura_informada(corrida), corrida['temperature'])
@@ -0,0 +1,175 @@
+"""CacheRotas (LRU, TTL, falhas) e RotasComPrazo (prazo e rota de reserva), sem rede."""
+import sqlite3
+from concurrent.futures import Future
+
+import pytest
+
+from cache_rotas import CacheRotas
+from rotas import ErroRota
+from rotas_async import RotasComPrazo
+
+A, B, C = (42.3503, -71.0810), (42.3429, -71.1003), (42.3559, -71.0550)
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+class RoteadorFalso:
+    perfil = 'falso'
+
+    def __init__(self):
+        self.chamadas = 0
+        self.falhar = False
+
+    def rota(self, origem, destino):
+        self.chamadas += 1
+        if self.falhar:
+            raise ErroRota("fora do ar")
+        return [origem, destino], 1.0 + self.chamadas
+
+
+class ReservaFalsa:
+    def rota(self, origem, destino):
+        return [origem, destino], 99.0
+
+
+class ClienteFalso:
+    """buscar devolve futuros que o teste conclui quando quiser."""
+
+    def __init__(self):
+        self.futuros = []
+
+    def buscar(self, origem, destino):
+        futuro = Future()
+        self.futuros.append(futuro)
+        return futuro
+
+    def fechar(self):
+        pass
+
+
+def test_cache_lru_descarta_o_menos_usado():
+    roteador = RoteadorFalso()
+    cache = CacheRotas(roteador, capacidade=2, relogio=Relogio())
+    cache.rota(A, B)
+    cache.rota(A, C)
+    cache.rota(A, B)       # A->B passa a ser a mais recente
+    cache.rota(B, C)       # descarta A->C
+    assert roteador.chamadas == 3
+    cache.rota(A, B)
+    assert roteador.chamadas == 3
+    cache.rota(A, C)
+    assert roteador.chamadas == 4
+    assert cache.estatisticas()['entradas'] == 2
+
+
+def test_cache_ttl_e_chave_arredondada():
+    relogio, roteador = Relogio(), RoteadorFalso()
+    cache = CacheRotas(roteador, ttl=10, relogio=relogio)
+    primeira = cache.rota(A, B)
+    # Diferença abaixo das casas decimais da chave: mesma entrada
+    assert cache.rota((A[0] + 1e-6, A[1]), B) == primeira
+    relogio.agora += 9.9
+    assert cache.rota(A, B) == primeira and roteador.chamadas == 1
+    relogio.agora += 0.2
+    assert cache.rota(A, B) != primeira and roteador.chamadas == 2
+
+
+def test_cache_lembra_falhas_pelo_ttl_curto():
+    relogio, roteador = Relogio(), RoteadorFalso()
+    cache = CacheRotas(roteador, ttl_falha=5, relogio=relogio)
+    roteador.falhar = True
+    for _ in range(3):
+        with pytest.raises(ErroRota):
+            cache.rota(A, B)
+    assert roteador.chamadas == 1 and cache.estatisticas()['falhas_evitadas'] == 2
+    roteador.falhar = False
+    relogio.agora += 5
+    assert cache.rota(A, B)[1] == 3.0
+
+
+def test_cache_sqlite_sobrevive_ao_reinicio(tmp_path):
+    caminho = str(tmp_path / 'rotas.sqlite')
+    relogio = Relogio()
+    cache = CacheRotas(RoteadorFalso(), caminho_sqlite=caminho, relogio=relogio)
+    valor = cache.rota(A, B)
+    cache.fechar()
+    roteador = RoteadorFalso()
+    cache = CacheRotas(roteador, caminho_sqlite=caminho, relogio=relogio)
+    # A polyline volta do JSON como listas
+    assert cache.rota(A, B) == ([list(p) for p in valor[0]], valor[1]) and roteador.chamadas == 0
+    cache.fechar()
+
+
+def _linhas_sqlite(caminho):
+    with sqlite3.connect(caminho) as banco:
+        return banco.execute("SELECT COUNT(*) FROM rotas").fetchone()[0]
+
+
+def test_cache_sqlite_remove_vencidas_ao_abrir_e_nas_gravacoes(tmp_path):
+    caminho = str(tmp_path / 'rotas.sqlite')
+    relogio = Relogio()
+    cache = CacheRotas(RoteadorFalso(), ttl=10, caminho_sqlite=caminho, relogio=relogio, limpeza_a_cada=3)
+    cache.rota(A, B)
+    cache.rota(A, C)
+    assert _linhas_sqlite(caminho) == 2
+    cache.fechar()
+
+    # Ao abrir de novo, as rotas vencidas saem do arquivo
+    relogio.agora += 10
+    cache = CacheRotas(RoteadorFalso(), ttl=10, caminho_sqlite=caminho, relogio=relogio, limpeza_a_cada=3)
+    assert _linhas_sqlite(caminho) == 0
+
+    # Em uso contínuo, a cada `limpeza_a_cada` gravações
+    cache.rota(A, B)
+    cache.rota(A, C)
+    relogio.agora += 10
+    cache.rota(B, C)       # 3ª gravação: A->B e A->C já venceram
+    assert _linhas_sqlite(caminho) == 1 and cache.estatisticas()['entradas'] == 1
+    cache.fechar()
+
+
+def test_prazo_esgotado_devolve_reserva_e_guarda_a_rota_tardia():
+    cliente = ClienteFalso()
+    cache = CacheRotas(RoteadorFalso(), relogio=Relogio())
+    rotas = RotasComPrazo(cliente, cache=cache, reserva=ReservaFalsa(), prazo=0.01)
+
+    resultado = rotas.rota(A, B)
+    assert resultado.fonte == 'reserva' and resultado.distancia == 99.0
+    assert resultado.pendente is cliente.futuros[0]
+
+    # Reexecução antes de a rota chegar: reaproveita a mesma chamada
+    assert rotas.rota(A, B).pendente is resultado.pendente
+    assert len(cliente.futuros) == 1
+
+    resultado.pendente.set_result(([A, B], 2.5))
+    assert rotas.estatisticas()['em_andamento'] == 0
+    assert rotas.rota(A, B)[1:3] == (2.5, 'cache')
+
+
+def test_backend_dentro_do_prazo():
+    cliente = ClienteFalso()
+    rotas = RotasComPrazo(cliente, reserva=ReservaFalsa(), prazo=0.01)
+    futuro = Future()
+    futuro.set_result(([A, C], 1.7))
+    cliente.buscar = lambda origem, destino: futuro
+    assert rotas.rota(A, C) == ([A, C], 1.7, 'backend', None)
+
+
+def test_falha_do_backend_usa_reserva_e_fica_em_cache():
+    cliente = ClienteFalso()
+    cache = CacheRotas(RoteadorFalso(), relogio=Relogio())
+    rotas = RotasComPrazo(cliente, cache=cache, reserva=ReservaFalsa(), prazo=0.01)
+    futuro = Future()
+    futuro.set_exception(ErroRota("503"))
+    cliente.buscar = lambda origem, destino: futuro
+    assert rotas.rota(A, B) == ([A, B], 99.0, 'reserva', None)
+
+    # A falha recente está no cache: reserva direto, sem nova chamada
+    cliente.buscar = lambda origem, destino: pytest.fail("não deveria chamar o backend")
+    assert rotas.rota(A, B).fonte == 'reserva'
@@ -0,0 +1,73 @@
+"""RotasComPrazo + ClienteRotasAsync contra o ORS simulado (benchmarks/mock_ors.py), por HTTP de verdade."""
+import time
+
+import pytest
+
+from benchmarks import mock_ors
+from cache_rotas import CacheRotas
+from geo import distancia_pares
+from rotas import RoteadorLinhaReta, RoteadorORS
+from rotas_async import ClienteRotasAsync, RotasComPrazo
+
+A, B = (42.3503, -71.0810), (42.3429, -71.1003)
+# Prazo curto para as respostas lentas; folgado quando a resposta deve chegar a tempo
+PRAZO_CURTO, PRAZO_FOLGADO = 0.05, 2.0
+
+
+@pytest.fixture
+def ors():
+    """Sobe o servidor simulado com as opções dadas e monta cache -> backend com prazo -> linha reta."""
+    abertos = []
+
+    def abrir(prazo=PRAZO_FOLGADO, **opcoes):
+        servidor = mock_ors.iniciar(**opcoes)
+        roteador = RoteadorORS('teste', url=servidor.url)
+        rotas = RotasComPrazo(ClienteRotasAsync(roteador), CacheRotas(roteador), RoteadorLinhaReta(), prazo=prazo)
+        abertos.append((servidor, rotas))
+        return servidor, rotas
+
+    yield abrir
+    for servidor, rotas in abertos:
+        rotas.fechar()
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def _esperar_concluir(rotas, timeout=5.0):
+    """O cache recebe a rota tardia no callback do futuro, logo depois do result()."""
+    limite = time.monotonic() + timeout
+    while rotas.estatisticas()['em_andamento'] and time.monotonic() < limite:
+        time.sleep(0.01)
+
+
+def test_resposta_dentro_do_prazo(ors):
+    servidor, rotas = ors()
+    resultado = rotas.rota(A, B)
+    assert resultado.fonte == 'backend' and resultado.pendente is None
+    assert resultado.distancia == pytest.approx(float(distancia_pares(A, B, mock_ors.FATOR_SIMULADO)), rel=1e-6)
+    assert len(resultado.rota) == mock_ors.PONTOS_ROTA
+
+
+def test_resposta_lenta_usa_reserva_e_guarda_a_rota_tardia(ors):
+    servidor, rotas = ors(prazo=PRAZO_CURTO, atraso_ms=500)
+    inicio = time.perf_counter()
+    resultado = rotas.rota(A, B)
+    assert time.perf_counter() - inicio < 0.4
+    assert resultado.fonte == 'reserva' and resultado.pendente is not None
+    assert resultado.distancia == pytest.approx(float(distancia_pares(A, B)), rel=1e-6)
+
+    rota, distancia = resultado.pendente.result(timeout=5)
+    _esperar_concluir(rotas)
+    # A rota que chegou depois do prazo fica em cache: sem nova requisição
+    assert rotas.rota(A, B) == (rota, distancia, 'cache', None)
+    assert servidor.requisicoes == 1
+
+
+def test_falha_usa_reserva_sem_repetir_a_chamada(ors):
+    servidor, rotas = ors(fracao_falhas=1.0)
+    resultado = rotas.rota(A, B)
+    assert resultado.fonte == 'reserva' and resultado.pendente is None
+    _esperar_concluir(rotas)
+    # A falha recente está no cache (ttl_falha): reserva direto
+    assert rotas.rota(A, B).fonte == 'reserva'
+    assert servidor.requisicoes == 1
@@ -0,0 +1,71 @@
+"""Target encoders (target.py) contra valores da fórmula do category_encoders.TargetEncoder."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from target import MIN_SAMPLES_LEAF, SUAVIZACAO, _suavizar, codificar_out_of_fold, criar_target_encoders
+
+CATEGORIAS = ['cab_type', 'source', 'name']
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.default_rng(0)
+    n = 2000
+    dados = pd.DataFrame({
+        'cab_type': rng.choice(['Uber', 'Lyft'], size=n),
+        'source': rng.choice(['Back Bay', 'Fenway', 'North End', 'West End'], size=n, p=[0.5, 0.3, 0.19, 0.01]),
+        'name': rng.choice(['UberX', 'Lyft', 'Black', 'Shared', 'Lux'], size=n),
+    })
+    dados['price'] = rng.gamma(3.0, 5.0, size=n).round(1)
+    # Categorias raras: 'Taxi' em poucas linhas, 'Pool' em uma só
+    dados.loc[:2, 'name'] = 'Taxi'
+    dados.loc[3, 'name'] = 'Pool'
+    return dados
+
+
+def test_suavizar_valores_fixos():
+    # prior 10, min_samples_leaf 20, suavização 10:
+    #   3 linhas, média 20  -> 10 + 10 * expit(-1.7)
+    #   1 linha,  média 5   -> prior (TargetEncoder: contagem 1 vira o prior)
+    #   0 linhas            -> prior
+    #   20 linhas, média 12 -> peso 0.5 -> 11
+    soma = np.array([60.0, 5.0, 0.0, 240.0])
+    contagem = np.array([3.0, 1.0, 0.0, 20.0])
+    valores = _suavizar(soma, contagem, 10.0, MIN_SAMPLES_LEAF, SUAVIZACAO)
+    np.testing.assert_allclose(valores, [11.544652650835348, 10.0, 10.0, 11.0], rtol=1e-12)
+
+
+def test_mapeamentos_valores_fixos():
+    # train_test_split(test_size=0.2, random_state=42) em 10 linhas deixa as
+    # linhas 1 e 8 no teste; o prior do treino é 130 / 8 = 16.25
+    dados = pd.DataFrame({
+        'name': ['A', 'D', 'A', 'A', 'B', 'C', 'C', 'C', 'D', 'C'],
+        'price': [10.0, 100.0, 20.0, 30.0, 50.0, 4.0, 6.0, 8.0, 100.0, 2.0],
+    })
+    mapeamento = criar_target_encoders(dados, ['name'], min_samples_leaf=2, suavizacao=1,
+                                       caminho_saida=None)['name']
+    assert mapeamento == pytest.approx({
+        'A': 18.991469669862518,  # 3 linhas, média 20: 16.25 + 3.75 * expit(1)
+        'B': 16.25,               # 1 linha: prior
+        'C': 6.3410328727488245,  # 4 linhas, média 5: 16.25 - 11.25 * expit(2)
+        'D': 16.25,               # só no teste: prior
+    }, rel=1e-12)
+
+
+def test_out_of_fold_usa_so_os_outros_folds(df):
+    n_folds = 4
+    codificado = codificar_out_of_fold(df, CATEGORIAS, n_folds=n_folds, random_state=7)
+    folds = np.random.default_rng(7).permutation(len(df)) % n_folds
+    y = df['price'].to_numpy()
+    for fold in range(n_folds):
+        fora = folds != fold
+        prior = y[fora].mean()
+        for coluna in CATEGORIAS:
+            resumo = pd.Series(y[fora]).groupby(df[coluna].to_numpy()[fora]).agg(['sum', 'count'])
+            valores = _suavizar(resumo['sum'].to_numpy(), resumo['count'].to_numpy(dtype=np.float64), prior,
+                                MIN_SAMPLES_LEAF, SUAVIZACAO)
+            esperado = dict(zip(resumo.index, valores))
+            obtido = codificado.loc[~fora, coluna]
+            referencia = df.loc[~fora, coluna].map(lambda c: esperado.get(c, prior))
+            np.testing.assert_allclose(obtido.to_numpy(), referencia.to_numpy(), rtol=1e-12)
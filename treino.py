@@ -0,0 +1,243 @@
+"""
+Treinamento reprodutível do modelo de preços.
+
+Roda o pipeline completo a partir do cache colunar (ver ingestao.py):
+divisão treino/teste do notebook, PreProcessador ajustado no treino e uma
+busca em grade de RandomForestRegressor distribuída em um pool de processos.
+Entre os candidatos que atingem o MAE alvo dentro dos limites de tamanho e de
+latência de uma corrida, fica o de menor artefato. O pacote de artefatos
+(artefatos.py), com as distribuições de referência do monitor de deriva
+(deriva.py), e o metricas.json são gravados juntos.
+
+Uso:
+    python treino.py --cache cache --saida artefatos \
+        --n-estimators 50 100 --max-depth 20 30 0 --min-samples-leaf 1 5 \
+        --mae-alvo 2.0 --tamanho-max-mb 500 --p99-max-ms 5
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+
+from artefatos import DIRETORIO_PADRAO, carregar_artefatos, publicar, salvar_artefatos, tamanho_pacote
+from deriva import COLUNA_PRECO, calcular_referencia, referencia_modelo
+from geo import ajustar_fator_rodovia
+from ingestao import ALVO, DIRETORIO_CACHE, carregar_cache, carregar_dados
+from preprocessamento import FEATURES_MODELO, PreProcessador
+
+ARQUIVO_METRICAS = 'metricas.json'
+AMOSTRAS_LATENCIA = 300
+AMOSTRAS_REFERENCIA = 100_000
+
+# Dados compartilhados pelos processos do pool (abertos com mmap no initializer)
+_dados = {}
+
+
+def mean_absolute_percentage_error(y_true, y_pred):
+    """MAPE em %, ignorando preços zero (mesma definição do notebook)."""
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    mask = y_true != 0
+    return np.mean(np.abs((y_true[mask] - y_pred[mask]) / y_true[mask])) * 100
+
+
+def _iniciar_worker(diretorio_trabalho):
+    for nome in ('X_train', 'y_train', 'X_test', 'y_test'):
+        _dados[nome] = np.load(os.path.join(diretorio_trabalho, f'{nome}.npy'), mmap_mode='r')
+    _dados['diretorio'] = diretorio_trabalho
+    with open(os.path.join(diretorio_trabalho, 'preprocessador.json'), encoding='utf-8') as f:
+        _dados['preprocessador'] = PreProcessador.de_dict(json.load(f))
+
+
+def _latencia_p99(precificador, corridas):
+    """p99 (ms) de previsões de uma corrida por vez, do dado bruto ao preço."""
+    tempos = []
+    for corrida in corridas:
+        inicio = time.perf_counter()
+        precificador.predict_batch({col: [valor] for col, valor in corrida.items()})
+        tempos.append(time.perf_counter() - inicio)
+    return float(np.percentile(tempos, 99) * 1000)
+
+
+def avaliar_candidato(indice, parametros, seed, fator_rodovia=None, referencia=None):
+    """
+    Treina, avalia e exporta um candidato (roda dentro do pool).
+
+    A referência de deriva das features é a mesma para todos os candidatos;
+    a do preço previsto é calculada aqui, em uma amostra do treino.
+
+    Returns:
+        Dicionário com parâmetros, métricas e diretório dos artefatos
+    """
+    modelo = RandomForestRegressor(**parametros, random_state=seed, n_jobs=1)
+    inicio = time.perf_counter()
+    modelo.fit(_dados['X_train'], _dados['y_train'])
+    tempo_treino = time.perf_counter() - inicio
+
+    y_test = np.asarray(_dados['y_test'])
+    y_pred = modelo.predict(_dados['X_test'])
+
+    # O treino já vem embaralhado do train_test_split: o início é uma amostra
+    if referencia is not None:
+        previsto = modelo.predict(_dados['X_train'][:AMOSTRAS_REFERENCIA])
+        referencia = {**referencia, **calcular_referencia({COLUNA_PRECO: previsto})}
+
+    diretorio = os.path.join(_dados['diretorio'], f'candidato_{indice:03d}')
+    versao = salvar_artefatos(diretorio, modelo, _dados['preprocessador'], fator_rodovia, referencia=referencia)
+    return {
+        'parametros': parametros,
+        'mae': float(mean_absolute_error(y_test, y_pred)),
+        'mape': float(mean_absolute_percentage_error(y_test, y_pred)),
+        'r2': float(r2_score(y_test, y_pred)),
+        'tamanho_bytes': tamanho_pacote(diretorio),
+        'tempo_treino_s': tempo_treino,
+        'versao': versao,
+        'diretorio': diretorio,
+    }
+
+
+def escolher(candidatos, mae_alvo, tamanho_max_bytes, p99_max_ms):
+    """
+    Menor artefato entre os candidatos que atendem MAE, tamanho e latência.
+
+    Returns:
+        Candidato escolhido ou None
+    """
+    viaveis = [
+        c for c in candidatos
+        if c['mae'] <= mae_alvo and c['tamanho_bytes'] <= tamanho_max_bytes and c['latencia_p99_ms'] <= p99_max_ms
+    ]
+    return min(viaveis, key=lambda c: (c['tamanho_bytes'], c['mae']), default=None)
+
+
+def grade(n_estimators, max_depth, min_samples_leaf):
+    """Combinações de hiperparâmetros (max_depth 0 = sem limite)."""
+    return [
+        {'n_estimators': n, 'max_depth': d or None, 'min_samples_leaf': m}
+        for n, d, m in itertools.product(n_estimators, max_depth, min_samples_leaf)
+    ]
+
+
+def treinar(df, saida, candidatos, mae_alvo, tamanho_max_mb, p99_max_ms, seed=42, processos=None):
+    """
+    Executa o pipeline completo e grava artefatos + métricas.
+
+    Args:
+        df: DataFrame com as colunas do modelo e o preço
+        saida: Diretório do pacote de artefatos
+        candidatos: Lista de dicionários de hiperparâmetros
+        mae_alvo: MAE máximo aceito (USD)
+        tamanho_max_mb: Tamanho máximo do pacote de artefatos (MB)
+        p99_max_ms: Latência p99 máxima de uma corrida (ms)
+        seed: Semente da divisão treino/teste e das florestas
+        processos: Tamanho do pool (padrão: número de CPUs)
+
+    Returns:
+        Dicionário gravado em metricas.json
+    """
+    X = df[FEATURES_MODELO]
+    y = df[ALVO].to_numpy(dtype=np.float64)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed)
+
+    # Encoding ajustado só no treino, para não vazar o preço do teste
+    preprocessador = PreProcessador.fit(X_train, y_train, politica_desconhecida='prior')
+    fator_rodovia = ajustar_fator_rodovia(X_train['source'], X_train['destination'], X_train['distance'])
+    referencia = referencia_modelo(preprocessador, X_train)
+
+    with tempfile.TemporaryDirectory(prefix='treino_') as trabalho:
+        np.save(os.path.join(trabalho, 'X_train.npy'), preprocessador.transform(X_train))
+        np.save(os.path.join(trabalho, 'X_test.npy'), preprocessador.transform(X_test))
+        np.save(os.path.join(trabalho, 'y_train.npy'), y_train)
+        np.save(os.path.join(trabalho, 'y_test.npy'), y_test)
+        with open(os.path.join(trabalho, 'preprocessador.json'), 'w', encoding='utf-8') as f:
+            json.dump(preprocessador.para_dict(), f)
+
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_worker,
+                                 initargs=(trabalho,)) as pool:
+            futuros = [pool.submit(avaliar_candidato, i, parametros, seed, fator_rodovia, referencia)
+                       for i, parametros in enumerate(candidatos)]
+            resultados = [futuro.result() for futuro in futuros]
+
+        # Latência medida depois do pool, sem disputa de CPU com os treinos, e
+        # no formato servido (pacote mmap + FlorestaPlana)
+        amostra = X_test.sample(min(AMOSTRAS_LATENCIA, len(X_test)), random_state=seed)
+        corridas = json.loads(amostra.to_json(orient='records'))
+        for resultado in resultados:
+            precificador = carregar_artefatos(resultado['diretorio']).precificador()
+            resultado['latencia_p99_ms'] = _latencia_p99(precificador, corridas)
+            print(f"{resultado['parametros']}: MAE {resultado['mae']:.3f} | "
+                  f"{resultado['tamanho_bytes'] / 1e6:.1f} MB | p99 {resultado['latencia_p99_ms']:.2f} ms")
+
+        escolhido = escolher(resultados, mae_alvo, tamanho_max_mb * 1e6, p99_max_ms)
+        diretorio_escolhido = escolhido['diretorio'] if escolhido is not None else None
+        for resultado in resultados:
+            del resultado['diretorio']
+
+        metricas = {
+            'escolhido': escolhido,
+            'restricoes': {'mae_alvo': mae_alvo, 'tamanho_max_mb': tamanho_max_mb, 'p99_max_ms': p99_max_ms},
+            'candidatos': resultados,
+            'seed': seed,
+            'fator_rodovia': fator_rodovia,
+            'linhas_treino': len(y_train),
+            'linhas_teste': len(y_test),
+            'ambiente': {'python': platform.python_version(), 'numpy': np.__version__,
+                         'scikit-learn': sklearn.__version__},
+        }
+        if escolhido is not None:
+            # metricas.json entra no pacote antes da troca atômica: a versão
+            # publicada nunca é alterada depois do symlink mudar
+            with open(os.path.join(diretorio_escolhido, ARQUIVO_METRICAS), 'w', encoding='utf-8') as f:
+                json.dump(metricas, f, ensure_ascii=False, indent=2)
+            publicar(diretorio_escolhido, saida)
+            caminho = os.path.join(saida, ARQUIVO_METRICAS)
+
+    if escolhido is None:
+        # Sem candidato viável o pacote atual fica intacto e as métricas vão ao lado
+        caminho = f'{saida.rstrip(os.sep)}_{ARQUIVO_METRICAS}'
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(metricas, f, ensure_ascii=False, indent=2)
+    metricas['caminho'] = caminho
+    return metricas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Treina o modelo de preços com busca em grade')
+    parser.add_argument('--csv', help='CSV do Kaggle (ingerido para o cache se necessário)')
+    parser.add_argument('--cache', default=DIRETORIO_CACHE)
+    parser.add_argument('--saida', default=DIRETORIO_PADRAO)
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[50, 100])
+    parser.add_argument('--max-depth', type=int, nargs='+', default=[20, 0], help='0 = sem limite')
+    parser.add_argument('--min-samples-leaf', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--mae-alvo', type=float, default=2.0)
+    parser.add_argument('--tamanho-max-mb', type=float, default=1000.0)
+    parser.add_argument('--p99-max-ms', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--processos', type=int, default=None)
+    args = parser.parse_args()
+
+    df = carregar_dados(args.csv, args.cache) if args.csv else carregar_cache(args.cache)
+    candidatos = grade(args.n_estimators, args.max_depth, args.min_samples_leaf)
+    metricas = treinar(df, args.saida, candidatos, args.mae_alvo, args.tamanho_max_mb,
+                       args.p99_max_ms, seed=args.seed, processos=args.processos)
+
+    escolhido = metricas['escolhido']
+    if escolhido is None:
+        print(f"Nenhum candidato atende às restrições; veja {metricas['caminho']}")
+        sys.exit(1)
+    print(f"Escolhido {escolhido['parametros']} (versão {escolhido['versao']}): "
+          f"MAE {escolhido['mae']:.3f}, MAPE {escolhido['mape']:.2f}%, R² {escolhido['r2']:.4f}")
+
+
+if __name__ == '__main__':
+    main()